@@ -0,0 +1,206 @@
+# async variant of database.py for the async route handlers: the same operations, driven by the pooled
+# aiohttp session so a single worker can keep many upstream calls in flight
+
+from __future__ import annotations
+
+import asyncio
+import os
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterable, List, Optional
+
+from . import database
+from .database import CheckoutError, Op
+from .singleflight import SingleFlight
+from .storage import Request
+
+# how many admin API profile lookups one batch request may have in flight
+PROFILE_FETCH_CONCURRENCY: int = int(os.environ.get("PROFILE_FETCH_CONCURRENCY", "8"))
+
+# concurrent lookups of the same user share one profile operation, cache check included
+profile_reads = SingleFlight()
+
+
+async def _run(op: Op) -> Any:
+    # drive a database operation with the async transport (or the embedded store)
+    try:
+        request = next(op)
+        while True:
+            try:
+                response = await database.storage.asend(request)
+            except Exception as exc:
+                request = op.throw(exc)
+            else:
+                request = op.send(response)
+    except StopIteration as done:
+        return done.value
+
+
+async def warm(connections: int, timeout: float) -> int:
+    # open pooled Supabase connections before the first request (the embedded store has none to open); a
+    # one-row HEAD on the products table also proves the URL, key and table name work
+    database._ensure_config()
+    if connections <= 0:
+        return 0
+    request = Request("select", database.PRODUCTS_TABLE, columns=(database.PRODUCT_ID_FIELD,), limit=1)
+    return await database.storage.awarm(request, connections, timeout)
+
+
+async def gather(*calls: Awaitable[Any]) -> List[Any]:
+    # run independent reads concurrently so a composite response waits for the slowest one instead of
+    # their sum; the first failure cancels the rest and is raised
+    tasks = [asyncio.ensure_future(call) for call in calls]
+    try:
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        raise
+
+
+async def get_listings(filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    return await _run(database._get_listings(filters))
+
+
+async def get_listings_page(
+    filters: Optional[Dict[str, Any]] = None,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    count: bool = False,
+    sort: str = "created_at.desc",
+    fields: Optional[List[str]] = None,
+) -> Dict[str, Any]:
+    return await _run(database._get_listings_page(filters, limit, cursor, count, sort, fields))
+
+
+async def _export(read: Callable[[Optional[str]], Op], cursor: Optional[str]) -> AsyncIterator[List[Dict[str, Any]]]:
+    # walk a table page by page in keyset order; the next page is fetched while the caller writes out the
+    # current one, so at most two pages are held at a time
+    fetch = asyncio.ensure_future(_run(read(cursor)))
+    try:
+        while True:
+            page = await fetch
+            if page["next_cursor"]:
+                fetch = asyncio.ensure_future(_run(read(page["next_cursor"])))
+            yield page["items"]
+            if not page["next_cursor"]:
+                return
+    finally:
+        fetch.cancel()
+
+
+def export_listings(
+    filters: Optional[Dict[str, Any]] = None, cursor: Optional[str] = None, chunk_size: int = 1000
+) -> AsyncIterator[List[Dict[str, Any]]]:
+    # every matching listing, oldest first, in chunks read straight from upstream
+    def read(position: Optional[str]) -> Op:
+        return database._read_listings_page(filters, chunk_size, position, sort=database.EXPORT_SORT)
+
+    return _export(read, cursor)
+
+
+async def get_listing(listing_id: str, fields: Optional[List[str]] = None) -> Optional[Dict[str, Any]]:
+    return await _run(database._get_listing(listing_id, fields))
+
+
+async def create_listing(listing_data: Dict[str, Any]) -> Dict[str, Any]:
+    return await _run(database._create_listing(listing_data))
+
+
+async def update_listing(listing_id: str, listing_data: Dict[str, Any]) -> Dict[str, Any]:
+    return await _run(database._update_listing(listing_id, listing_data))
+
+
+async def get_listings_by_id(listing_ids: List[str], cached: bool = False) -> Dict[str, Dict[str, Any]]:
+    # as database.get_listings_by_id, with the in.(...) chunks of a long id list read concurrently
+    database._ensure_config()
+    found, missing = database.cached_listings(listing_ids) if cached else ({}, list(listing_ids))
+    read = database._read_listings_by_id if cached else database._fetch_listings_by_id
+    chunks = database.in_chunks(missing)
+    for part in await gather(*(_run(read(chunk)) for chunk in chunks)):
+        found.update(part)
+    return found
+
+
+async def create_listings(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return await _run(database._create_listings(rows))
+
+
+async def update_listings(changes: Dict[str, Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return await _run(database._update_listings(changes))
+
+
+async def delete_listing(listing_id: str) -> bool:
+    return await _run(database._delete_listing(listing_id))
+
+
+async def get_user_profile(user_id: str) -> Optional[Dict[str, Any]]:
+    key = user_id if profile_reads.enabled else None
+    return await profile_reads.ado(key, lambda: _run(database._get_user_profile(user_id)))
+
+
+async def get_user_profiles(user_ids: Iterable[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+    # resolve many profiles concurrently, at most PROFILE_FETCH_CONCURRENCY upstream calls at a time
+    unique = list(dict.fromkeys(user_ids))
+    semaphore = asyncio.Semaphore(PROFILE_FETCH_CONCURRENCY)
+
+    async def _one(user_id: str) -> Optional[Dict[str, Any]]:
+        async with semaphore:
+            return await get_user_profile(user_id)
+
+    profiles = await asyncio.gather(*(_one(user_id) for user_id in unique))
+    return dict(zip(unique, profiles))
+
+
+async def get_orders(filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    return await _run(database._get_orders(filters))
+
+
+async def get_orders_page(
+    filters: Optional[Dict[str, Any]] = None,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    count: bool = False,
+    sort: str = "created_at.desc",
+    fields: Optional[List[str]] = None,
+    expand: bool = True,
+) -> Dict[str, Any]:
+    return await _run(database._get_orders_page(filters, limit, cursor, count, sort, fields, expand))
+
+
+async def get_orders_by_id(
+    order_ids: List[str],
+    filters: Optional[Dict[str, Any]] = None,
+    fields: Optional[List[str]] = None,
+    expand: bool = True,
+) -> Dict[str, Dict[str, Any]]:
+    database._ensure_config()
+    found: Dict[str, Dict[str, Any]] = {}
+    chunks = database.in_chunks(list(order_ids))
+    for part in await gather(*(_run(database._fetch_orders_by_id(chunk, filters, fields, expand)) for chunk in chunks)):
+        found.update(part)
+    return found
+
+
+def export_orders(
+    filters: Optional[Dict[str, Any]] = None, cursor: Optional[str] = None, chunk_size: int = 1000
+) -> AsyncIterator[List[Dict[str, Any]]]:
+    # every matching transaction with its product, oldest first, in chunks
+    def read(position: Optional[str]) -> Op:
+        return database._get_orders_page(filters, chunk_size, position, sort=database.EXPORT_SORT)
+
+    return _export(read, cursor)
+
+
+async def create_order(order_data: Dict[str, Any]) -> Dict[str, Any]:
+    return await _run(database._create_order(order_data))
+
+
+async def checkout(listing_id: str, buyer_id: str, payment_method: Optional[str] = None) -> Dict[str, Any]:
+    return await _run(database._checkout(listing_id, buyer_id, payment_method))
+
+
+async def get_order(order_id: str) -> Optional[Dict[str, Any]]:
+    return await _run(database._get_order(order_id))
+
+
+async def update_order(order_id: str, order_data: Dict[str, Any]) -> Dict[str, Any]:
+    return await _run(database._update_order(order_id, order_data))
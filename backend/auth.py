@@ -0,0 +1,78 @@
+# bearer token verification. a dashboard session reuses one Supabase JWT for up to an hour, so tokens that
+# verify are remembered by SHA-256 digest until their own exp instead of re-running the HMAC check per request.
+# failures are never cached, so invalid, expired and subject-less tokens behave exactly as before
+
+from __future__ import annotations
+
+import hashlib
+import os
+import threading
+import time
+from functools import lru_cache
+from typing import Any, Dict, Optional
+
+import jwt
+
+from .cache import MemoryCache
+
+AUTH_TOKEN_CACHE_SIZE: int = int(os.environ.get("AUTH_TOKEN_CACHE_SIZE", "10000"))
+# upper bound on how long a verified token is trusted without re-checking, also used for tokens without exp
+AUTH_TOKEN_CACHE_MAX_TTL: float = float(os.environ.get("AUTH_TOKEN_CACHE_MAX_TTL", "3600"))
+
+_token_cache = MemoryCache(AUTH_TOKEN_CACHE_SIZE, AUTH_TOKEN_CACHE_MAX_TTL, stale_ttl=0)
+_timing_lock = threading.Lock()
+_timing: Dict[str, float] = {"verifications": 0, "verify_seconds": 0.0, "max_verify_seconds": 0.0}
+
+
+@lru_cache(maxsize=1)
+def jwt_secret() -> str:
+    # read once; a missing secret raises every time instead of being cached
+    secret = os.getenv("SUPABASE_JWT_SECRET")
+    if not secret:
+        raise RuntimeError("SUPABASE_JWT_SECRET environment variable must be set")
+    return secret
+
+
+def _record_verification(seconds: float) -> None:
+    with _timing_lock:
+        _timing["verifications"] += 1
+        _timing["verify_seconds"] += seconds
+        _timing["max_verify_seconds"] = max(_timing["max_verify_seconds"], seconds)
+
+
+def user_id_for_token(token: str) -> Optional[str]:
+    # return the token's subject, None when it has none; raises jwt.PyJWTError for invalid or expired tokens
+    secret = jwt_secret()
+    key = hashlib.sha256(token.encode()).hexdigest()
+    cached = _token_cache.get(key)
+    if cached is not None:
+        return cached
+
+    started = time.perf_counter()
+    try:
+        payload = jwt.decode(token, secret, algorithms=["HS256"], options={"verify_aud": False})
+    finally:
+        _record_verification(time.perf_counter() - started)
+
+    user_id = payload.get("sub") or payload.get("user_id")
+    if not user_id:
+        return None
+    ttl = AUTH_TOKEN_CACHE_MAX_TTL
+    exp = payload.get("exp")
+    if exp is not None:
+        ttl = min(ttl, float(exp) - time.time())
+    if ttl > 0:
+        _token_cache.set(key, user_id, ttl=ttl)
+    return user_id
+
+
+def stats() -> Dict[str, Any]:
+    # token cache hit rate plus HMAC verification timings for cache misses
+    with _timing_lock:
+        timing = dict(_timing)
+    verifications = int(timing["verifications"])
+    stats = _token_cache.stats()
+    stats["verifications"] = verifications
+    stats["verify_ms_avg"] = round(timing["verify_seconds"] * 1000 / verifications, 3) if verifications else 0.0
+    stats["verify_ms_max"] = round(timing["max_verify_seconds"] * 1000, 3)
+    return stats
@@ -0,0 +1 @@
+# performance benchmarks for the backend, run from the repository root with `python -m backend.benchmarks.<name>`
@@ -0,0 +1,151 @@
+# throughput of GET /listings/{id} at 50/500/2000 concurrent clients: sync handlers on the threadpool with
+# the requests pool vs the async handlers in main.py on the aiohttp pool, against a stub upstream with latency
+#
+#   python -m backend.benchmarks.async_bench --latency 0.02 --duration 5
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import importlib
+import os
+import time
+from typing import Any, Dict, List, Tuple
+
+from .catalog import percentile, synthetic_catalog
+from .stub_upstream import StubUpstream
+
+
+def _build_sync_app(database: Any, schemas: Any) -> Any:
+    # the pre-async shape of retrieve_listing: a plain def handler doing blocking I/O
+    from fastapi import FastAPI, HTTPException
+
+    app = FastAPI()
+
+    @app.get("/listings/{listing_id}", response_model=schemas.Listing)
+    def retrieve_listing(listing_id: str):
+        listing = database.get_listing(listing_id)
+        if not listing:
+            raise HTTPException(status_code=404, detail="Listing not found")
+        return listing
+
+    return app
+
+
+async def asgi_request(app: Any, method: str, path: str, query: str = "", headers: Any = ()) -> Tuple[int, bytes]:
+    # call the ASGI app in-process so the numbers measure the app, not an HTTP client
+    status, _, body = await asgi_call(app, method, path, query, headers)
+    return status, body
+
+
+async def asgi_call(
+    app: Any, method: str, path: str, query: str = "", headers: Any = (), body: bytes = b""
+) -> Tuple[int, Dict[str, str], bytes]:
+    # asgi_request with a request body and the response headers
+    status = 0
+    response_headers: Dict[str, str] = {}
+    chunks: List[bytes] = []
+    finished = asyncio.Event()
+    requested = False
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": query.encode(),
+        "root_path": "",
+        "headers": [(b"host", b"bench"), *headers],
+        "client": ("127.0.0.1", 50000),
+        "server": ("bench", 80),
+    }
+
+    async def receive() -> Dict[str, Any]:
+        # the body once, then stay connected until the response is complete (streaming responses poll for this)
+        nonlocal requested
+        if not requested:
+            requested = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        await finished.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message: Dict[str, Any]) -> None:
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+            response_headers.update((key.decode().lower(), value.decode()) for key, value in message["headers"])
+        elif message["type"] == "http.response.body":
+            chunks.append(message.get("body", b""))
+
+    await app(scope, receive, send)
+    finished.set()
+    return status, response_headers, b"".join(chunks)
+
+
+async def _drive(app: Any, listing_ids: List[str], concurrency: int, duration: float) -> None:
+    latencies: List[float] = []
+    errors = 0
+    deadline = time.perf_counter() + duration
+
+    async def worker(offset: int) -> None:
+        nonlocal errors
+        i = offset
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            status, _ = await asgi_request(app, "GET", f"/listings/{listing_ids[i % len(listing_ids)]}")
+            if status != 200:
+                errors += 1
+            latencies.append((time.perf_counter() - start) * 1000)
+            i += concurrency
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(n) for n in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    print(
+        f"  clients={concurrency:<5} req/s={len(latencies) / elapsed:8.1f} "
+        f"p50={percentile(latencies, 50):8.1f}ms p99={percentile(latencies, 99):8.1f}ms errors={errors}"
+    )
+
+
+async def _run(app: Any, transport: Any, listing_ids: List[str], concurrency: int, duration: float) -> None:
+    # each run gets a fresh loop, so close the loop-bound aiohttp session before it goes away
+    await _drive(app, listing_ids, concurrency, duration)
+    await transport.aclose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="sync vs async request path throughput")
+    parser.add_argument("--latency", type=float, default=0.02, help="injected upstream latency in seconds")
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds per run")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[50, 500, 2000])
+    args = parser.parse_args()
+
+    catalog = synthetic_catalog(1000)
+    rows = {item["id"]: dict(item, prod_id=item["id"]) for item in catalog}
+
+    def handler(method, path, params, headers, body):
+        listing_id = params.get("prod_id", "")[3:]
+        row = rows.get(listing_id)
+        return 200, [row] if row else [], {}
+
+    with StubUpstream(handler, latency=args.latency) as upstream:
+        os.environ["SUPABASE_URL"] = upstream.url
+        os.environ.setdefault("SUPABASE_API_KEY", "bench")
+        os.environ.setdefault("SUPABASE_ASYNC_POOL_SIZE", "1000")
+        database = importlib.import_module("backend.database")
+        schemas = importlib.import_module("backend.schemas")
+        main_module = importlib.import_module("backend.main")
+        transport = importlib.import_module("backend.transport")
+        listing_ids = list(rows)
+
+        for label, app in (("sync def handlers + requests pool", _build_sync_app(database, schemas)),
+                           ("async def handlers + aiohttp pool", main_module.app)):
+            print(label)
+            for concurrency in args.concurrency:
+                asyncio.run(_run(app, transport, listing_ids, concurrency, args.duration))
+
+
+if __name__ == "__main__":
+    main()
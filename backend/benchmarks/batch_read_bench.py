@@ -0,0 +1,92 @@
+# known-id reads (order history, saved items, recently viewed): one GET /listings/{id} per item, issued in
+# parallel as the pages did, against a single GET /listings?ids=... through the app and the in-memory Supabase
+# stand-in. cold runs start from an empty cache; partly warm runs have half of the ids cached
+#
+#   python -m backend.benchmarks.batch_read_bench --items 40 --rounds 50 --latency 0.02 --client-rtt 0.04
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import importlib
+import os
+import random
+import time
+from typing import Any, Dict, List
+
+from .async_bench import asgi_call
+from .catalog import percentile
+from .fake_supabase import FakeSupabase
+
+
+async def _page(app: Any, listing_ids: List[str], batched: bool, client_rtt: float, parallel: int) -> None:
+    async def get(path: str, query: str = "") -> None:
+        await asyncio.sleep(client_rtt)
+        status, _, _ = await asgi_call(app, "GET", path, query)
+        assert status == 200, status
+
+    if batched:
+        await get("/listings", "ids=" + ",".join(listing_ids))
+        return
+    # browsers open a handful of connections per host, so per-item requests queue behind each other
+    semaphore = asyncio.Semaphore(parallel)
+
+    async def one(listing_id: str) -> None:
+        async with semaphore:
+            await get(f"/listings/{listing_id}")
+
+    await asyncio.gather(*(one(listing_id) for listing_id in listing_ids))
+
+
+async def _measure(modules: Dict[str, Any], upstream: Any, listings: List[str], args: argparse.Namespace,
+                   batched: bool, warm_fraction: float) -> Dict[str, float]:
+    rng = random.Random(args.seed)
+    latencies: List[float] = []
+    calls = 0
+    for _ in range(args.rounds):
+        modules["cache"].listing_cache.clear()
+        modules["cache"].etag_cache.clear()
+        ids = rng.sample(listings, args.items)
+        warm = ids[: int(len(ids) * warm_fraction)]
+        if warm:
+            modules["database"].get_listings_by_id(warm)
+        before = upstream.requests
+        started = time.perf_counter()
+        await _page(modules["main"].app, ids, batched, args.client_rtt, args.parallel)
+        latencies.append((time.perf_counter() - started) * 1000)
+        calls += upstream.requests - before
+    await modules["transport"].aclose()
+    return {"p50": percentile(latencies, 50), "p95": percentile(latencies, 95), "upstream": calls / args.rounds}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="per-id listing reads vs one ?ids= batch read")
+    parser.add_argument("--items", type=int, default=40, help="listings shown on the page")
+    parser.add_argument("--rounds", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.02, help="injected upstream latency in seconds")
+    parser.add_argument("--client-rtt", type=float, default=0.04, help="browser-to-API round trip in seconds")
+    parser.add_argument("--parallel", type=int, default=6, help="concurrent browser requests for per-id reads")
+    parser.add_argument("--listings", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    fake = FakeSupabase()
+    users = fake.seed_marketplace(args.listings, 200, 500, args.seed)
+    os.environ.setdefault("SUPABASE_API_KEY", "bench")
+    with fake.serve(latency=args.latency) as upstream:
+        os.environ["SUPABASE_URL"] = upstream.url
+        modules = {name: importlib.import_module(f"backend.{name}") for name in ("cache", "database", "main", "transport")}
+        modules["database"].SUPABASE_URL = upstream.url
+        modules["database"].storage.url = upstream.url
+        for warm_fraction in (0.0, 0.5):
+            for batched in (False, True):
+                result = asyncio.run(_measure(modules, upstream, users["listings"], args, batched, warm_fraction))
+                print(
+                    f"{'?ids= batch' if batched else 'per-id GETs':<12} {args.items} items, {warm_fraction:.0%} cached:"
+                    f" p50={result['p50']:7.1f}ms p95={result['p95']:7.1f}ms upstream calls={result['upstream']:5.1f}"
+                )
+        modules["transport"].close()
+
+
+if __name__ == "__main__":
+    main()
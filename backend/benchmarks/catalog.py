@@ -0,0 +1,63 @@
+# synthetic marketplace data shared by the benchmarks
+
+from __future__ import annotations
+
+import random
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+CATEGORIES = ["decor", "clothing", "school-supplies", "tickets", "miscellaneous"]
+
+ADJECTIVES = [
+    "vintage", "compact", "wooden", "black", "white", "blue", "red", "green", "large", "small",
+    "portable", "ergonomic", "cozy", "used", "new", "foldable", "wireless", "leather", "cotton",
+    "glass", "metal", "plastic", "lightweight", "heavy", "modern", "classic", "mini", "deluxe",
+]
+NOUNS = [
+    "microwave", "desk", "lamp", "chair", "mirror", "rug", "poster", "jacket", "hoodie", "sneakers",
+    "backpack", "calculator", "notebook", "textbook", "binder", "monitor", "keyboard", "headphones",
+    "speaker", "kettle", "fridge", "fan", "heater", "shelf", "bookcase", "curtains", "pillow",
+    "blanket", "ticket", "pass", "bike", "helmet", "scooter", "printer", "router", "charger",
+    "plant", "frame", "clock", "vase", "tapestry", "jeans", "sweater", "boots", "scarf", "umbrella",
+]
+EXTRAS = [
+    "barely used", "moving out sale", "pickup on campus", "great condition", "minor scratches",
+    "works perfectly", "must go this week", "southwest dorms", "north apartments", "cash or venmo",
+    "price negotiable", "comes with cable", "original box", "spring concert", "football game",
+]
+
+
+def synthetic_listing(rng: random.Random, seller_ids: List[str], created_at: datetime) -> Dict[str, Any]:
+    noun = rng.choice(NOUNS)
+    name = f"{rng.choice(ADJECTIVES)} {noun}"
+    if rng.random() < 0.3:
+        name = f"{rng.choice(ADJECTIVES)} {name}"
+    description = f"{name} - {rng.choice(EXTRAS)}, {rng.choice(EXTRAS)}. {rng.randint(1, 9999)}"
+    quantity = rng.randint(0, 5)
+    return {
+        "id": str(uuid.UUID(int=rng.getrandbits(128))),
+        "seller_id": rng.choice(seller_ids),
+        "name": name,
+        "description": description,
+        "price": round(rng.uniform(1, 400), 2),
+        "quantity": quantity,
+        "sold": quantity == 0,
+        "category": rng.choice(CATEGORIES),
+        "created_at": created_at.isoformat(),
+    }
+
+
+def synthetic_catalog(size: int, sellers: int = 2000, seed: int = 7, start: Optional[datetime] = None) -> List[Dict[str, Any]]:
+    rng = random.Random(seed)
+    seller_ids = [str(uuid.UUID(int=rng.getrandbits(128))) for _ in range(sellers)]
+    start = start or datetime(2024, 1, 1, tzinfo=timezone.utc)
+    return [synthetic_listing(rng, seller_ids, start + timedelta(seconds=30 * i)) for i in range(size)]
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * len(ordered))) - 1))
+    return ordered[index]
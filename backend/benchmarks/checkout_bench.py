@@ -0,0 +1,126 @@
+# checkout correctness and latency against the in-memory PostgREST stand-in: many buyers race for a listing
+# with a few units in stock, comparing the old read / insert / update sequence with database._checkout in
+# compare-and-set mode and in single-RPC mode. a correct path creates exactly as many orders as there were units
+#
+#   python -m backend.benchmarks.checkout_bench --buyers 200 --stock 20 --latency 0.005
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import importlib
+import os
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+from .catalog import percentile
+from .fake_supabase import FakeSupabase
+
+
+async def _legacy_checkout(async_database: Any, listing_id: str, buyer_id: str) -> Optional[Dict[str, Any]]:
+    # the handler as it was: check the listing, insert the order, then write back quantity - 1
+    listing = await async_database.get_listing(listing_id)
+    if not listing or listing.get("sold") or listing.get("quantity", 1) <= 0:
+        return None
+    created = await async_database.create_order({"prod_id": listing_id, "buyer_id": buyer_id})
+    quantity = listing.get("quantity", 1)
+    await async_database.update_listing(listing_id, {"quantity": max(quantity - 1, 0), "sold": quantity - 1 <= 0})
+    return created
+
+
+async def _race(mode: str, modules: Dict[str, Any], listing_id: str, buyers: int) -> Tuple[List[float], Counter]:
+    async_database = modules["async_database"]
+    latencies: List[float] = []
+    refusals: Counter = Counter()
+
+    async def buyer(n: int) -> None:
+        started = time.perf_counter()
+        try:
+            if mode == "legacy":
+                await _legacy_checkout(async_database, listing_id, f"buyer-{n}")
+            else:
+                await async_database.checkout(listing_id, f"buyer-{n}")
+        except async_database.CheckoutError as exc:
+            refusals[exc.reason] += 1
+        latencies.append((time.perf_counter() - started) * 1000)
+
+    await asyncio.gather(*(buyer(n) for n in range(buyers)))
+    await modules["transport"].aclose()
+    return latencies, refusals
+
+
+async def _sequential(mode: str, modules: Dict[str, Any], listing_ids: List[str]) -> List[float]:
+    # uncontended checkouts of distinct listings, each listing already in the read cache as after browsing
+    async_database = modules["async_database"]
+    latencies: List[float] = []
+    for listing_id in listing_ids:
+        await async_database.get_listing(listing_id)
+    for n, listing_id in enumerate(listing_ids):
+        started = time.perf_counter()
+        if mode == "legacy":
+            await _legacy_checkout(async_database, listing_id, f"solo-{n}")
+        else:
+            await async_database.checkout(listing_id, f"solo-{n}")
+        latencies.append((time.perf_counter() - started) * 1000)
+    await modules["transport"].aclose()
+    return latencies
+
+
+def _final_state(modules: Dict[str, Any], listing_id: str) -> Dict[str, Any]:
+    database = modules["database"]
+    database.listing_cache.clear()
+    listing = database.get_listing(listing_id)
+    orders = database.get_orders({"prod_id": listing_id})
+    return {"orders": len(orders), "quantity": listing.get("quantity"), "sold": listing.get("sold")}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="concurrent checkout: overselling and latency")
+    parser.add_argument("--buyers", type=int, default=200)
+    parser.add_argument("--stock", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.005, help="injected upstream latency in seconds")
+    parser.add_argument("--solo", type=int, default=50, help="uncontended checkouts for the latency comparison")
+    args = parser.parse_args()
+
+    os.environ.setdefault("SUPABASE_API_KEY", "bench")
+    for mode in ("legacy", "compare-and-set", "rpc"):
+        fake = FakeSupabase()
+        fake.seed("Product", [{"seller_id": "seller", "name": "desk lamp", "price": 15.0, "quantity": args.stock,
+                               "sold": False, "category": "decor"}])
+        fake.seed("Product", [{"seller_id": "seller", "name": f"item {n}", "price": 5.0, "quantity": 1,
+                               "sold": False, "category": "miscellaneous"} for n in range(args.solo)])
+        contended = fake.tables["Product"][0]["prod_id"]
+        solo_ids = [row["prod_id"] for row in fake.tables["Product"][1:]]
+
+        with fake.serve(latency=args.latency) as upstream:
+            os.environ["SUPABASE_URL"] = upstream.url
+            modules = {name: importlib.import_module(f"backend.{name}")
+                       for name in ("database", "async_database", "resilience", "transport")}
+            database = modules["database"]
+            database.SUPABASE_URL = upstream.url
+            database.storage.url = upstream.url
+            database.CHECKOUT_RPC = "checkout_listing" if mode == "rpc" else ""
+            database.listing_cache.clear()
+
+            before = upstream.requests
+            # at the priority POST /orders gets, so the burst queues for the upstream instead of being shed
+            with modules["resilience"].priority(modules["resilience"].CRITICAL):
+                race, refusals = asyncio.run(_race(mode, modules, contended, args.buyers))
+            race_calls = upstream.requests - before
+            state = _final_state(modules, contended)
+            before = upstream.requests
+            solo = asyncio.run(_sequential(mode, modules, solo_ids))
+            solo_calls = upstream.requests - before - len(solo_ids)
+            modules["transport"].close()
+
+        print(
+            f"{mode:<16} orders={state['orders']:<4} stock={args.stock:<4} oversold={max(state['orders'] - args.stock, 0):<4}"
+            f" final_quantity={state['quantity']} race p50={percentile(race, 50):6.1f}ms p99={percentile(race, 99):6.1f}ms"
+            f" calls={race_calls:<5} refused={dict(refusals)} | uncontended p50={percentile(solo, 50):6.1f}ms"
+            f" calls/checkout={solo_calls / len(solo_ids):.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
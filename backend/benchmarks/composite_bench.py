@@ -0,0 +1,140 @@
+# page latency of the item page and the orders dashboard before and after the composite endpoints: the
+# requests each page used to make (GET /listings/{id} then /users/{seller_id}; /orders?role=buyer and
+# ?role=seller) against one GET /listings/{id}/detail or /dashboard, through the app against the in-memory
+# Supabase stand-in. --client-rtt adds the browser-to-API round trip each request pays. cold runs clear the
+# caches before every page so each upstream read is paid too; warm runs have listings and profiles
+# cached (orders are never cached)
+#
+#   python -m backend.benchmarks.composite_bench --pages 200 --latency 0.02 --client-rtt 0.04
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import importlib
+import json
+import os
+import random
+import time
+from typing import Any, Awaitable, Callable, Dict, List
+
+from .async_bench import asgi_call
+from .catalog import percentile
+from .fake_supabase import FakeSupabase
+from .load_test import DASHBOARD_ORDER_FIELDS, JWT_SECRET, token_for
+
+
+class Browser:
+    def __init__(self, app: Any, client_rtt: float):
+        self.app = app
+        self.client_rtt = client_rtt
+        self.requests = 0
+
+    async def get(self, path: str, query: str = "", user: str = "") -> Any:
+        headers = [(b"authorization", f"Bearer {token_for(user)}".encode())] if user else []
+        await asyncio.sleep(self.client_rtt)
+        status, _, body = await asgi_call(self.app, "GET", path, query, headers)
+        self.requests += 1
+        assert status in (200, 404), (path, status)
+        return json.loads(body) if status == 200 else None
+
+
+async def item_page_before(browser: Browser, listing_id: str, user: str) -> None:
+    listing = await browser.get(f"/listings/{listing_id}")
+    await browser.get(f"/users/{listing['seller_id']}")
+
+
+async def item_page_after(browser: Browser, listing_id: str, user: str) -> None:
+    await browser.get(f"/listings/{listing_id}/detail")
+
+
+async def orders_page_before(browser: Browser, listing_id: str, user: str) -> None:
+    await asyncio.gather(
+        browser.get("/orders", f"role=buyer&fields={DASHBOARD_ORDER_FIELDS}", user),
+        browser.get("/orders", f"role=seller&fields={DASHBOARD_ORDER_FIELDS}", user),
+    )
+
+
+async def orders_page_after(browser: Browser, listing_id: str, user: str) -> None:
+    await browser.get("/dashboard", f"include=purchases,sales&fields={DASHBOARD_ORDER_FIELDS}", user)
+
+
+async def dashboard_before(browser: Browser, listing_id: str, user: str) -> None:
+    # listings and both order tabs, as the dashboard pages fetched them one after another
+    await browser.get("/listings", f"seller_id={user}", user)
+    await browser.get("/orders", f"role=seller&fields={DASHBOARD_ORDER_FIELDS}", user)
+    await browser.get("/orders", f"role=buyer&fields={DASHBOARD_ORDER_FIELDS}", user)
+
+
+async def dashboard_after(browser: Browser, listing_id: str, user: str) -> None:
+    await browser.get("/dashboard", f"fields={DASHBOARD_ORDER_FIELDS}", user)
+
+
+PAGES: Dict[str, Callable[[Browser, str, str], Awaitable[None]]] = {
+    "item page (before)": item_page_before,
+    "item page (after)": item_page_after,
+    "orders page (before)": orders_page_before,
+    "orders page (after)": orders_page_after,
+    "full dashboard (before)": dashboard_before,
+    "full dashboard (after)": dashboard_after,
+}
+
+
+async def _measure(modules: Dict[str, Any], page: Callable[[Browser, str, str], Awaitable[None]],
+                   users: Dict[str, List[str]], args: argparse.Namespace, upstream: Any, cold: bool) -> Dict[str, float]:
+    # warm runs load the same pages once beforehand, so their listing and profile reads are cache hits
+    for cache in (modules["cache"].listing_cache, modules["cache"].profile_cache, modules["cache"].etag_cache):
+        cache.clear()
+    if not cold:
+        rng = random.Random(args.seed)
+        for _ in range(args.pages):
+            await page(Browser(modules["main"].app, 0.0), rng.choice(users["listings"]), rng.choice(users["sellers"]))
+    browser = Browser(modules["main"].app, args.client_rtt)
+    rng = random.Random(args.seed)
+    latencies: List[float] = []
+    before = upstream.requests
+    for _ in range(args.pages):
+        if cold:
+            for cache in (modules["cache"].listing_cache, modules["cache"].profile_cache, modules["cache"].etag_cache):
+                cache.clear()
+        started = time.perf_counter()
+        await page(browser, rng.choice(users["listings"]), rng.choice(users["sellers"]))
+        latencies.append((time.perf_counter() - started) * 1000)
+    await modules["transport"].aclose()
+    return {
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "requests": browser.requests / args.pages,
+        "upstream": (upstream.requests - before) / args.pages,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="page latency with and without the composite endpoints")
+    parser.add_argument("--pages", type=int, default=200, help="page loads per variant")
+    parser.add_argument("--latency", type=float, default=0.02, help="injected upstream latency in seconds")
+    parser.add_argument("--client-rtt", type=float, default=0.04, help="browser-to-API round trip in seconds")
+    parser.add_argument("--listings", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    fake = FakeSupabase()
+    users = fake.seed_marketplace(args.listings, 500, 3000, args.seed)
+    os.environ.setdefault("SUPABASE_API_KEY", "bench")
+    os.environ["SUPABASE_JWT_SECRET"] = JWT_SECRET
+    with fake.serve(latency=args.latency) as upstream:
+        os.environ["SUPABASE_URL"] = upstream.url
+        modules = {name: importlib.import_module(f"backend.{name}") for name in ("cache", "database", "main", "transport")}
+        modules["database"].SUPABASE_URL = upstream.url
+        modules["database"].storage.url = upstream.url
+        print(f"{'page':<26}{'cache':>6}{'p50':>10}{'p95':>10}{'requests':>10}{'upstream':>10}")
+        for cold in (True, False):
+            for name, page in PAGES.items():
+                result = asyncio.run(_measure(modules, page, users, args, upstream, cold))
+                print(f"{name:<26}{'cold' if cold else 'warm':>6}{result['p50']:8.1f}ms{result['p95']:8.1f}ms"
+                      f"{result['requests']:10.1f}{result['upstream']:10.1f}")
+        modules["transport"].close()
+
+
+if __name__ == "__main__":
+    main()
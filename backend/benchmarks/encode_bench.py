@@ -0,0 +1,84 @@
+# encode time per response of 1k/10k listings through FastAPI's pipeline: normalize, validate against the
+# response model, serialize and render JSON (before), against API_FAST_RESPONSES: normalize, trim to the model's
+# fields and render with FastJSONResponse (after). also reports gzip/brotli size and time for the rendered body
+#
+#   python -m backend.benchmarks.encode_bench --sizes 1000 10000
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import time
+from typing import Any, Callable, Dict, List
+
+from .catalog import synthetic_catalog
+
+
+def _raw_rows(size: int) -> List[Dict[str, Any]]:
+    # rows as PostgREST returns them: prod_id rather than id, numeric columns sometimes as strings
+    rows = []
+    for item in synthetic_catalog(size):
+        row = dict(item, prod_id=item["id"], price=str(item["price"]), description=None, image_url=None)
+        del row["id"]
+        rows.append(row)
+    return rows
+
+
+def _timed(fn: Callable[[], Any], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="response encoding cost per listing page")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    from fastapi.responses import JSONResponse
+    from fastapi.routing import serialize_response
+    from fastapi.utils import create_response_field
+
+    from .. import database, responses, schemas
+
+    before_field = create_response_field("Response_before", List[schemas.Listing])
+    route = next(route for route in __import__("backend.main", fromlist=["app"]).app.routes
+                 if getattr(route, "path", "") == "/listings" and "GET" in route.methods)
+
+    def before(rows: List[Dict[str, Any]]) -> bytes:
+        items = [database._normalize_product(row) for row in rows]
+        content = asyncio.run(serialize_response(field=before_field, response_content=items))
+        return JSONResponse(content).body
+
+    def validated(rows: List[Dict[str, Any]]) -> bytes:
+        # today's default path: partial-shape union model with exclude_unset
+        items = [database._normalize_product(row) for row in rows]
+        content = asyncio.run(serialize_response(field=route.response_field, response_content=items, exclude_unset=True))
+        return JSONResponse(content).body
+
+    def fast(rows: List[Dict[str, Any]]) -> bytes:
+        items = [database.select_fields(database._normalize_product(row), database.LISTING_FIELDS) for row in rows]
+        return responses.FastJSONResponse(items).body
+
+    encoders = [("json", "gzip")] + ([("br", "br")] if responses.brotli is not None else [])
+    print(f"json encoder for the fast path: {'orjson' if responses.orjson is not None else 'stdlib json'}")
+    for size in args.sizes:
+        rows = _raw_rows(size)
+        body = fast(rows)
+        print(f"{size} listings, {len(body) / 1024:.0f} KiB of JSON")
+        timings = {name: _timed(lambda fn=fn: fn(rows), args.repeat) for name, fn in
+                   (("before", before), ("validated", validated), ("fast", fast))}
+        for name, ms in timings.items():
+            print(f"  {name:<10} {ms:8.1f} ms  {ms * 1000 / size:6.2f} us/listing  x{timings['before'] / ms:4.1f}")
+        for _, encoding in encoders:
+            ms = _timed(lambda: responses.compress(body, encoding), args.repeat)
+            compressed = responses.compress(body, encoding)
+            print(f"  {encoding:<10} {ms:8.1f} ms  {len(compressed) / 1024:6.0f} KiB ({len(compressed) / len(body):.0%})")
+
+
+if __name__ == "__main__":
+    main()
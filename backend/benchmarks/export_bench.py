@@ -0,0 +1,91 @@
+# peak Python memory and time to pull the whole catalog: GET /listings?limit=<all> (whole list built in memory,
+# then validated through the response model) against GET /listings/export (NDJSON streamed in chunks). the
+# in-memory PostgREST stand-in runs in a forked process, so only the API side is traced
+#
+#   python -m backend.benchmarks.export_bench --sizes 5000 20000 50000
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import importlib
+import os
+import time
+import tracemalloc
+from typing import Any, Dict, Tuple
+
+from .fake_supabase import FakeSupabase
+
+
+async def _pull(app: Any, path: str, query: str) -> Tuple[int, int]:
+    # drain the response without keeping it, returning (status, bytes received)
+    status = 0
+    received = 0
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET", "scheme": "http",
+        "path": path, "raw_path": path.encode(), "query_string": query.encode(), "root_path": "",
+        "headers": [(b"host", b"bench")], "client": ("127.0.0.1", 50000), "server": ("bench", 80),
+    }
+
+    done = asyncio.Event()
+    requested = False
+
+    async def receive() -> Dict[str, Any]:
+        # the request body once, then block until the response is sent, like a client that stays connected
+        nonlocal requested
+        if not requested:
+            requested = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await done.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message: Dict[str, Any]) -> None:
+        nonlocal status, received
+        if message["type"] == "http.response.start":
+            status = message["status"]
+        elif message["type"] == "http.response.body":
+            received += len(message.get("body", b""))
+
+    await app(scope, receive, send)
+    done.set()
+    return status, received
+
+
+async def _measure(main_module: Any, size: int) -> None:
+    for name, path, query in (("list", "/listings", f"limit={size}"), ("export", "/listings/export", "")):
+        tracemalloc.start()
+        started = time.perf_counter()
+        status, received = await _pull(main_module.app, path, query)
+        elapsed = (time.perf_counter() - started) * 1000
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print(f"{size:>6} rows  {name:<7} status={status} {received / 1024:8.0f} KiB  {elapsed:8.0f} ms"
+              f"  peak {peak / 1024 / 1024:7.1f} MiB")
+    await main_module.transport.aclose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="full-catalog pull: paged list vs NDJSON export")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[5000, 20000, 50000])
+    parser.add_argument("--chunk", type=int, default=1000)
+    args = parser.parse_args()
+
+    os.environ.setdefault("SUPABASE_API_KEY", "bench")
+    os.environ["API_EXPORT_CHUNK_SIZE"] = str(args.chunk)
+    os.environ["LISTING_CACHE_BACKEND"] = "off"
+    for size in args.sizes:
+        fake = FakeSupabase()
+        fake.seed("Product", [{"seller_id": f"seller-{n % 50}", "name": f"item {n}", "price": 5.0 + n % 100,
+                               "quantity": 1, "sold": False, "category": "decor"} for n in range(size)])
+        with fake.serve() as upstream:
+            os.environ["SUPABASE_URL"] = upstream.url
+            os.environ["API_MAX_PAGE_SIZE"] = str(size)
+            main_module = importlib.import_module("backend.main")
+            main_module.database.SUPABASE_URL = upstream.url
+            main_module.database.storage.url = upstream.url
+            main_module.MAX_PAGE_SIZE = size
+            asyncio.run(_measure(main_module, size))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,405 @@
+# in-memory stand-in for the parts of Supabase the backend talks to, served through StubUpstream:
+# PostgREST table reads and writes (operator filters, or/and trees, embeds, order, Range and exact counts,
+# return=representation), the checkout_listing RPC from backend/sql, and the auth admin user lookup.
+# the handler runs on the stub's single event loop, so every request is applied atomically like a row lock would.
+# run it on its own as a local Supabase for the API:
+#
+#   python -m backend.benchmarks.fake_supabase --port 54321 --listings 5000 --latency 0.01
+
+from __future__ import annotations
+
+import argparse
+import itertools
+import random
+import re
+import uuid
+from functools import lru_cache
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .catalog import synthetic_catalog
+from .stub_upstream import StubUpstream
+
+Row = Dict[str, Any]
+Response = Tuple[int, Any, Dict[str, str]]
+
+_EMBED = re.compile(r"^(?:(\w+):)?(\w+)(!inner)?\((.*)\)$")
+_EPOCH = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+def _split_top_level(text: str) -> List[str]:
+    # split on commas that are not inside parentheses or double quotes
+    parts: List[str] = []
+    depth = 0
+    quoted = False
+    current = ""
+    for char in text:
+        if char == '"':
+            quoted = not quoted
+        elif not quoted and char == "(":
+            depth += 1
+        elif not quoted and char == ")":
+            depth -= 1
+        elif not quoted and depth == 0 and char == ",":
+            parts.append(current)
+            current = ""
+            continue
+        current += char
+    if current:
+        parts.append(current)
+    return parts
+
+
+@lru_cache(maxsize=256)
+def _parse_select(select: str) -> Tuple[Tuple[str, ...], Tuple[Tuple[str, str, bool], ...]]:
+    # (plain columns, (alias, column, inner) embeds) of a select list, parsed once per distinct select
+    columns = _split_top_level(select or "*")
+    embeds = []
+    for spec in columns:
+        match = _EMBED.match(spec)
+        if match:
+            alias, column, inner, _ = match.groups()
+            embeds.append((alias or column, column, bool(inner)))
+    return tuple(column for column in columns if "(" not in column), tuple(embeds)
+
+
+def _coerce(raw: str, like: Any) -> Any:
+    # interpret a filter operand with the type of the column value it is compared against
+    raw = raw.strip('"')
+    if isinstance(like, bool):
+        return raw == "true"
+    if isinstance(like, (int, float)):
+        try:
+            return float(raw)
+        except ValueError:
+            return raw
+    return raw
+
+
+def _like(pattern: str, value: Any, flags: int = 0) -> bool:
+    # * and % match anything; a backslash makes the next character literal
+    regex = "".join(
+        re.escape(token[1]) if token.startswith("\\") else ".*" if token in {"*", "%"} else "." if token == "_" else re.escape(token)
+        for token in re.findall(r"\\.|.", pattern.strip('"'), re.DOTALL)
+    )
+    regex = "^" + regex + "$"
+    return value is not None and re.match(regex, str(value), flags | re.DOTALL) is not None
+
+
+def _matches(value: Any, expression: str) -> bool:
+    # evaluate a PostgREST "op.operand" expression against a column value
+    negate = expression.startswith("not.")
+    if negate:
+        expression = expression[4:]
+    op, _, operand = expression.partition(".")
+    if op == "is":
+        expected = {"null": None, "true": True, "false": False}[operand]
+        result = value is expected if expected is None else value == expected
+    elif op == "in":
+        members = [item.strip('"') for item in _split_top_level(operand.strip("()"))]
+        result = value is not None and str(value if not isinstance(value, bool) else str(value).lower()) in members
+    elif op in {"like", "ilike"}:
+        result = _like(operand, value, re.IGNORECASE if op == "ilike" else 0)
+    elif op in {"fts", "plfts", "phfts", "wfts"}:
+        words = set(re.findall(r"\w+", str(value or "").lower()))
+        result = all(term in words for term in re.findall(r"\w+", operand.lower()))
+    elif value is None:
+        result = False
+    else:
+        target = _coerce(operand, value)
+        try:
+            result = {
+                "eq": value == target,
+                "neq": value != target,
+                "gt": value > target,
+                "gte": value >= target,
+                "lt": value < target,
+                "lte": value <= target,
+            }[op]
+        except TypeError:
+            result = False
+    return not result if negate else result
+
+
+def _logic(row: Row, tree: str, conjunction: bool) -> bool:
+    # evaluate the body of or=(...) / and=(...), e.g. created_at.lt."X",and(created_at.eq."X",id.lt."Y")
+    results = []
+    for term in _split_top_level(tree.strip()[1:-1]):
+        if term.startswith(("and(", "or(")):
+            nested, _, body = term.partition("(")
+            results.append(_logic(row, "(" + body, nested == "and"))
+        else:
+            column, _, expression = term.partition(".")
+            results.append(_matches(row.get(column), expression))
+    return all(results) if conjunction else any(results)
+
+
+class FakeSupabase:
+    def __init__(self, products_table: str = "Product", product_id: str = "prod_id",
+                 transactions_table: str = "Transactions", transaction_id: str = "id"):
+        self.id_fields = {products_table: product_id, transactions_table: transaction_id}
+        self.tables: Dict[str, List[Row]] = {products_table: [], transactions_table: []}
+        # primary key -> row, so id lookups (most of the API's reads) do not scan the table
+        self._index: Dict[str, Dict[str, Row]] = {products_table: {}, transactions_table: {}}
+        # owner column -> value -> primary key -> row, for the per-user reads behind the dashboard
+        self._lookups: Dict[str, Dict[str, Dict[Any, Dict[str, Row]]]] = {
+            products_table: {"seller_id": {}}, transactions_table: {"buyer_id": {}, product_id: {}},
+        }
+        # table -> column -> (target table, target column) for alias:column(*) embeds
+        self.foreign_keys: Dict[str, Dict[str, Tuple[str, str]]] = {
+            transactions_table: {product_id: (products_table, product_id)},
+        }
+        self.products_table = products_table
+        self.transactions_table = transactions_table
+        self.users: Dict[str, Row] = {}
+        self.rpcs: Dict[str, Callable[[Dict[str, Any]], Response]] = {"checkout_listing": self._checkout_listing}
+        self._clock = itertools.count(1)
+
+    # seeding, done in the parent before the stub process forks
+
+    def _stamp(self, row: Row, table: str) -> Row:
+        row = dict(row)
+        row.setdefault(self.id_fields[table], str(uuid.uuid4()))
+        row.setdefault("created_at", (_EPOCH + timedelta(microseconds=next(self._clock))).isoformat())
+        return row
+
+    def seed(self, table: str, rows: List[Row]) -> None:
+        for row in rows:
+            self._append(table, self._stamp(row, table))
+
+    def _append(self, table: str, row: Row) -> None:
+        self.tables[table].append(row)
+        self._index[table][str(row[self.id_fields[table]])] = row
+        self._relink(table, row, {}, row)
+
+    def _relink(self, table: str, row: Row, old: Row, new: Row) -> None:
+        # move row between lookup buckets for any looked-up column that changes from old to new
+        key = str(row[self.id_fields[table]])
+        for column, buckets in self._lookups[table].items():
+            if column not in new or (column in old and old[column] == new[column]):
+                continue
+            if column in old:
+                buckets.get(old[column], {}).pop(key, None)
+            buckets.setdefault(new[column], {})[key] = row
+
+    def _write(self, table: str, row: Row, changes: Row) -> None:
+        self._relink(table, row, dict(row), changes)
+        row.update(changes)
+
+    def add_user(self, user_id: str, email: str, **metadata: Any) -> None:
+        self.users[user_id] = {"id": user_id, "email": email, "user_metadata": metadata}
+
+    def seed_marketplace(self, listings: int, buyers: int = 200, orders: int = 0, seed: int = 7) -> Dict[str, List[str]]:
+        # a synthetic catalog with every seller and buyer registered as a user, plus orders on random listings;
+        # returns the seller, buyer and listing ids for driving requests
+        rng = random.Random(seed)
+        rows = [dict(item, prod_id=item.pop("id")) for item in synthetic_catalog(listings, sellers=max(1, listings // 10), seed=seed)]
+        self.seed(self.products_table, rows)
+        sellers = sorted({row["seller_id"] for row in rows})
+        buyer_ids = [str(uuid.UUID(int=rng.getrandbits(128))) for _ in range(buyers)]
+        for n, user_id in enumerate(sellers + buyer_ids):
+            self.add_user(user_id, f"user{n}@example.edu", full_name=f"User {n}", profile_description="load test user")
+        product_id = self.id_fields[self.products_table]
+        self.seed(self.transactions_table, [
+            {product_id: rng.choice(rows)[product_id], "buyer_id": rng.choice(buyer_ids), "payment_method": "cash"}
+            for _ in range(orders)
+        ])
+        return {"sellers": sellers, "buyers": buyer_ids, "listings": [row[product_id] for row in rows]}
+
+    def serve(self, latency: float = 0.0, jitter: float = 0.0, port: int = 0, capacity: int = 0) -> StubUpstream:
+        return StubUpstream(self.handle, latency=latency, port=port, jitter=jitter, capacity=capacity)
+
+    # request handling
+
+    def handle(self, method: str, path: str, params: Dict[str, str], headers: Dict[str, str], body: Any) -> Response:
+        if path.startswith("/auth/v1/admin/users/"):
+            user = self.users.get(path.rsplit("/", 1)[1])
+            return (200, user, {}) if user else (404, {"msg": "User not found"}, {})
+        if path.startswith("/rest/v1/rpc/"):
+            rpc = self.rpcs.get(path.rsplit("/", 1)[1])
+            return rpc(body or {}) if rpc else (404, {"message": "function not found"}, {})
+        table = path.rsplit("/", 1)[1]
+        if not path.startswith("/rest/v1/") or table not in self.tables:
+            return 404, {"message": f"relation {table} does not exist"}, {}
+        prefer = headers.get("prefer", "")
+        if method in {"GET", "HEAD"}:
+            return self._read(table, params, headers, prefer)
+        if method == "POST":
+            return self._insert(table, params, body, prefer)
+        if method == "PATCH":
+            return self._update(table, params, body, prefer)
+        if method == "DELETE":
+            return self._delete(table, params, prefer)
+        return 405, {"message": "method not allowed"}, {}
+
+    def _embed(self, table: str, row: Row, select: str, params: Dict[str, str]) -> Optional[Row]:
+        # apply alias:column(*) embeds and alias.column filters; None drops the row (an !inner embed that failed).
+        # embeds are resolved and filtered before the row is copied, so filtered-out rows cost no allocation
+        plain, embeds = _parse_select(select)
+        embedded: Dict[str, Optional[Row]] = {}
+        for alias, column, inner in embeds:
+            target_table, target_field = self.foreign_keys[table][column]
+            target = (self._index[target_table].get(str(row.get(column))) if target_field == self.id_fields[target_table]
+                      else next((other for other in self.tables[target_table] if other.get(target_field) == row.get(column)), None))
+            prefix = f"{alias}."
+            if target is not None and not all(
+                _logic(target, value, key == prefix + "and") if key in {prefix + "and", prefix + "or"}
+                else _matches(target.get(key[len(prefix):]), value)
+                for key, value in params.items() if key.startswith(prefix)
+            ):
+                target = None
+            if target is None and inner:
+                return None
+            embedded[alias] = target
+        shaped = dict(row) if plain == ("*",) else {column: row.get(column) for column in plain}
+        for alias, target in embedded.items():
+            shaped[alias] = dict(target) if target is not None else None
+        return shaped
+
+    def _candidates(self, table: str, params: Dict[str, str]) -> List[Row]:
+        expression = params.get(self.id_fields[table], "")
+        if expression.startswith("eq."):
+            row = self._index[table].get(expression[3:].strip('"'))
+            return [row] if row is not None else []
+        if expression.startswith("in."):
+            keys = [item.strip('"') for item in _split_top_level(expression[3:].strip("()"))]
+            return [self._index[table][key] for key in dict.fromkeys(keys) if key in self._index[table]]
+        for column, buckets in self._lookups[table].items():
+            expression = params.get(column, "")
+            if expression.startswith("eq."):
+                return list(buckets.get(expression[3:].strip('"'), {}).values())
+        # an embed filter on a looked-up target column, e.g. a seller's orders via product.seller_id
+        for alias, column, _ in _parse_select(params.get("select", "*"))[1]:
+            target_table, target_field = self.foreign_keys[table][column]
+            if column not in self._lookups[table] or target_field != self.id_fields[target_table]:
+                continue
+            for target_column, buckets in self._lookups[target_table].items():
+                expression = params.get(f"{alias}.{target_column}", "")
+                if expression.startswith("eq."):
+                    targets = buckets.get(expression[3:].strip('"'), {})
+                    return [row for key in targets for row in self._lookups[table][column].get(key, {}).values()]
+        return self.tables[table]
+
+    def _select(self, table: str, params: Dict[str, str]) -> List[Row]:
+        # rows of table matching column filters and or/and trees, not yet embedded
+        rows = []
+        for row in self._candidates(table, params):
+            keep = True
+            for key, value in params.items():
+                if key in {"select", "order", "limit", "offset", "on_conflict", "columns"} or "." in key:
+                    continue
+                if key in {"or", "and"}:
+                    keep = _logic(row, value, key == "and")
+                else:
+                    keep = _matches(row.get(key), value)
+                if not keep:
+                    break
+            if keep:
+                rows.append(row)
+        return rows
+
+    def _read(self, table: str, params: Dict[str, str], headers: Dict[str, str], prefer: str) -> Response:
+        rows = [shaped for shaped in (self._embed(table, row, params.get("select", "*"), params)
+                                      for row in self._select(table, params)) if shaped is not None]
+        for term in reversed([term for term in params.get("order", "").split(",") if term]):
+            column, _, direction = term.partition(".")
+            rows.sort(key=lambda row: (row.get(column) is None, row.get(column)), reverse=direction.startswith("desc"))
+        total = len(rows)
+        start, end = 0, total - 1
+        if "range" in headers:
+            first, _, last = headers["range"].partition("-")
+            start, end = int(first), min(int(last) if last else total - 1, total - 1)
+        if "limit" in params:
+            start = int(params.get("offset", start))
+            end = min(start + int(params["limit"]) - 1, total - 1)
+        window = rows[start:end + 1]
+        shown = f"{start}-{start + len(window) - 1}" if window else "*"
+        extra = {"Content-Range": f"{shown}/{total if 'count=exact' in prefer else '*'}"}
+        return (206 if len(window) < total and "range" in headers else 200), window, extra
+
+    def _represent(self, table: str, rows: List[Row], params: Dict[str, str], prefer: str, status: int) -> Response:
+        if "return=representation" not in prefer:
+            return 204, None, {}
+        shaped = [self._embed(table, row, params.get("select", "*"), {}) for row in rows]
+        return status, shaped, {}
+
+    def _insert(self, table: str, params: Dict[str, str], body: Any, prefer: str) -> Response:
+        records = body if isinstance(body, list) else [body]
+        id_field = self.id_fields[table]
+        upsert = "resolution=merge-duplicates" in prefer
+        written = []
+        for record in records:
+            existing = self._index[table].get(str(record.get(id_field)))
+            if existing is not None:
+                if not upsert:
+                    return 409, {"code": "23505", "message": "duplicate key value violates unique constraint"}, {}
+                self._write(table, existing, record)
+                written.append(existing)
+                continue
+            row = self._stamp(record, table)
+            self._append(table, row)
+            written.append(row)
+        return self._represent(table, written, params, prefer, 201)
+
+    def _update(self, table: str, params: Dict[str, str], body: Any, prefer: str) -> Response:
+        rows = self._select(table, params)
+        for row in rows:
+            self._write(table, row, body or {})
+        return self._represent(table, rows, params, prefer, 200)
+
+    def _delete(self, table: str, params: Dict[str, str], prefer: str) -> Response:
+        rows = self._select(table, params)
+        doomed = {id(row) for row in rows}
+        self.tables[table] = [row for row in self.tables[table] if id(row) not in doomed]
+        for row in rows:
+            self._index[table].pop(str(row[self.id_fields[table]]), None)
+            for column, buckets in self._lookups[table].items():
+                buckets.get(row.get(column), {}).pop(str(row[self.id_fields[table]]), None)
+        return self._represent(table, rows, params, prefer, 200)
+
+    def _checkout_listing(self, args: Dict[str, Any]) -> Response:
+        # same contract as backend/sql/checkout_listing.sql
+        product_id = self.id_fields[self.products_table]
+        product = self._index[self.products_table].get(str(args.get("p_listing_id")))
+        refusal = None
+        if product is None:
+            refusal = "not_found"
+        elif product.get("seller_id") == args.get("p_buyer_id"):
+            refusal = "own_listing"
+        elif product.get("sold"):
+            refusal = "sold"
+        elif (product.get("quantity") if product.get("quantity") is not None else 1) <= 0:
+            refusal = "out_of_stock"
+        if refusal:
+            return 400, {"code": "P0001", "message": refusal, "details": None, "hint": None}, {}
+        quantity = product.get("quantity") if product.get("quantity") is not None else 1
+        self._write(self.products_table, product, {"quantity": max(quantity - 1, 0), "sold": quantity <= 1})
+        order = self._stamp(
+            {product_id: product[product_id], "buyer_id": args.get("p_buyer_id"), "payment_method": args.get("p_payment_method")},
+            self.transactions_table,
+        )
+        self._append(self.transactions_table, order)
+        return 200, dict(order, product=dict(product)), {}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="serve an in-memory Supabase stand-in with a synthetic marketplace")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=54321)
+    parser.add_argument("--listings", type=int, default=5000)
+    parser.add_argument("--buyers", type=int, default=200)
+    parser.add_argument("--orders", type=int, default=1000)
+    parser.add_argument("--latency", type=float, default=0.0, help="injected latency per request in seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="mean of extra exponential latency in seconds")
+    args = parser.parse_args()
+
+    fake = FakeSupabase()
+    users = fake.seed_marketplace(args.listings, args.buyers, args.orders)
+    upstream = StubUpstream(fake.handle, latency=args.latency, host=args.host, port=args.port, jitter=args.jitter)
+    print(f"SUPABASE_URL=http://{args.host}:{args.port}  ({args.listings} listings, "
+          f"{len(users['sellers']) + len(users['buyers'])} users, {args.orders} orders; any SUPABASE_API_KEY works)")
+    upstream.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
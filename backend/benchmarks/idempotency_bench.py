@@ -0,0 +1,119 @@
+# retried purchases with and without an Idempotency-Key, through the app to the in-memory Supabase stand-in.
+# every purchase is one buyer taking one unit of a listing with stock to spare; the client gives up after
+# --client-timeout and sends the POST again while the first is still running, and for --lost of the purchases
+# the response never arrives and the client retries once more afterwards. reports orders created and units
+# taken per purchase (1.0 is correct) and upstream calls per purchase
+#
+#   python -m backend.benchmarks.idempotency_bench --purchases 200 --latency 0.02 --client-timeout 0.05 --lost 0.3
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import importlib
+import json
+import os
+import random
+import time
+from typing import Any, Dict, List, Tuple
+
+import requests
+
+from .async_bench import asgi_call
+from .catalog import percentile
+from .fake_supabase import FakeSupabase
+from .load_test import JWT_SECRET, token_for
+
+STOCK = 10
+
+
+async def _purchase(app: Any, buyer: str, listing_id: str, key: str, args: argparse.Namespace,
+                    rng: random.Random, latencies: List[float]) -> None:
+    headers = [(b"authorization", f"Bearer {token_for(buyer)}".encode()), (b"content-type", b"application/json")]
+    if key:
+        headers.append((b"idempotency-key", key.encode()))
+    body = json.dumps({"listing_id": listing_id}).encode()
+
+    def attempt() -> "asyncio.Task[Any]":
+        return asyncio.ensure_future(asgi_call(app, "POST", "/orders", "", headers, body))
+
+    started = time.perf_counter()
+    first = attempt()
+    done, _ = await asyncio.wait([first], timeout=args.client_timeout)
+    # the server keeps working on a request the client stopped waiting for
+    answered = first if done else attempt()
+    status, _, _ = await answered
+    latencies.append((time.perf_counter() - started) * 1000)
+    await first
+    if rng.random() < args.lost:
+        status, _, _ = await attempt()
+    assert status in (201, 400, 409), status
+
+
+def _tally(fake: FakeSupabase, upstream: Any, listings: List[str]) -> Tuple[int, int]:
+    # orders created and units taken on these listings, read back over HTTP: the stand-in runs in its own process
+    ids = f"in.({','.join(listings)})"
+    products = requests.get(f"{upstream.url}/rest/v1/{fake.products_table}",
+                            params={"select": "prod_id,quantity", "prod_id": ids}).json()
+    orders = requests.get(f"{upstream.url}/rest/v1/{fake.transactions_table}", params={"select": "id", "prod_id": ids}).json()
+    return len(orders), sum(STOCK - row["quantity"] for row in products)
+
+
+async def _run(app: Any, fake: FakeSupabase, upstream: Any, users: Dict[str, List[str]], listings: List[str], keyed: bool,
+               args: argparse.Namespace) -> Dict[str, float]:
+    rng = random.Random(args.seed)
+    # the fixture's buyers also sell, and buying your own listing is refused
+    sellers = {listing_id: fake._index[fake.products_table][listing_id]["seller_id"] for listing_id in listings}
+    buyers = [rng.choice([buyer for buyer in users["buyers"] if buyer != sellers[listing_id]]) for listing_id in listings]
+    calls_before = upstream.requests
+    latencies: List[float] = []
+    await asyncio.gather(*(
+        _purchase(app, buyers[n], listing_id, f"purchase-{n}" if keyed else "", args, random.Random(args.seed + n),
+                  latencies)
+        for n, listing_id in enumerate(listings)
+    ))
+    calls = upstream.requests - calls_before
+    orders, taken = _tally(fake, upstream, listings)
+    return {
+        "orders": orders / len(listings),
+        "taken": taken / len(listings),
+        "upstream": calls / len(listings),
+        "p50": percentile(latencies, 50),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="retried POST /orders with and without Idempotency-Key")
+    parser.add_argument("--purchases", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.02, help="injected upstream latency in seconds")
+    parser.add_argument("--client-timeout", type=float, default=0.05, help="seconds before the client retries")
+    parser.add_argument("--lost", type=float, default=0.3, help="share of purchases whose response is lost")
+    parser.add_argument("--listings", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    fake = FakeSupabase()
+    users = fake.seed_marketplace(args.listings, 200, 0, args.seed)
+    # separate listings for each run, all with stock to spare
+    chosen = random.Random(args.seed).sample(users["listings"], 2 * args.purchases)
+    for listing_id in chosen:
+        fake._index[fake.products_table][listing_id].update(quantity=STOCK, sold=False)
+    os.environ.setdefault("SUPABASE_API_KEY", "bench")
+    os.environ["SUPABASE_JWT_SECRET"] = JWT_SECRET
+    with fake.serve(latency=args.latency) as upstream:
+        os.environ["SUPABASE_URL"] = upstream.url
+        modules = {name: importlib.import_module(f"backend.{name}") for name in ("database", "main", "transport")}
+        modules["database"].SUPABASE_URL = upstream.url
+        modules["database"].storage.url = upstream.url
+        for keyed in (False, True):
+            listings = chosen[args.purchases:] if keyed else chosen[:args.purchases]
+            result = asyncio.run(_run(modules["main"].app, fake, upstream, users, listings, keyed, args))
+            asyncio.run(modules["transport"].aclose())
+            print(f"{'Idempotency-Key' if keyed else 'no key':<15} orders/purchase={result['orders']:5.2f}"
+                  f" units taken/purchase={result['taken']:5.2f} upstream calls/purchase={result['upstream']:5.2f}"
+                  f" p50={result['p50']:7.1f}ms")
+        modules["transport"].close()
+
+
+if __name__ == "__main__":
+    main()
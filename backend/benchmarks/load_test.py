@@ -0,0 +1,228 @@
+# repeatable load test of backend/main.py against the in-memory Supabase stand-in: closed-loop clients run
+# the frontend's page flows (browse, search, detail, checkout, dashboard, or a weighted mix) in-process and
+# report throughput, p50/p95/p99 latency per page flow and upstream calls per flow. --json saves the results
+# with the commit they were measured on; --compare prints the change against a saved run
+#
+#   python -m backend.benchmarks.load_test --concurrency 50 --duration 10 --latency 0.01 --json before.json
+#   python -m backend.benchmarks.load_test --concurrency 50 --duration 10 --latency 0.01 --compare before.json
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import importlib
+import json
+import os
+import random
+import subprocess
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import jwt
+
+from .async_bench import asgi_call
+from .catalog import CATEGORIES, NOUNS, percentile
+from .fake_supabase import FakeSupabase
+
+JWT_SECRET = "load-test-secret"
+SCENARIOS = ("browse", "search", "detail", "checkout", "dashboard", "mixed")
+MIX = (("browse", 50), ("detail", 25), ("search", 10), ("dashboard", 10), ("checkout", 5))
+DASHBOARD_ORDER_FIELDS = "id,listing_id,payment_method,created_at,product.name,product.price"
+
+
+class Client:
+    # one simulated user: issues requests in-process and records any unexpected status
+    def __init__(self, app: Any, rng: random.Random, users: Dict[str, List[str]]):
+        self.app = app
+        self.rng = rng
+        self.users = users
+        self.errors = 0
+
+    async def get(self, path: str, query: str = "", user: Optional[str] = None,
+                  expect: Tuple[int, ...] = (200,)) -> Tuple[Dict[str, str], Any]:
+        return await self.call("GET", path, query, user, None, expect)
+
+    async def call(self, method: str, path: str, query: str = "", user: Optional[str] = None, payload: Any = None,
+                   expect: Tuple[int, ...] = (200,)) -> Tuple[Dict[str, str], Any]:
+        headers = [(b"accept-encoding", b"gzip")]
+        if user is not None:
+            headers.append((b"authorization", f"Bearer {token_for(user)}".encode()))
+        body = b""
+        if payload is not None:
+            headers.append((b"content-type", b"application/json"))
+            body = json.dumps(payload).encode()
+        status, response_headers, raw = await asgi_call(self.app, method, path, query, headers, body)
+        if status not in expect:
+            self.errors += 1
+        data = json.loads(raw) if raw and response_headers.get("content-type", "").startswith("application/json") \
+            and response_headers.get("content-encoding") is None else None
+        return response_headers, data
+
+
+_tokens: Dict[str, str] = {}
+
+
+def token_for(user_id: str) -> str:
+    token = _tokens.get(user_id)
+    if token is None:
+        claims = {"sub": user_id, "aud": "authenticated", "exp": int(time.time()) + 24 * 3600}
+        token = _tokens[user_id] = jwt.encode(claims, JWT_SECRET, algorithm="HS256")
+    return token
+
+
+# page flows, each one user-visible action that may issue several requests
+
+async def browse(client: Client) -> None:
+    # home page with a category selected, sometimes sorted by price and paged once
+    query = f"sold=false&limit=24&category={client.rng.choice(CATEGORIES)}"
+    if client.rng.random() < 0.3:
+        query += "&sort=price&direction=asc"
+    headers, _ = await client.get("/listings", query)
+    if headers.get("x-next-cursor") and client.rng.random() < 0.3:
+        await client.get("/listings", f"{query}&cursor={headers['x-next-cursor']}")
+
+
+async def search(client: Client) -> None:
+    await client.get("/listings", f"sold=false&limit=20&search={client.rng.choice(NOUNS)}")
+
+
+async def detail(client: Client) -> None:
+    # item page: the listing with its seller's profile
+    listing_id = client.rng.choice(client.users["listings"])
+    await client.get(f"/listings/{listing_id}/detail")
+
+
+async def checkout(client: Client) -> None:
+    # buy a random listing; refusals for sold out or contended listings are expected outcomes, not errors
+    listing_id = client.rng.choice(client.users["listings"])
+    await client.call("POST", "/orders", user=client.rng.choice(client.users["buyers"]),
+                      payload={"listing_id": listing_id, "payment_method": "cash"}, expect=(201, 400, 404, 409))
+
+
+async def dashboard(client: Client) -> None:
+    # orders page (purchases and sales in one request) and the seller's own listings
+    user = client.rng.choice(client.users["sellers"])
+    await client.get("/dashboard", f"include=purchases,sales&fields={DASHBOARD_ORDER_FIELDS}", user)
+    await client.get("/listings", f"seller_id={user}", user)
+
+
+FLOWS: Dict[str, Callable[[Client], Awaitable[None]]] = {
+    "browse": browse, "search": search, "detail": detail, "checkout": checkout, "dashboard": dashboard,
+}
+
+
+async def mixed(client: Client) -> None:
+    names, weights = zip(*MIX)
+    await FLOWS[client.rng.choices(names, weights)[0]](client)
+
+
+FLOWS["mixed"] = mixed
+
+
+async def _drive(app: Any, flow: Callable[[Client], Awaitable[None]], users: Dict[str, List[str]],
+                 concurrency: int, duration: float, seed: int) -> Tuple[List[float], int, float]:
+    latencies: List[float] = []
+    clients = [Client(app, random.Random(seed * 1000 + n), users) for n in range(concurrency)]
+    deadline = time.perf_counter() + duration
+
+    async def run(client: Client) -> None:
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            await flow(client)
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(run(client) for client in clients))
+    return latencies, sum(client.errors for client in clients), time.perf_counter() - started
+
+
+async def _scenario(modules: Dict[str, Any], name: str, users: Dict[str, List[str]], args: argparse.Namespace,
+                    upstream: Any) -> Dict[str, Any]:
+    # each scenario starts with empty caches, warms up, then measures
+    for cache in (modules["cache"].listing_cache, modules["cache"].profile_cache, modules["cache"].etag_cache):
+        cache.clear()
+    app = modules["main"].app
+    await _drive(app, FLOWS[name], users, args.concurrency, args.warmup, args.seed)
+    before = upstream.requests
+    latencies, errors, elapsed = await _drive(app, FLOWS[name], users, args.concurrency, args.duration, args.seed)
+    await modules["transport"].aclose()
+    flows = len(latencies)
+    return {
+        "flows": flows,
+        "flows_per_s": round(flows / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p95_ms": round(percentile(latencies, 95), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+        "errors": errors,
+        "upstream_per_flow": round((upstream.requests - before) / flows, 2) if flows else 0.0,
+    }
+
+
+def _commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _print(results: Dict[str, Dict[str, Any]], baseline: Optional[Dict[str, Any]]) -> None:
+    columns = ("flows_per_s", "p50_ms", "p95_ms", "p99_ms", "upstream_per_flow", "errors")
+    print(f"{'scenario':<10}" + "".join(f"{column:>20}" for column in columns))
+    for name, result in results.items():
+        cells = []
+        for column in columns:
+            cell = f"{result[column]}"
+            previous = (baseline or {}).get("results", {}).get(name, {}).get(column)
+            if previous:
+                cell += f" ({(result[column] - previous) / previous:+.0%})"
+            cells.append(f"{cell:>20}")
+        print(f"{name:<10}" + "".join(cells))
+    if baseline:
+        print(f"compared with {baseline.get('commit') or 'baseline'} ({baseline.get('config')})")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="load test of the API against the Supabase stand-in")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--duration", type=float, default=10.0, help="measured seconds per scenario")
+    parser.add_argument("--warmup", type=float, default=2.0, help="unmeasured seconds before each scenario")
+    parser.add_argument("--latency", type=float, default=0.01, help="injected upstream latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.002, help="mean extra exponential upstream latency")
+    parser.add_argument("--listings", type=int, default=5000)
+    parser.add_argument("--buyers", type=int, default=500)
+    parser.add_argument("--orders", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--compare", help="results file from an earlier run to compare against")
+    args = parser.parse_args()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as handle:
+            baseline = json.load(handle)
+
+    fake = FakeSupabase()
+    users = fake.seed_marketplace(args.listings, args.buyers, args.orders, args.seed)
+    os.environ.setdefault("SUPABASE_API_KEY", "load-test")
+    os.environ["SUPABASE_JWT_SECRET"] = JWT_SECRET
+    results: Dict[str, Dict[str, Any]] = {}
+    with fake.serve(latency=args.latency, jitter=args.jitter) as upstream:
+        os.environ["SUPABASE_URL"] = upstream.url
+        modules = {name: importlib.import_module(f"backend.{name}") for name in ("cache", "database", "main", "transport")}
+        modules["database"].SUPABASE_URL = upstream.url
+        modules["database"].storage.url = upstream.url
+        for name in args.scenarios:
+            results[name] = asyncio.run(_scenario(modules, name, users, args, upstream))
+        modules["transport"].close()
+
+    config = {key: getattr(args, key) for key in ("concurrency", "duration", "latency", "jitter", "listings", "seed")}
+    _print(results, baseline)
+    if args.json:
+        with open(args.json, "w") as handle:
+            json.dump({"commit": _commit(), "config": config, "results": results}, handle, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+# mixed traffic against a Supabase that slows down and then fails, with the upstream guard (resilience.py) on
+# and off. an open-loop generator sends uncached browse reads (low priority), listing detail reads (normal) and
+# checkouts (critical) at fixed rates through the app to the in-memory stand-in, which works on at most
+# --capacity requests at once so its latency grows with load. phases: healthy, slowed down (--slow-latency),
+# and an outage where every upstream call answers 503 while the listing cache has just expired. reports the
+# share of requests answered, shed (503) and failed per kind, with latency percentiles of the answered ones
+#
+#   python -m backend.benchmarks.overload_bench --duration 8 --capacity 16 --slow-latency 0.2
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import importlib
+import json
+import os
+import random
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Tuple
+
+from .async_bench import asgi_call
+from .catalog import percentile
+from .fake_supabase import FakeSupabase
+from .load_test import JWT_SECRET, token_for
+
+# kind -> requests per second
+RATES = {"browse": 40.0, "detail": 40.0, "checkout": 5.0}
+
+
+async def _request(app: Any, kind: str, rng: random.Random, users: Dict[str, List[str]],
+                   results: Dict[str, List[Tuple[int, float]]]) -> None:
+    started = time.perf_counter()
+    if kind == "browse":
+        # a price band nobody asked for yet, so it misses the cache like a long tail of searches
+        request = ("GET", "/listings", f"min_price={rng.uniform(0, 500):.2f}&limit=24", [], b"")
+    elif kind == "detail":
+        request = ("GET", f"/listings/{rng.choice(users['listings'][:500])}", "", [], b"")
+    else:
+        buyer = rng.choice(users["buyers"])
+        body = json.dumps({"listing_id": rng.choice(users["listings"])}).encode()
+        headers = [(b"authorization", f"Bearer {token_for(buyer)}".encode()), (b"content-type", b"application/json")]
+        request = ("POST", "/orders", "", headers, body)
+    method, path, query, headers, body = request
+    try:
+        status, _, _ = await asgi_call(app, method, path, query, headers, body)
+    except Exception:
+        status = 500
+    results[kind].append((status, (time.perf_counter() - started) * 1000))
+
+
+async def _phase(app: Any, users: Dict[str, List[str]], duration: float, scale: float,
+                 seed: int) -> Dict[str, List[Tuple[int, float]]]:
+    # Poisson arrivals per kind, independent of how fast responses come back
+    rng = random.Random(seed)
+    results: Dict[str, List[Tuple[int, float]]] = defaultdict(list)
+    tasks: List["asyncio.Task[None]"] = []
+
+    async def arrivals(kind: str, rate: float) -> None:
+        deadline = time.perf_counter() + duration
+        while time.perf_counter() < deadline:
+            await asyncio.sleep(rng.expovariate(rate * scale))
+            tasks.append(asyncio.ensure_future(_request(app, kind, rng, users, results)))
+
+    await asyncio.gather(*(arrivals(kind, rate) for kind, rate in RATES.items()))
+    await asyncio.gather(*tasks)
+    return results
+
+
+def _report(phase: str, guarded: bool, results: Dict[str, List[Tuple[int, float]]]) -> None:
+    for kind in RATES:
+        samples = results.get(kind, [])
+        answered = [ms for status, ms in samples if status < 500]
+        shed = sum(1 for status, _ in samples if status == 503)
+        failed = len(samples) - len(answered) - shed
+        total = len(samples) or 1
+        latency = f"p50={percentile(answered, 50):7.1f}ms p99={percentile(answered, 99):7.1f}ms" if answered else "-"
+        print(f"{phase:<9} guard={'on ' if guarded else 'off'} {kind:<9} answered={len(answered) / total:6.1%}"
+              f" 503={shed / total:6.1%} failed={failed / total:6.1%}  {latency}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="overload behaviour with and without the upstream guard")
+    parser.add_argument("--duration", type=float, default=8.0, help="seconds per phase")
+    parser.add_argument("--latency", type=float, default=0.02, help="healthy upstream latency in seconds")
+    parser.add_argument("--slow-latency", type=float, default=0.2, help="upstream latency while slowed down")
+    parser.add_argument("--capacity", type=int, default=16, help="requests the upstream works on at once")
+    parser.add_argument("--scale", type=float, default=1.0, help="multiplier for the request rates")
+    parser.add_argument("--listings", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    fake = FakeSupabase()
+    users = fake.seed_marketplace(args.listings, 200, 500, args.seed)
+    os.environ.setdefault("SUPABASE_API_KEY", "bench")
+    os.environ["SUPABASE_JWT_SECRET"] = JWT_SECRET
+    with fake.serve(latency=args.latency, capacity=args.capacity) as upstream:
+        os.environ["SUPABASE_URL"] = upstream.url
+        modules = {name: importlib.import_module(f"backend.{name}")
+                   for name in ("cache", "database", "main", "resilience", "transport")}
+        modules["database"].SUPABASE_URL = upstream.url
+        modules["database"].storage.url = upstream.url
+        app = modules["main"].app
+        guard = modules["resilience"].upstream_guard
+        caches = (modules["cache"].listing_cache, modules["cache"].etag_cache)
+        for guarded in (False, True):
+            # fresh limiters and breakers for each run
+            guard.__init__(guarded)
+            for phase in ("healthy", "slow", "outage"):
+                upstream.latency = args.slow_latency if phase == "slow" else args.latency
+                upstream.fail_status = 0
+                for cache in caches:
+                    cache.clear()
+                if phase == "outage":
+                    # the detail pages were read before and their entries have just expired
+                    listing_cache = caches[0]
+                    listing_cache.ttl, ttl = 0.0, listing_cache.ttl
+                    modules["database"].get_listings_by_id(users["listings"][:500])
+                    listing_cache.ttl = ttl
+                    upstream.fail_status = 503
+                results = asyncio.run(_phase(app, users, args.duration, args.scale, args.seed))
+                asyncio.run(modules["transport"].aclose())
+                _report(phase, guarded, results)
+            stats = guard.stats()
+            print(f"  limiters: {json.dumps({name: limiter['shed'] for name, limiter in stats['limiters'].items()})}"
+                  f" stale served: {stats['served_stale']}")
+        modules["transport"].close()
+
+
+if __name__ == "__main__":
+    main()
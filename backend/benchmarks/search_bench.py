@@ -0,0 +1,112 @@
+# p50/p95/p99 latency of GET /listings?search= on a synthetic catalog, indexed vs the old linear scan
+#
+#   python -m backend.benchmarks.search_bench --size 100000 --queries 500
+
+from __future__ import annotations
+
+import argparse
+import random
+import time
+from typing import Any, Dict, List
+
+from ..search import MATCH_THRESHOLD, SearchIndex, score_listing
+from .catalog import ADJECTIVES, NOUNS, percentile, synthetic_catalog
+
+
+def _typo(rng: random.Random, word: str) -> str:
+    if len(word) < 4:
+        return word
+    pos = rng.randrange(1, len(word) - 1)
+    return word[:pos] + word[pos + 1 :]
+
+
+def build_queries(count: int, seed: int = 11) -> List[str]:
+    rng = random.Random(seed)
+    queries = []
+    for _ in range(count):
+        kind = rng.random()
+        noun = rng.choice(NOUNS)
+        if kind < 0.35:
+            queries.append(noun)
+        elif kind < 0.55:
+            queries.append(noun[: rng.randint(2, max(2, len(noun) - 1))])
+        elif kind < 0.8:
+            queries.append(_typo(rng, noun))
+        else:
+            queries.append(f"{rng.choice(ADJECTIVES)} {noun}")
+    return queries
+
+
+def linear_search(listings: List[Dict[str, Any]], query: str) -> List[Dict[str, Any]]:
+    term = query.strip().lower()
+    scored = [(score_listing(term, item), item) for item in listings]
+    scored = [pair for pair in scored if pair[0] >= MATCH_THRESHOLD]
+    scored.sort(key=lambda pair: pair[0], reverse=True)
+    return [item for _, item in scored]
+
+
+def _timed(fn, queries: List[str]) -> List[float]:
+    samples = []
+    for query in queries:
+        start = time.perf_counter()
+        fn(query)
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def _report(label: str, samples: List[float]) -> None:
+    print(
+        f"{label:<28} n={len(samples):<6} p50={percentile(samples, 50):8.2f}ms "
+        f"p95={percentile(samples, 95):8.2f}ms p99={percentile(samples, 99):8.2f}ms"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="search latency benchmark")
+    parser.add_argument("--size", type=int, default=100_000, help="number of synthetic listings")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--baseline-size", type=int, default=2_000, help="catalog size for the linear scan comparison (0 to skip)")
+    args = parser.parse_args()
+
+    catalog = synthetic_catalog(args.size)
+    queries = build_queries(args.queries)
+
+    index = SearchIndex(ttl=0)
+    start = time.perf_counter()
+    index.rebuild(catalog)
+    print(f"index build: {len(index)} listings in {(time.perf_counter() - start):.2f}s")
+
+    _report(f"indexed ({args.size})", _timed(index.search, queries))
+
+    churn = synthetic_catalog(1000, seed=99)
+    start = time.perf_counter()
+    for listing in churn:
+        index.upsert(listing)
+    for listing in churn:
+        index.remove(listing["id"])
+    print(f"incremental upsert+remove: {(time.perf_counter() - start) * 1000 / (2 * len(churn)):.3f}ms/op")
+
+    if args.baseline_size:
+        sample = catalog[: args.baseline_size]
+        small = SearchIndex(ttl=0)
+        small.rebuild(sample)
+        baseline_queries = queries[:50]
+        _report(f"indexed ({len(sample)})", _timed(small.search, baseline_queries))
+        _report(f"linear scan ({len(sample)})", _timed(lambda q: linear_search(sample, q), baseline_queries))
+
+        # share of indexed results that the linear scan would also rank inside its top results (ties included)
+        agreement = []
+        for query in baseline_queries:
+            term = query.strip().lower()
+            expected = sorted((score_listing(term, item) for item in sample), reverse=True)
+            got = small.search(query)
+            expected = [score for score in expected if score >= MATCH_THRESHOLD][: len(got) or 1]
+            if not got or not expected:
+                continue
+            cutoff = expected[-1] - 1e-9
+            agreement.append(sum(score_listing(term, item) >= cutoff for _, item in got) / len(got))
+        if agreement:
+            print(f"top-{small.max_results} agreement with linear scan: {sum(agreement) / len(agreement):.3f}")
+
+if __name__ == "__main__":
+    main()
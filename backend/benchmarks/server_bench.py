@@ -0,0 +1,170 @@
+# the production launcher (python -m backend.server: one worker per CPU, uvloop/httptools when installed,
+# prewarmed upstream connections) against the single process the Dockerfile used to run (uvicorn on the
+# asyncio loop and h11 parser). both serve the app over real sockets, reading from the in-memory Supabase
+# stand-in in a subprocess. reports the time from launch until /health answers, the first upstream-backed
+# request after that, and closed-loop throughput for listing detail (mostly cached) and browse (upstream) reads.
+# the load generator shares the machine with the servers, so throughput only scales while it has cores to spare
+#
+#   python -m backend.benchmarks.server_bench --concurrency 64 --duration 10 --latency 0.01 --workers 4
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List, Tuple
+
+import aiohttp
+
+from .catalog import percentile
+from .fake_supabase import FakeSupabase
+from ..server import available_cpus
+
+BASE_ENV = {"SUPABASE_API_KEY": "bench", "SUPABASE_JWT_SECRET": "bench", "SERVER_ACCESS_LOG": "false"}
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _launch(setup: str, port: int, upstream: str, workers: int) -> subprocess.Popen:
+    env = dict(os.environ, **BASE_ENV, SUPABASE_URL=upstream)
+    if setup == "single":
+        command = [sys.executable, "-m", "uvicorn", "backend.main:app", "--host", "127.0.0.1", "--port", str(port),
+                   "--loop", "asyncio", "--http", "h11", "--no-access-log"]
+    else:
+        env.update(HOST="127.0.0.1", PORT=str(port), WEB_CONCURRENCY=str(workers))
+        command = [sys.executable, "-m", "backend.server"]
+    return subprocess.Popen(command, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+async def _until_ready(session: aiohttp.ClientSession, base: str, timeout: float = 30.0) -> None:
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        try:
+            async with session.get(f"{base}/health") as resp:
+                if resp.status == 200:
+                    return
+        except aiohttp.ClientError:
+            pass
+        await asyncio.sleep(0.01)
+    raise RuntimeError(f"server at {base} did not start")
+
+
+async def _startup(setup: str, upstream: str, workers: int, listing_id: str) -> Tuple[float, float]:
+    # seconds until /health answers, then milliseconds for a listing read that has to go upstream
+    port = _free_port()
+    base = f"http://127.0.0.1:{port}"
+    started = time.perf_counter()
+    process = _launch(setup, port, upstream, workers)
+    try:
+        async with aiohttp.ClientSession() as session:
+            await _until_ready(session, base)
+            ready = time.perf_counter() - started
+            first = time.perf_counter()
+            async with session.get(f"{base}/listings/{listing_id}") as resp:
+                assert resp.status == 200, resp.status
+                await resp.read()
+            return ready, (time.perf_counter() - first) * 1000
+    finally:
+        process.terminate()
+        process.wait()
+
+
+async def _load(base: str, listings: List[str], kind: str, concurrency: int, duration: float,
+                seed: int) -> Dict[str, Any]:
+    # closed loop: each client sends its next request as soon as the previous one is answered
+    latencies: List[float] = []
+    counts = {"shed": 0, "errors": 0}
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        deadline = time.perf_counter() + duration
+
+        async def client(rng: random.Random) -> None:
+            while time.perf_counter() < deadline:
+                if kind == "detail":
+                    url = f"{base}/listings/{rng.choice(listings[:500])}"
+                else:
+                    url = f"{base}/listings?min_price={rng.randrange(0, 500)}&limit=24"
+                started = time.perf_counter()
+                try:
+                    async with session.get(url) as resp:
+                        await resp.read()
+                        status = resp.status
+                except aiohttp.ClientError:
+                    status = 0
+                if status == 200:
+                    latencies.append((time.perf_counter() - started) * 1000)
+                else:
+                    # 503s are reads the upstream guard shed while Supabase was saturated
+                    counts["shed" if status == 503 else "errors"] += 1
+
+        await asyncio.gather(*(client(random.Random(seed + n)) for n in range(concurrency)))
+    return {"rps": len(latencies) / duration, "p50": percentile(latencies, 50), "p99": percentile(latencies, 99),
+            **counts}
+
+
+async def _throughput(setup: str, upstream: str, workers: int, listings: List[str],
+                      args: argparse.Namespace) -> Dict[str, Dict[str, Any]]:
+    port = _free_port()
+    base = f"http://127.0.0.1:{port}"
+    process = _launch(setup, port, upstream, workers)
+    try:
+        async with aiohttp.ClientSession() as session:
+            await _until_ready(session, base)
+        # a short warm-up so every worker has imported its lazy paths and filled its listing cache
+        await _load(base, listings, "detail", args.concurrency, 1.0, args.seed)
+        return {kind: await _load(base, listings, kind, args.concurrency, args.duration, args.seed)
+                for kind in ("detail", "browse")}
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="production launcher vs a single uvicorn process")
+    parser.add_argument("--concurrency", type=int, default=64, help="closed-loop clients")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per throughput run")
+    parser.add_argument("--latency", type=float, default=0.01, help="injected upstream latency in seconds")
+    parser.add_argument("--workers", type=int, default=0, help="launcher workers, 0 = one per CPU")
+    parser.add_argument("--starts", type=int, default=3, help="launches per setup for the startup timings")
+    parser.add_argument("--listings", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    workers = args.workers or available_cpus()
+    listings = FakeSupabase().seed_marketplace(args.listings, 200, 0, args.seed)["listings"]
+    port = _free_port()
+    upstream = f"http://127.0.0.1:{port}"
+    fake = subprocess.Popen(
+        [sys.executable, "-m", "backend.benchmarks.fake_supabase", "--port", str(port), "--listings",
+         str(args.listings), "--orders", "0", "--latency", str(args.latency)],
+        stdout=subprocess.DEVNULL,
+    )
+    try:
+        time.sleep(2.0)
+        print(f"{available_cpus()} CPUs available, launcher with {workers} worker(s)")
+        for setup in ("single", "launcher"):
+            runs = [asyncio.run(_startup(setup, upstream, workers, listings[n])) for n in range(args.starts)]
+            ready = sorted(seconds for seconds, _ in runs)[len(runs) // 2]
+            first = sorted(ms for _, ms in runs)[len(runs) // 2]
+            print(f"{setup:<9} startup: ready in {ready * 1000:6.0f}ms, first upstream read {first:6.1f}ms")
+        for setup in ("single", "launcher"):
+            results = asyncio.run(_throughput(setup, upstream, workers, listings, args))
+            for kind, result in results.items():
+                print(f"{setup:<9} {kind:<7} {result['rps']:8.0f} req/s  p50={result['p50']:7.1f}ms"
+                      f" p99={result['p99']:7.1f}ms shed={result['shed']} errors={result['errors']}")
+    finally:
+        fake.terminate()
+        fake.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+# flash crowds against a cold cache, with and without coalescing of identical upstream reads: bursts of
+# concurrent GET /listings/{id} for one shared listing and GET /listings for one homepage query, through the
+# app against the in-memory Supabase stand-in. reports upstream calls per burst and request latency
+#
+#   python -m backend.benchmarks.singleflight_bench --crowd 500 --bursts 20 --latency 0.05
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import importlib
+import os
+import random
+import time
+from typing import Any, Dict, List, Tuple
+
+from .async_bench import asgi_call
+from .catalog import CATEGORIES, percentile
+from .fake_supabase import FakeSupabase
+
+
+async def _bursts(modules: Dict[str, Any], upstream: Any, paths: List[Tuple[str, str]], crowd: int) -> Tuple[List[float], List[int]]:
+    # each burst starts from empty caches, as right after a deploy or an invalidating write
+    latencies: List[float] = []
+    calls: List[int] = []
+
+    async def one(path: str, query: str) -> None:
+        started = time.perf_counter()
+        status, _, _ = await asgi_call(modules["main"].app, "GET", path, query)
+        assert status == 200, status
+        latencies.append((time.perf_counter() - started) * 1000)
+
+    for path, query in paths:
+        for cache in (modules["cache"].listing_cache, modules["cache"].etag_cache):
+            cache.clear()
+        before = upstream.requests
+        await asyncio.gather(*(one(path, query) for _ in range(crowd)))
+        calls.append(upstream.requests - before)
+    await modules["transport"].aclose()
+    return latencies, calls
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="coalescing of concurrent identical reads under flash crowds")
+    parser.add_argument("--crowd", type=int, default=500, help="concurrent requests per burst")
+    parser.add_argument("--bursts", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.05, help="injected upstream latency in seconds")
+    parser.add_argument("--listings", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    fake = FakeSupabase()
+    users = fake.seed_marketplace(args.listings, 200, 500, args.seed)
+    rng = random.Random(args.seed)
+    workloads = {
+        "listing detail": [(f"/listings/{rng.choice(users['listings'])}", "") for _ in range(args.bursts)],
+        "homepage": [("/listings", f"sold=false&limit=24&category={CATEGORIES[n % len(CATEGORIES)]}")
+                     for n in range(args.bursts)],
+    }
+    os.environ.setdefault("SUPABASE_API_KEY", "bench")
+    with fake.serve(latency=args.latency) as upstream:
+        os.environ["SUPABASE_URL"] = upstream.url
+        modules = {name: importlib.import_module(f"backend.{name}")
+                   for name in ("cache", "database", "main", "singleflight", "transport")}
+        modules["database"].SUPABASE_URL = upstream.url
+        modules["database"].storage.url = upstream.url
+        flights = modules["singleflight"].upstream_reads
+        for name, paths in workloads.items():
+            for enabled in (False, True):
+                flights.enabled = enabled
+                latencies, calls = asyncio.run(_bursts(modules, upstream, paths, args.crowd))
+                print(
+                    f"{name:<16} coalescing={'on ' if enabled else 'off'} upstream calls/burst={sum(calls) / len(calls):7.1f}"
+                    f"  p50={percentile(latencies, 50):7.1f}ms p99={percentile(latencies, 99):7.1f}ms"
+                )
+        modules["transport"].close()
+    print(flights.stats())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+# per-operation latency of the storage backends: the same database calls against Supabase (the in-memory
+# PostgREST stand-in with injected round-trip latency) and against the embedded SQLite engine seeded with the
+# same rows. the read caches are bypassed so every call reaches the backend
+#
+#   python -m backend.benchmarks.storage_bench --listings 20000 --latency 0.02 --rounds 200
+
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import tempfile
+import time
+from typing import Any, Callable, Dict, List, Tuple
+
+from .catalog import CATEGORIES, percentile
+from .fake_supabase import FakeSupabase
+
+
+def _operations(database: Any, users: Dict[str, List[str]], rng: random.Random) -> List[Tuple[str, Callable[[], Any]]]:
+    # each entry runs one public database call; writes work on rows created by the benchmark itself
+    state: Dict[str, Any] = {}
+    listings, buyers, sellers = users["listings"], users["buyers"], users["sellers"]
+
+    def create_listing() -> None:
+        state["listing"] = database.create_listing({
+            "seller_id": rng.choice(sellers), "name": "bench lamp", "price": 12.5, "quantity": 3,
+            "sold": False, "category": rng.choice(CATEGORIES),
+        })
+
+    def create_order() -> None:
+        state["order"] = database.create_order({"prod_id": state["listing"]["id"], "buyer_id": rng.choice(buyers)})
+
+    return [
+        ("get_listings", lambda: database.get_listings({"category": rng.choice(CATEGORIES), "sold": False})),
+        ("get_listings_page", lambda: database.get_listings_page({"seller_id": rng.choice(sellers)}, 24)),
+        ("get_listing", lambda: database.get_listing(rng.choice(listings))),
+        ("create_listing", create_listing),
+        ("update_listing", lambda: database.update_listing(state["listing"]["id"], {"price": rng.randint(1, 500)})),
+        ("create_order", create_order),
+        ("get_order", lambda: database.get_order(state["order"]["id"])),
+        ("update_order", lambda: database.update_order(state["order"]["id"], {"payment_method": "card"})),
+        ("get_orders", lambda: database.get_orders({"buyer_id": rng.choice(buyers)})),
+        ("get_user_profile", lambda: database.get_user_profile(rng.choice(sellers))),
+        ("delete_listing", lambda: database.delete_listing(state["listing"]["id"])),
+    ]
+
+
+def _measure(database: Any, users: Dict[str, List[str]], rounds: int, seed: int) -> Dict[str, List[float]]:
+    operations = _operations(database, users, random.Random(seed))
+    timings: Dict[str, List[float]] = {name: [] for name, _ in operations}
+    for _ in range(rounds):
+        for name, operation in operations:
+            started = time.perf_counter()
+            operation()
+            timings[name].append((time.perf_counter() - started) * 1000)
+    return timings
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="per-operation latency: Supabase vs embedded SQLite")
+    parser.add_argument("--listings", type=int, default=20000)
+    parser.add_argument("--buyers", type=int, default=500)
+    parser.add_argument("--orders", type=int, default=5000)
+    parser.add_argument("--latency", type=float, default=0.02, help="injected Supabase round-trip latency in seconds")
+    parser.add_argument("--rounds", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    os.environ.setdefault("SUPABASE_API_KEY", "bench")
+    from backend import cache, database, storage, transport
+
+    fake = FakeSupabase()
+    users = fake.seed_marketplace(args.listings, args.buyers, args.orders, args.seed)
+    database.listing_cache = cache.NullCache(0)
+    database.profile_cache = cache.NullCache(0)
+
+    path = os.path.join(tempfile.mkdtemp(), "bench.sqlite3")
+    local = storage.SQLiteStorage(path)
+    started = time.perf_counter()
+    for table, rows in fake.tables.items():
+        local.seed(table, [dict(row) for row in rows])
+    for user_id, user in fake.users.items():
+        local.add_user(user_id, user["email"], **user.get("user_metadata", {}))
+    print(f"seeded {path} with {args.listings} listings, {args.orders} orders in {time.perf_counter() - started:.1f}s")
+
+    results: Dict[str, Dict[str, List[float]]] = {}
+    with fake.serve(latency=args.latency) as upstream:
+        database.SUPABASE_URL = upstream.url
+        database.storage = storage.SupabaseStorage(upstream.url, database.SUPABASE_API_KEY)
+        results["supabase"] = _measure(database, users, args.rounds, args.seed)
+        transport.close()
+    database.storage = local
+    results["sqlite"] = _measure(database, users, args.rounds, args.seed)
+    local.close()
+
+    print(f"{'operation':<18}{'supabase p50':>14}{'p95':>10}{'sqlite p50':>14}{'p95':>10}{'speedup':>10}")
+    for name in results["supabase"]:
+        remote, embedded = results["supabase"][name], results["sqlite"][name]
+        print(
+            f"{name:<18}{percentile(remote, 50):12.2f}ms{percentile(remote, 95):8.2f}ms"
+            f"{percentile(embedded, 50):12.3f}ms{percentile(embedded, 95):8.3f}ms"
+            f"{percentile(remote, 50) / max(percentile(embedded, 50), 1e-6):9.0f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
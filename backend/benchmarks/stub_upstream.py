@@ -0,0 +1,150 @@
+# minimal keep-alive HTTP/1.1 server standing in for Supabase in benchmarks.
+# every request sleeps for the configured latency (plus an exponentially distributed jitter with the given
+# mean, for a realistic tail) and is answered by a handler function. it runs in a forked child process so it
+# never competes with the benchmarked app for the GIL, or in the foreground with serve_forever().
+# capacity bounds how many requests are worked on at once, so latency grows with load like a saturated
+# database; latency and fail_status (answer everything with that status) can be changed while it runs
+
+from __future__ import annotations
+
+import asyncio
+import json
+import multiprocessing
+import random
+from typing import Any, Callable, Dict, Optional, Tuple
+from urllib.parse import parse_qsl, urlsplit
+
+# handler(method, path, params, headers, body) -> (status, json payload, extra headers)
+Handler = Callable[[str, str, Dict[str, str], Dict[str, str], Any], Tuple[int, Any, Dict[str, str]]]
+
+_REASONS = {
+    200: "OK", 201: "Created", 204: "No Content", 206: "Partial Content", 400: "Bad Request",
+    404: "Not Found", 405: "Method Not Allowed", 409: "Conflict", 500: "Internal Server Error",
+    503: "Service Unavailable",
+}
+
+
+class StubUpstream:
+    def __init__(self, handler: Handler, latency: float = 0.0, host: str = "127.0.0.1", port: int = 0,
+                 jitter: float = 0.0, seed: int = 7, capacity: int = 0):
+        self.handler = handler
+        self.jitter = jitter
+        self.host = host
+        self.port = port
+        self.capacity = capacity
+        self._rng = random.Random(seed)
+        self._context = multiprocessing.get_context("fork")
+        self._requests = self._context.Value("q", 0)
+        self._latency = self._context.Value("d", latency)
+        self._fail_status = self._context.Value("i", 0)
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._process: Optional[multiprocessing.process.BaseProcess] = None
+
+    @property
+    def requests(self) -> int:
+        return self._requests.value
+
+    @property
+    def latency(self) -> float:
+        return self._latency.value
+
+    @latency.setter
+    def latency(self, value: float) -> None:
+        self._latency.value = value
+
+    @property
+    def fail_status(self) -> int:
+        return self._fail_status.value
+
+    @fail_status.setter
+    def fail_status(self, value: int) -> None:
+        self._fail_status.value = value
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def start(self) -> "StubUpstream":
+        parent, child = self._context.Pipe()
+        self._process = self._context.Process(target=self._serve, args=(child,), daemon=True)
+        self._process.start()
+        self.port = parent.recv()
+        return self
+
+    def stop(self) -> None:
+        if self._process is not None:
+            self._process.terminate()
+            self._process.join()
+            self._process = None
+
+    def __enter__(self) -> "StubUpstream":
+        return self.start()
+
+    def __exit__(self, *exc: Any) -> None:
+        self.stop()
+
+    def serve_forever(self) -> None:
+        # run in this process until interrupted, e.g. as a local Supabase for `uvicorn backend.main:app`
+        self._serve(None)
+
+    def _serve(self, conn: Any) -> None:
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        if self.capacity:
+            self._slots = asyncio.Semaphore(self.capacity)
+        server = loop.run_until_complete(asyncio.start_server(self._handle, self.host, self.port, backlog=4096))
+        self.port = server.sockets[0].getsockname()[1]
+        if conn is not None:
+            conn.send(self.port)
+        try:
+            loop.run_forever()
+        except KeyboardInterrupt:
+            pass
+
+    def _delay(self) -> float:
+        return self.latency + (self._rng.expovariate(1 / self.jitter) if self.jitter else 0.0)
+
+    async def _answer(self, method: str, path: str, params: Dict[str, str], headers: Dict[str, str],
+                      body: Any) -> Tuple[int, Any, Dict[str, str]]:
+        delay = self._delay()
+        if delay:
+            await asyncio.sleep(delay)
+        if self._fail_status.value:
+            return self._fail_status.value, {"message": "unavailable"}, {}
+        return self.handler(method, path, params, headers, body)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, target, _ = request_line.decode("latin-1").split(" ", 2)
+                headers: Dict[str, str] = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get("content-length") or 0)
+                body = json.loads(await reader.readexactly(length)) if length else None
+                parts = urlsplit(target)
+                params = dict(parse_qsl(parts.query, keep_blank_values=True))
+                with self._requests.get_lock():
+                    self._requests.value += 1
+                if self._slots is not None:
+                    async with self._slots:
+                        status, payload, extra = await self._answer(method, parts.path, params, headers, body)
+                else:
+                    status, payload, extra = await self._answer(method, parts.path, params, headers, body)
+                data = b"" if payload is None or method == "HEAD" else json.dumps(payload).encode()
+                head = [f"HTTP/1.1 {status} {_REASONS.get(status, 'OK')}", "Content-Type: application/json"]
+                head.append(f"Content-Length: {len(data) if method != 'HEAD' else 0}")
+                head.extend(f"{key}: {value}" for key, value in extra.items())
+                writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + data)
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
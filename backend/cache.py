@@ -0,0 +1,269 @@
+# bounded read-through caches for the data layer. the in-process backend is an LRU with per-entry TTL;
+# set LISTING_CACHE_BACKEND=redis (and REDIS_URL) to share entries across workers through any
+# Redis-compatible server, or LISTING_CACHE_BACKEND=off to disable caching
+
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+LISTING_CACHE_BACKEND: str = os.environ.get("LISTING_CACHE_BACKEND", "memory").lower()
+LISTING_CACHE_SIZE: int = int(os.environ.get("LISTING_CACHE_SIZE", "10000"))
+LISTING_CACHE_TTL: float = float(os.environ.get("LISTING_CACHE_TTL", "30"))
+REDIS_URL: str = os.environ.get("REDIS_URL", "redis://localhost:6379/0")
+PROFILE_CACHE_SIZE: int = int(os.environ.get("PROFILE_CACHE_SIZE", "5000"))
+PROFILE_CACHE_TTL: float = float(os.environ.get("PROFILE_CACHE_TTL", "300"))
+PROFILE_NEGATIVE_TTL: float = float(os.environ.get("PROFILE_NEGATIVE_TTL", "60"))
+ETAG_CACHE_SIZE: int = int(os.environ.get("ETAG_CACHE_SIZE", "20000"))
+# how long past its TTL an in-process entry is kept for get_stale(), i.e. served while upstream is unavailable
+CACHE_STALE_TTL: float = float(os.environ.get("CACHE_STALE_TTL", "600"))
+# worker processes serving the app, as uvicorn reads it for --workers; the launcher (server.py) exports the count
+# it resolved. an in-process cache only sees the writes of its own worker
+WORKERS: int = max(1, int(os.environ.get("WEB_CONCURRENCY") or "1"))
+
+
+class CacheBackend:
+    # common interface and counters; values must be JSON-serializable and treated as read-only by callers
+
+    # every worker reads and writes the same entries
+    shared = False
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._stats_lock = threading.Lock()
+        self._stats: Dict[str, int] = {
+            "hits": 0, "misses": 0, "sets": 0, "evictions": 0, "expirations": 0, "invalidations": 0, "stale_hits": 0,
+        }
+
+    def _count(self, key: str, delta: int = 1) -> None:
+        with self._stats_lock:
+            self._stats[key] += delta
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            stats: Dict[str, Any] = dict(self._stats)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+        stats["backend"] = type(self).__name__
+        return stats
+
+    def get(self, key: str) -> Optional[Any]:
+        raise NotImplementedError
+
+    def get_stale(self, key: str) -> Optional[Any]:
+        # an entry that may be past its TTL, for when the fresh value cannot be read; backends that let
+        # entries expire on their own have nothing to offer
+        return None
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        raise NotImplementedError
+
+    def add(self, key: str, value: Any, ttl: Optional[float] = None) -> bool:
+        # set only if no live entry exists, atomically; True when this call stored the value
+        raise NotImplementedError
+
+    def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    def incr(self, key: str) -> int:
+        raise NotImplementedError
+
+    def counter(self, key: str) -> int:
+        raise NotImplementedError
+
+    def clear(self) -> None:
+        raise NotImplementedError
+
+
+class NullCache(CacheBackend):
+    # nothing is kept, so no worker holds an outdated entry
+    shared = True
+
+    def get(self, key: str) -> Optional[Any]:
+        self._count("misses")
+        return None
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        pass
+
+    def add(self, key: str, value: Any, ttl: Optional[float] = None) -> bool:
+        return True
+
+    def delete(self, key: str) -> None:
+        pass
+
+    def incr(self, key: str) -> int:
+        return 0
+
+    def counter(self, key: str) -> int:
+        return 0
+
+    def clear(self) -> None:
+        pass
+
+
+class MemoryCache(CacheBackend):
+    # LRU ordered dict of key -> (expires_at, value); expired entries stop being hits but are kept for
+    # stale_ttl more (still bounded by max_entries) so get_stale() can fall back to them
+
+    def __init__(self, max_entries: int = LISTING_CACHE_SIZE, ttl: float = LISTING_CACHE_TTL,
+                 stale_ttl: float = CACHE_STALE_TTL):
+        super().__init__(ttl)
+        self.max_entries = max_entries
+        self.stale_ttl = stale_ttl
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._counters: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] < time.monotonic():
+                if entry[0] + self.stale_ttl < time.monotonic():
+                    del self._entries[key]
+                entry = None
+                self._count("expirations")
+            if entry is None:
+                self._count("misses")
+                return None
+            self._entries.move_to_end(key)
+        self._count("hits")
+        return entry[1]
+
+    def get_stale(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] + self.stale_ttl < time.monotonic():
+                return None
+        self._count("stale_hits")
+        return entry[1]
+
+    def _put(self, key: str, value: Any, ttl: Optional[float]) -> None:
+        # with the lock held
+        self._entries[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+        self._entries.move_to_end(key)
+        evicted = 0
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            evicted += 1
+        self._count("sets")
+        if evicted:
+            self._count("evictions", evicted)
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        with self._lock:
+            self._put(key, value, ttl)
+
+    def add(self, key: str, value: Any, ttl: Optional[float] = None) -> bool:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] >= time.monotonic():
+                return False
+            self._put(key, value, ttl)
+        return True
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            removed = self._entries.pop(key, None)
+        if removed is not None:
+            self._count("invalidations")
+
+    def incr(self, key: str) -> int:
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+            return self._counters[key]
+
+    def counter(self, key: str) -> int:
+        return self._counters.get(key, 0)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        stats = super().stats()
+        stats["entries"] = len(self._entries)
+        stats["max_entries"] = self.max_entries
+        return stats
+
+
+class RedisCache(CacheBackend):
+    # shared cache on a Redis-compatible server; eviction beyond TTL follows the server's maxmemory policy
+
+    shared = True
+
+    def __init__(self, url: str = REDIS_URL, ttl: float = LISTING_CACHE_TTL, prefix: str = "umarket:"):
+        super().__init__(ttl)
+        try:
+            import redis
+        except ImportError as exc:
+            raise RuntimeError("LISTING_CACHE_BACKEND=redis requires the redis package (pip install redis)") from exc
+        self.prefix = prefix
+        self._client = redis.Redis.from_url(url)
+
+    def get(self, key: str) -> Optional[Any]:
+        raw = self._client.get(self.prefix + key)
+        if raw is None:
+            self._count("misses")
+            return None
+        self._count("hits")
+        return json.loads(raw)
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        seconds = self.ttl if ttl is None else ttl
+        self._client.set(self.prefix + key, json.dumps(value), px=max(1, int(seconds * 1000)))
+        self._count("sets")
+
+    def add(self, key: str, value: Any, ttl: Optional[float] = None) -> bool:
+        seconds = self.ttl if ttl is None else ttl
+        stored = self._client.set(self.prefix + key, json.dumps(value), px=max(1, int(seconds * 1000)), nx=True)
+        if stored:
+            self._count("sets")
+        return bool(stored)
+
+    def delete(self, key: str) -> None:
+        if self._client.delete(self.prefix + key):
+            self._count("invalidations")
+
+    def incr(self, key: str) -> int:
+        return int(self._client.incr(self.prefix + key))
+
+    def counter(self, key: str) -> int:
+        raw = self._client.get(self.prefix + key)
+        return int(raw) if raw is not None else 0
+
+    def clear(self) -> None:
+        for key in self._client.scan_iter(match=self.prefix + "*"):
+            self._client.delete(key)
+
+
+def shared_across_workers(cache: CacheBackend) -> bool:
+    # whether a write recorded here is seen by every worker serving the app
+    return cache.shared or WORKERS == 1
+
+
+def build_cache(backend: str = LISTING_CACHE_BACKEND, max_entries: int = LISTING_CACHE_SIZE, ttl: float = LISTING_CACHE_TTL,
+                stale_ttl: float = CACHE_STALE_TTL) -> CacheBackend:
+    if backend in {"off", "none", ""}:
+        return NullCache(ttl)
+    if backend == "redis":
+        return RedisCache(REDIS_URL, ttl)
+    if backend == "memory":
+        return MemoryCache(max_entries, ttl, stale_ttl)
+    raise RuntimeError(f"Unknown LISTING_CACHE_BACKEND: {backend!r}")
+
+
+listing_cache = build_cache()
+# user profiles from the auth admin API; a cached False records a 404 for PROFILE_NEGATIVE_TTL seconds
+profile_cache = build_cache(LISTING_CACHE_BACKEND, PROFILE_CACHE_SIZE, PROFILE_CACHE_TTL)
+# ETag last sent for a resource at a given listings version, so a matching If-None-Match is answered with 304
+# without going upstream; entries live as long as the data cache they mirror and are never served stale. only
+# consulted when the version and tags are shared by every worker (see shared_across_workers)
+etag_cache = build_cache(LISTING_CACHE_BACKEND, ETAG_CACHE_SIZE, LISTING_CACHE_TTL, stale_ttl=0)
@@ -1,10 +1,22 @@
-# supabase REST helpers: CRUD for items/orders via PostgREST, requires SUPABASE_URL and SUPABASE_API_KEY env vars (use a service role key in production)
+# data layer: CRUD for items/orders, stored in Supabase (requires SUPABASE_URL and SUPABASE_API_KEY env vars, use a
+# service role key in production) or an embedded SQLite file with STORAGE_BACKEND=sqlite
+#
+# each operation is written once as a generator that yields storage.Request objects and receives the
+# responses, so the blocking functions below and the coroutines in async_database share the same code.
+# the requests are answered by the configured storage backend (see storage.py)
 
 from __future__ import annotations
 
+import base64
+import json
 import os
-import requests
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Generator, Iterable, List, Optional, Tuple
+from urllib.parse import quote, urlsplit
+
+from .cache import PROFILE_NEGATIVE_TTL, CacheBackend, listing_cache, profile_cache
+from .resilience import UpstreamUnavailable, upstream_guard
+from .storage import STORAGE_BACKEND, Embed, Request, build_storage, quote_value, split_filter_key
+from .summary import category_summary
 
 SUPABASE_URL: Optional[str] = os.environ.get("SUPABASE_URL")
 SUPABASE_API_KEY: Optional[str] = os.environ.get("SUPABASE_API_KEY")
@@ -13,25 +25,55 @@ PRODUCT_ID_FIELD: str = os.environ.get("SUPABASE_PRODUCT_ID_FIELD", "prod_id")
 TRANSACTIONS_TABLE: str = os.environ.get("SUPABASE_TRANSACTIONS_TABLE", "Transactions")
 TRANSACTION_ID_FIELD: str = os.environ.get("SUPABASE_TRANSACTION_ID_FIELD", "id")
 AVATAR_BUCKET: str = os.environ.get("SUPABASE_AVATAR_BUCKET", "avatars")
+# name of the checkout function from backend/sql/checkout_listing.sql; when set, checkout is a single RPC call
+CHECKOUT_RPC: str = os.environ.get("SUPABASE_CHECKOUT_RPC", "")
+# compare-and-set attempts per checkout when no RPC is configured and buyers race for the same listing
+CHECKOUT_MAX_ATTEMPTS: int = int(os.environ.get("CHECKOUT_MAX_ATTEMPTS", "8"))
+# longest URL-encoded in.(...) filter sent in one request; longer id lists are split across several reads so
+# request lines stay under proxy limits (commonly 8 KB for the whole line)
+IN_FILTER_MAX_LENGTH: int = int(os.environ.get("SUPABASE_IN_FILTER_MAX_LENGTH", "4000"))
+
+storage = build_storage(
+    STORAGE_BACKEND,
+    url=SUPABASE_URL,
+    api_key=SUPABASE_API_KEY,
+    products_table=PRODUCTS_TABLE,
+    product_id=PRODUCT_ID_FIELD,
+    transactions_table=TRANSACTIONS_TABLE,
+    transaction_id=TRANSACTION_ID_FIELD,
+)
+
+
+class CheckoutError(Exception):
+    # a purchase that cannot go through; reason is not_found, own_listing, sold, out_of_stock or contended
+
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
 
 
 def _ensure_config():
     # make sure SUPABASE_URL and SUPABASE_API_KEY are set and raise RuntimeError if missing.
-    if not SUPABASE_URL or not SUPABASE_API_KEY:
+    if storage.name == "supabase" and (not SUPABASE_URL or not SUPABASE_API_KEY):
         raise RuntimeError(
             "SUPABASE_URL and SUPABASE_API_KEY environment variables must be set"
         )
 
 
-def _headers() -> Dict[str, str]:
-    #construct headers for supabase REST requests
-
-    return {
-        "apikey": SUPABASE_API_KEY or "",
-        "Authorization": f"Bearer {SUPABASE_API_KEY}",
-        "Content-Type": "application/json",
-        "Accept": "application/json",
-    }
+def config_errors() -> List[str]:
+    # everything wrong with the storage settings, checked once at startup by the launcher (server.py) rather
+    # than on the first request that needs them
+    errors = []
+    if storage.name == "supabase":
+        if not SUPABASE_URL or not SUPABASE_API_KEY:
+            errors.append("SUPABASE_URL and SUPABASE_API_KEY environment variables must be set")
+        elif urlsplit(SUPABASE_URL).scheme not in ("http", "https") or not urlsplit(SUPABASE_URL).netloc:
+            errors.append(f"SUPABASE_URL must be an http(s) URL, got {SUPABASE_URL!r}")
+    if CHECKOUT_MAX_ATTEMPTS < 1:
+        errors.append("CHECKOUT_MAX_ATTEMPTS must be at least 1")
+    if IN_FILTER_MAX_LENGTH < 100:
+        errors.append("SUPABASE_IN_FILTER_MAX_LENGTH must be at least 100")
+    return errors
 
 
 def _normalize_product(record: Dict[str, Any]) -> Dict[str, Any]:
@@ -82,83 +124,539 @@ def _normalize_order(record: Dict[str, Any]) -> Dict[str, Any]:
     return normalized
 
 
-def get_listings(filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
-    #return a list of all products
+# filters are {key: value} with key "column" (equality) or "column__op"; "product.price__gte" filters an embed.
+# the storage backends evaluate them upstream (see storage.FILTER_OPS) and filter_matches evaluates the same spec
+# in Python
+# columns a list may be ordered by; the primary key is always appended as a tie breaker
+SORT_KEYS = {"created_at", "price", "name"}
+
+
+def _field(record: Dict[str, Any], column: str) -> Any:
+    for part in column.split("."):
+        record = record.get(part) if isinstance(record, dict) else None
+    return record
+
+
+def _filter_holds(value: Any, op: str, operand: Any) -> bool:
+    if op in {"is", "isnot"}:
+        holds = value is operand if operand is None else value == operand
+        return holds if op == "is" else not holds
+    if value is None:
+        return False
+    if op in {"icontains", "ilike", "like"}:
+        needle = str(operand).strip("*%") if op != "icontains" else str(operand)
+        haystack = str(value) if op == "like" else str(value).lower()
+        return (needle if op == "like" else needle.lower()) in haystack
+    if op in {"fts", "wfts"}:
+        words = set(str(value).lower().split())
+        return all(term in words for term in str(operand).lower().split())
+    if op == "in":
+        return str(value) in {str(item) for item in operand}
+    if isinstance(value, bool) or isinstance(operand, bool):
+        value, operand = str(value).lower(), str(operand).lower()
+    elif isinstance(value, (int, float)):
+        try:
+            operand = float(operand)
+        except (TypeError, ValueError):
+            return False
+    else:
+        value, operand = str(value), str(operand)
+    if op == "eq":
+        return value == operand
+    if op == "neq":
+        return value != operand
+    return {"gt": value > operand, "gte": value >= operand, "lt": value < operand, "lte": value <= operand}[op]
+
+
+def filter_matches(record: Dict[str, Any], filters: Optional[Dict[str, Any]]) -> bool:
+    # evaluate a filter spec against an already fetched record; full-text matching is approximated by words
+    for key, operand in (filters or {}).items():
+        column, op = split_filter_key(key)
+        if operand is None and op not in {"is", "isnot"}:
+            continue
+        if not _filter_holds(_field(record, column), op, operand):
+            return False
+    return True
 
-    _ensure_config()
-    url = f"{SUPABASE_URL}/rest/v1/{PRODUCTS_TABLE}"
-    params: Dict[str, Any] = {"select": "*"}
-    if filters:
-        for key, value in filters.items():
-            if value is None:
-                continue
-            if isinstance(value, bool):
-                params[key] = f"eq.{str(value).lower()}"
+
+def encode_cursor(record: Dict[str, Any], sort: str = "created_at.desc") -> str:
+    # opaque keyset cursor pointing just past record in <sort>, id order; the sort is recorded
+    # unless it is the default so a cursor cannot be replayed against a different ordering
+    column = sort.partition(".")[0]
+    position = [str(record.get(column)), str(record.get("id"))]
+    if sort != "created_at.desc":
+        position.append(sort)
+    raw = json.dumps(position, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[str, str, str]:
+    # return (sort value, id, sort); raise ValueError if the cursor was not produced by encode_cursor
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        position = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+    except Exception as exc:
+        raise ValueError("Invalid cursor") from exc
+    if not isinstance(position, list) or len(position) not in {2, 3}:
+        raise ValueError("Invalid cursor")
+    if len(position) == 2:
+        position.append("created_at.desc")
+    if not all(isinstance(part, str) for part in position):
+        raise ValueError("Invalid cursor")
+    value, record_id, sort = position
+    return value, record_id, sort
+
+
+def encode_search_cursor(query: str, offset: int) -> str:
+    # opaque cursor for the next page of ranked search results; ranking has no keyset, so it is a position
+    raw = json.dumps({"search": query, "offset": offset}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_search_cursor(cursor: str, query: str) -> int:
+    # return the offset; raise ValueError if the cursor was not produced by encode_search_cursor for query
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        position = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+    except Exception as exc:
+        raise ValueError("Invalid cursor") from exc
+    if not isinstance(position, dict) or not isinstance(position.get("offset"), int) or position["offset"] < 0:
+        raise ValueError("Invalid cursor")
+    if position.get("search") != query:
+        raise ValueError("Cursor was issued for a different search")
+    return position["offset"]
+
+
+def in_chunks(values: List[Any], max_length: Optional[int] = None) -> List[List[Any]]:
+    # split values so each chunk's in.(...) filter stays within max_length once URL-encoded
+    budget = max_length or IN_FILTER_MAX_LENGTH
+    chunks: List[List[Any]] = []
+    current: List[Any] = []
+    length = len(quote("in.()"))
+    for value in values:
+        size = len(quote(quote_value(value), safe="")) + len(quote(","))
+        if current and length + size > budget:
+            chunks.append(current)
+            current, length = [], len(quote("in.()"))
+        current.append(value)
+        length += size
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+# exports run oldest first so a resumed export also picks up rows created since it started
+EXPORT_SORT = "created_at.asc"
+
+
+def sort_spec(sort: str = "created_at", descending: bool = True) -> str:
+    # "price", False -> "price.asc"; raises ValueError for columns outside SORT_KEYS
+    if sort not in SORT_KEYS:
+        raise ValueError(f"sort must be one of {', '.join(sorted(SORT_KEYS))}")
+    return f"{sort}.{'desc' if descending else 'asc'}"
+
+
+# fields a client may ask for with fields=; "product.<listing field>" selects inside an order's product embed
+LISTING_FIELDS = ("id", "seller_id", "name", "price", "quantity", "sold", "category", "created_at")
+ORDER_FIELDS = ("id", "listing_id", "buyer_id", "seller_id", "payment_method", "created_at")
+
+
+def parse_fields(fields: Optional[str], allowed: Iterable[str], embeds: Iterable[str] = ()) -> Optional[List[str]]:
+    # "id,name,product.price" -> ["id", "name", "product.price"]; None means every field.
+    # raises ValueError for names outside allowed (or <embed>.<listing field> for the given embeds)
+    if fields is None:
+        return None
+    parsed = list(dict.fromkeys(part.strip() for part in fields.split(",") if part.strip()))
+    allowed = set(allowed) | {f"{embed}.{field}" for embed in embeds for field in LISTING_FIELDS}
+    unknown = [field for field in parsed if field not in allowed]
+    if unknown or not parsed:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}" if unknown else "fields must not be empty")
+    return parsed
+
+
+def _listing_columns(fields: Iterable[str]) -> List[str]:
+    return list(dict.fromkeys(PRODUCT_ID_FIELD if field == "id" else field for field in fields))
+
+
+def _listing_select(fields: Optional[List[str]], sort: str = "created_at.desc") -> Tuple[str, ...]:
+    # narrow select for sparse reads; the id and sort column always come along for the keyset cursor
+    if fields is None:
+        return ("*",)
+    return tuple(_listing_columns([*fields, "id", sort.partition(".")[0]]))
+
+
+def select_fields(record: Dict[str, Any], fields: Optional[List[str]]) -> Dict[str, Any]:
+    # trim a normalized listing or order to the requested fields, including product.<field> entries
+    if fields is None or not record:
+        return record
+    projected = {field: record[field] for field in fields if "." not in field and field in record}
+    product_fields = [field.partition(".")[2] for field in fields if field.startswith("product.")]
+    if product_fields:
+        projected["product"] = select_fields(record.get("product"), product_fields)
+    return projected
+
+
+def _keyset(cursor: Optional[str], id_field: str, sort: str = "created_at.desc") -> Dict[str, Any]:
+    # Request order and after for rows strictly after the cursor in <column>, <id> order
+    column, _, direction = sort.partition(".")
+    keyset: Dict[str, Any] = {"order": ((column, direction == "desc"), (id_field, direction == "desc"))}
+    if cursor:
+        value, record_id, cursor_sort = decode_cursor(cursor)
+        if cursor_sort != sort:
+            raise ValueError("Cursor does not match the requested sort order")
+        keyset["after"] = (value, record_id)
+    return keyset
+
+
+# a data-layer operation: yields storage requests, is sent their responses, returns the result
+Op = Generator[Request, Any, Any]
+
+
+def _run(op: Op) -> Any:
+    # drive an operation with the blocking pooled transport (or the embedded store)
+    try:
+        request = next(op)
+        while True:
+            try:
+                response = storage.send(request)
+            except Exception as exc:
+                # raised inside the operation, which may fall back (stale cache) or clean up
+                request = op.throw(exc)
             else:
-                params[key] = f"eq.{value}"
-    resp = requests.get(url, headers=_headers(), params=params)
+                request = op.send(response)
+    except StopIteration as done:
+        return done.value
+
+
+# listing reads are cached by id and by normalized query; list keys carry a generation number
+# that every listing write bumps, so one increment drops every cached list at once
+_LIST_GENERATION_KEY = "listings:generation"
+
+
+def _listing_key(listing_id: Any) -> str:
+    return f"listing:{listing_id}"
+
+
+def _listings_key(kind: str, params: Dict[str, Any]) -> str:
+    generation = listing_cache.counter(_LIST_GENERATION_KEY)
+    return f"listings:{generation}:{kind}:{json.dumps(params, sort_keys=True, default=str)}"
+
+
+def listings_version() -> int:
+    # bumped by every listing write made through this API; response validators are keyed on it
+    return listing_cache.counter(_LIST_GENERATION_KEY)
+
+
+def _listing_written(listing_id: Any, record: Optional[Dict[str, Any]]) -> None:
+    # keep the id entry and the category summary in step with our own write and drop every cached list
+    if record is None:
+        listing_cache.delete(_listing_key(listing_id))
+    else:
+        listing_cache.set(_listing_key(listing_id), record)
+    listing_cache.incr(_LIST_GENERATION_KEY)
+    category_summary.apply(listing_id, record)
+
+
+def _stale(cache: CacheBackend, key: str, exc: UpstreamUnavailable) -> Any:
+    # the expired entry under key, served while upstream is unavailable (breaker open or call shed); without
+    # one the request fails with exc
+    stale = cache.get_stale(key)
+    if stale is None:
+        raise exc
+    upstream_guard.served_stale()
+    return stale
+
+
+def _content_range_total(resp: Any) -> Optional[int]:
+    # "0-24/3573" -> 3573, "*/0" -> 0
+    content_range = resp.headers.get("Content-Range", "")
+    total = content_range.rpartition("/")[2]
+    return int(total) if total.isdigit() else None
+
+
+def _fetch_page(request: Request, limit: int, count: bool) -> Op:
+    # fetch limit + 1 rows; the extra row only tells us whether there is a next page. the first page counts in
+    # the same request, later pages count separately since the total must ignore the keyset position
+    keyset = request.after is not None
+    resp = yield request._replace(limit=limit + 1, count=count and not keyset)
+    resp.raise_for_status()
+    rows = resp.json()
+    total: Optional[int] = None
+    if count:
+        if keyset:
+            total = yield from _count_rows(request._replace(action="count", order=(), after=None))
+        else:
+            total = _content_range_total(resp)
+    return rows, total
+
+
+def _count_rows(request: Request) -> Op:
+    resp = yield request
+    resp.raise_for_status()
+    return _content_range_total(resp)
+
+
+def _page(rows: List[Dict[str, Any]], limit: int, total: Optional[int], sort: str = "created_at.desc") -> Dict[str, Any]:
+    items = rows[:limit]
+    next_cursor = encode_cursor(items[-1], sort) if len(rows) > limit and items else None
+    return {"items": items, "next_cursor": next_cursor, "total": total}
+
+
+def _get_listings(filters: Optional[Dict[str, Any]] = None) -> Op:
+    _ensure_config()
+    key = _listings_key("all", filters or {})
+    cached = listing_cache.get(key)
+    if cached is not None:
+        return cached
+    try:
+        resp = yield Request("select", PRODUCTS_TABLE, filters)
+    except UpstreamUnavailable as exc:
+        return _stale(listing_cache, key, exc)
     resp.raise_for_status()
     data = resp.json()
-    return [_normalize_product(product) for product in data]
+    listings = [_normalize_product(product) for product in data]
+    listing_cache.set(key, listings)
+    return listings
 
 
-def get_listing(listing_id: str) -> Optional[Dict[str, Any]]:
-    # return a single product by its id or none if it is not found
+def get_listings(filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    #return a list of all products
+    return _run(_get_listings(filters))
+
 
+def _listings_page_request(
+    filters: Optional[Dict[str, Any]], cursor: Optional[str], sort: str, fields: Optional[List[str]]
+) -> Request:
+    keyset = _keyset(cursor, PRODUCT_ID_FIELD, sort)
+    return Request("select", PRODUCTS_TABLE, filters, _listing_select(fields, sort), **keyset)
+
+
+def _read_listings_page(
+    filters: Optional[Dict[str, Any]] = None,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    count: bool = False,
+    sort: str = "created_at.desc",
+    fields: Optional[List[str]] = None,
+) -> Op:
+    # one page straight from upstream, bypassing the cache (exports walk the whole table once)
+    _ensure_config()
+    request = _listings_page_request(filters, cursor, sort, fields)
+    rows, total = yield from _fetch_page(request, limit, count)
+    page = _page([_normalize_product(product) for product in rows], limit, total, sort)
+    page["items"] = [select_fields(item, fields) for item in page["items"]]
+    return page
+
+
+def _get_listings_page(
+    filters: Optional[Dict[str, Any]] = None,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    count: bool = False,
+    sort: str = "created_at.desc",
+    fields: Optional[List[str]] = None,
+) -> Op:
+    _ensure_config()
+    request = _listings_page_request(filters, cursor, sort, fields)
+    key = _listings_key("page", {"request": request._asdict(), "limit": limit, "count": count})
+    cached = listing_cache.get(key)
+    if cached is not None:
+        return cached
+    try:
+        page = yield from _read_listings_page(filters, limit, cursor, count, sort, fields)
+    except UpstreamUnavailable as exc:
+        return _stale(listing_cache, key, exc)
+    listing_cache.set(key, page)
+    return page
+
+
+def get_listings_page(
+    filters: Optional[Dict[str, Any]] = None,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    count: bool = False,
+    sort: str = "created_at.desc",
+    fields: Optional[List[str]] = None,
+) -> Dict[str, Any]:
+    # return one page of products in sort order (newest first by default) as {"items", "next_cursor", "total"};
+    # fields limits both the upstream select and the returned keys
+    return _run(_get_listings_page(filters, limit, cursor, count, sort, fields))
+
+
+def _get_listing(listing_id: str, fields: Optional[List[str]] = None) -> Op:
     _ensure_config()
-    url = f"{SUPABASE_URL}/rest/v1/{PRODUCTS_TABLE}"
-    params = {PRODUCT_ID_FIELD: f"eq.{listing_id}", "select": "*"}
-    resp = requests.get(url, headers=_headers(), params=params)
+    cached = listing_cache.get(_listing_key(listing_id))
+    if cached is not None:
+        return select_fields(cached, fields)
+    if fields is None:
+        try:
+            return (yield from _fetch_listing(listing_id))
+        except UpstreamUnavailable as exc:
+            return _stale(listing_cache, _listing_key(listing_id), exc)
+    # a partial row is not cached under the id key, which always holds the whole listing
+    try:
+        resp = yield Request("select", PRODUCTS_TABLE, {PRODUCT_ID_FIELD: listing_id}, _listing_select(fields))
+    except UpstreamUnavailable as exc:
+        return select_fields(_stale(listing_cache, _listing_key(listing_id), exc), fields)
     resp.raise_for_status()
     products = resp.json()
-    return _normalize_product(products[0]) if products else None
+    return select_fields(_normalize_product(products[0]), fields) if products else None
 
 
-def create_listing(listing_data: Dict[str, Any]) -> Dict[str, Any]:
-    # insert a new product and return the created record
+def _fetch_listing(listing_id: str) -> Op:
+    # always read from upstream and refresh the cache entry
+    resp = yield Request("select", PRODUCTS_TABLE, {PRODUCT_ID_FIELD: listing_id})
+    resp.raise_for_status()
+    products = resp.json()
+    if not products:
+        return None
+    listing = _normalize_product(products[0])
+    listing_cache.set(_listing_key(listing_id), listing)
+    return listing
+
+
+def get_listing(listing_id: str, fields: Optional[List[str]] = None) -> Optional[Dict[str, Any]]:
+    # return a single product by its id or none if it is not found
+    return _run(_get_listing(listing_id, fields))
 
+
+def _create_listing(listing_data: Dict[str, Any]) -> Op:
     _ensure_config()
-    url = f"{SUPABASE_URL}/rest/v1/{PRODUCTS_TABLE}"
-    headers = _headers()
-    headers["Prefer"] = "return=representation"
-    resp = requests.post(url, headers=headers, json=listing_data)
-    if not resp.ok:
+    resp = yield Request("insert", PRODUCTS_TABLE, body=listing_data)
+    if resp.status_code >= 400:
         print("SUPABASE INSERT ERROR:", resp.status_code, resp.text)
         resp.raise_for_status()
-    created = resp.json()
-    return _normalize_product(created[0])
+    created = _normalize_product(resp.json()[0])
+    _listing_written(created.get("id"), created)
+    return created
+
+
+def create_listing(listing_data: Dict[str, Any]) -> Dict[str, Any]:
+    # insert a new product and return the created record
+    return _run(_create_listing(listing_data))
+
+
+def _update_listing(listing_id: str, listing_data: Dict[str, Any]) -> Op:
+    _ensure_config()
+    resp = yield Request("update", PRODUCTS_TABLE, {PRODUCT_ID_FIELD: listing_id}, body=listing_data)
+    resp.raise_for_status()
+    updated = _normalize_product(resp.json()[0])
+    _listing_written(listing_id, updated)
+    return updated
 
 
 def update_listing(listing_id: str, listing_data: Dict[str, Any]) -> Dict[str, Any]:
     # update an existing product and return the updated record
+    return _run(_update_listing(listing_id, listing_data))
+
+
+def cached_listings(listing_ids: List[str]) -> Tuple[Dict[str, Dict[str, Any]], List[str]]:
+    # split ids into listings already in the cache and the ids still to fetch
+    found: Dict[str, Dict[str, Any]] = {}
+    missing: List[str] = []
+    for listing_id in listing_ids:
+        cached = listing_cache.get(_listing_key(listing_id))
+        if cached is not None:
+            found[listing_id] = cached
+        else:
+            missing.append(listing_id)
+    return found, missing
 
+
+def _fetch_listings_by_id(listing_ids: List[str]) -> Op:
+    # one in.(...) query for ids that fit in a single request, refreshing their cache entries
+    resp = yield Request("select", PRODUCTS_TABLE, {f"{PRODUCT_ID_FIELD}__in": listing_ids})
+    resp.raise_for_status()
+    found: Dict[str, Dict[str, Any]] = {}
+    for record in resp.json():
+        listing = _normalize_product(record)
+        listing_cache.set(_listing_key(listing["id"]), listing)
+        found[str(listing["id"])] = listing
+    return found
+
+
+def _read_listings_by_id(listing_ids: List[str]) -> Op:
+    # _fetch_listings_by_id for readers: while upstream is unavailable the chunk is answered from stale
+    # entries, provided every id has one
+    try:
+        return (yield from _fetch_listings_by_id(listing_ids))
+    except UpstreamUnavailable as exc:
+        return {listing_id: _stale(listing_cache, _listing_key(listing_id), exc) for listing_id in listing_ids}
+
+
+def _get_listings_by_id(listing_ids: List[str], cached: bool = False) -> Op:
+    # fetch many products with in.(...) queries, returned as {id: listing}; missing ids are absent. with
+    # cached=True ids in the listing cache are answered locally and only the misses are read; writers checking
+    # ownership leave it off so they start from upstream's rows
     _ensure_config()
-    url = f"{SUPABASE_URL}/rest/v1/{PRODUCTS_TABLE}"
-    headers = _headers()
-    headers["Prefer"] = "return=representation"
-    resp = requests.patch(
-        url,
-        headers=headers,
-        params={PRODUCT_ID_FIELD: f"eq.{listing_id}"},
-        json=listing_data,
-    )
+    found, missing = cached_listings(listing_ids) if cached else ({}, list(listing_ids))
+    read = _read_listings_by_id if cached else _fetch_listings_by_id
+    for chunk in in_chunks(missing):
+        found.update((yield from read(chunk)))
+    return found
+
+
+def get_listings_by_id(listing_ids: List[str], cached: bool = False) -> Dict[str, Dict[str, Any]]:
+    return _run(_get_listings_by_id(listing_ids, cached))
+
+
+def _create_listings(rows: List[Dict[str, Any]]) -> Op:
+    # bulk insert in one request, run as a single statement: either every row lands or none does
+    _ensure_config()
+    if not rows:
+        return []
+    resp = yield Request("insert", PRODUCTS_TABLE, body=rows)
     resp.raise_for_status()
-    updated = resp.json()
-    return _normalize_product(updated[0])
+    created = [_normalize_product(record) for record in resp.json()]
+    for listing in created:
+        _listing_written(listing.get("id"), listing)
+    return created
 
 
-def delete_listing(listing_id: str) -> bool:
-    #delete a listing, and returns True on success
+def create_listings(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    # insert several products and return the created records in input order
+    return _run(_create_listings(rows))
 
+
+def _update_listings(changes: Dict[str, Dict[str, Any]]) -> Op:
+    # apply {id: fields} to many products with conditional PATCHes: listings given the same fields share
+    # id=in.(...) requests, split by in_chunks. an update only touches rows that still exist, so a listing
+    # deleted since it was read is left out of the result rather than inserted again
     _ensure_config()
-    url = f"{SUPABASE_URL}/rest/v1/{PRODUCTS_TABLE}"
-    resp = requests.delete(
-        url, headers=_headers(), params={PRODUCT_ID_FIELD: f"eq.{listing_id}"}
-    )
+    groups: Dict[str, Tuple[Dict[str, Any], List[str]]] = {}
+    for listing_id, fields in changes.items():
+        group = json.dumps(fields, sort_keys=True, default=str)
+        groups.setdefault(group, (fields, []))[1].append(listing_id)
+    updated: Dict[str, Dict[str, Any]] = {}
+    for fields, listing_ids in groups.values():
+        for chunk in in_chunks(listing_ids):
+            resp = yield Request("update", PRODUCTS_TABLE, {f"{PRODUCT_ID_FIELD}__in": chunk}, body=fields)
+            resp.raise_for_status()
+            for record in resp.json():
+                listing = _normalize_product(record)
+                _listing_written(listing.get("id"), listing)
+                updated[str(listing.get("id"))] = listing
+    return [updated[listing_id] for listing_id in changes if listing_id in updated]
+
+
+def update_listings(changes: Dict[str, Dict[str, Any]]) -> List[Dict[str, Any]]:
+    # update several products and return the updated records in input order; ids no longer found are absent
+    return _run(_update_listings(changes))
+
+
+def _delete_listing(listing_id: str) -> Op:
+    _ensure_config()
+    resp = yield Request("delete", PRODUCTS_TABLE, {PRODUCT_ID_FIELD: listing_id})
     resp.raise_for_status()
+    _listing_written(listing_id, None)
     return True
 
 
+def delete_listing(listing_id: str) -> bool:
+    #delete a listing, and returns True on success
+    return _run(_delete_listing(listing_id))
+
+
 def _public_storage_url(path: str) -> Optional[str]:
     if not path:
         return None
@@ -170,13 +668,18 @@ def _public_storage_url(path: str) -> Optional[str]:
     return f"{SUPABASE_URL}/storage/v1/object/public/{AVATAR_BUCKET}/{normalized}"
 
 
-def get_user_profile(user_id: str) -> Optional[Dict[str, Any]]:
-    # fetch a supabase user record including public metadata usable across the app
-
+def _get_user_profile(user_id: str) -> Op:
     _ensure_config()
-    url = f"{SUPABASE_URL}/auth/v1/admin/users/{user_id}"
-    resp = requests.get(url, headers=_headers())
+    key = f"profile:{user_id}"
+    cached = profile_cache.get(key)
+    if cached is not None:
+        return cached or None
+    try:
+        resp = yield Request("user", user_id)
+    except UpstreamUnavailable as exc:
+        return _stale(profile_cache, key, exc) or None
     if resp.status_code == 404:
+        profile_cache.set(key, False, ttl=PROFILE_NEGATIVE_TTL)
         return None
     resp.raise_for_status()
     data = resp.json()
@@ -190,72 +693,290 @@ def get_user_profile(user_id: str) -> Optional[Dict[str, Any]]:
         "avatar_path": avatar_path,
         "avatar_url": _public_storage_url(avatar_path),
     }
+    profile_cache.set(key, profile)
     return profile
 
 
-def get_orders(filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
-    # return transactions for products
+def get_user_profile(user_id: str) -> Optional[Dict[str, Any]]:
+    # fetch a supabase user record including public metadata usable across the app
+    return _run(_get_user_profile(user_id))
+
+
+# an order's listing, embedded under "product"
+_PRODUCT_EMBED = Embed("product", PRODUCT_ID_FIELD)
 
+
+def _order_select(
+    filters: Optional[Dict[str, Any]] = None,
+    fields: Optional[List[str]] = None,
+    expand: bool = True,
+    sort: str = "created_at.desc",
+) -> Dict[str, Any]:
+    # Request columns and embed. filtering on product columns needs an inner embed, otherwise it is only
+    # nulled out. fields=None selects every order column; product.<field> entries narrow the embed and imply expand
+    inner = any(key.startswith("product.") for key in (filters or {}))
+    if fields is None:
+        columns = ["*"]
+        product_columns = ["*"] if expand else []
+    else:
+        wanted = [*fields, "id", sort.partition(".")[0]]
+        mapped = {"id": TRANSACTION_ID_FIELD, "listing_id": "prod_id"}
+        columns = list(dict.fromkeys(mapped.get(field, field) for field in wanted if "." not in field and field != "seller_id"))
+        product_fields = [field.partition(".")[2] for field in fields if field.startswith("product.")]
+        if expand and not product_fields:
+            product_columns = ["*"]
+        else:
+            if "seller_id" in fields:
+                # an order's seller comes from its product
+                product_fields.append("seller_id")
+            product_columns = _listing_columns(product_fields)
+    embed = None
+    if product_columns or inner:
+        # with no columns the embed filters the orders without returning the product
+        embed = _PRODUCT_EMBED._replace(columns=tuple(product_columns), inner=inner)
+    return {"columns": tuple(columns), "embed": embed}
+
+
+def _order_view(order: Dict[str, Any], fields: Optional[List[str]], expand: bool) -> Dict[str, Any]:
+    # shape a normalized order for the response: requested fields only, product kept whole when expanded
+    if fields is None:
+        return order if expand else {key: value for key, value in order.items() if key != "product"}
+    view = select_fields(order, fields)
+    if expand and not any(field.startswith("product.") for field in fields):
+        view["product"] = order.get("product")
+    return view
+
+
+def _get_orders(filters: Optional[Dict[str, Any]] = None) -> Op:
     _ensure_config()
-    url = f"{SUPABASE_URL}/rest/v1/{TRANSACTIONS_TABLE}"
-    params: Dict[str, Any] = {"select": f"*,product:{PRODUCT_ID_FIELD}(*)"}
-    if filters:
-        for key, value in filters.items():
-            if value is None:
-                continue
-            if isinstance(value, bool):
-                params[key] = f"eq.{str(value).lower()}"
-            else:
-                params[key] = f"eq.{value}"
-    resp = requests.get(url, headers=_headers(), params=params)
+    resp = yield Request("select", TRANSACTIONS_TABLE, filters, **_order_select(filters))
     resp.raise_for_status()
     data = resp.json()
     return [_normalize_order(order) for order in data]
 
 
-def create_order(order_data: Dict[str, Any]) -> Dict[str, Any]:
-    # insert a new transaction and return the created record
+def get_orders(filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    # return transactions for products
+    return _run(_get_orders(filters))
+
+
+def _get_orders_page(
+    filters: Optional[Dict[str, Any]] = None,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    count: bool = False,
+    sort: str = "created_at.desc",
+    fields: Optional[List[str]] = None,
+    expand: bool = True,
+) -> Op:
+    _ensure_config()
+    shape = _order_select(filters, fields, expand, sort)
+    request = Request("select", TRANSACTIONS_TABLE, filters, **shape, **_keyset(cursor, TRANSACTION_ID_FIELD, sort))
+    rows, total = yield from _fetch_page(request, limit, count)
+    page = _page([_normalize_order(order) for order in rows], limit, total, sort)
+    page["items"] = [_order_view(item, fields, expand) for item in page["items"]]
+    return page
+
+
+def get_orders_page(
+    filters: Optional[Dict[str, Any]] = None,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    count: bool = False,
+    sort: str = "created_at.desc",
+    fields: Optional[List[str]] = None,
+    expand: bool = True,
+) -> Dict[str, Any]:
+    # return one page of transactions in sort order (newest first by default) as {"items", "next_cursor", "total"};
+    # fields limits the order columns and product.<field> entries, expand=False drops the product embed
+    return _run(_get_orders_page(filters, limit, cursor, count, sort, fields, expand))
+
+
+def _create_order(order_data: Dict[str, Any]) -> Op:
     _ensure_config()
-    url = f"{SUPABASE_URL}/rest/v1/{TRANSACTIONS_TABLE}"
-    headers = _headers()
-    headers["Prefer"] = "return=representation"
-    params = {"select": f"*,product:{PRODUCT_ID_FIELD}(*)"}
-    resp = requests.post(url, headers=headers, params=params, json=order_data)
+    resp = yield Request("insert", TRANSACTIONS_TABLE, embed=_PRODUCT_EMBED, body=order_data)
     resp.raise_for_status()
     created = resp.json()
     return _normalize_order(created[0])
 
 
-def get_order(order_id: str) -> Optional[Dict[str, Any]]:
-    # return a single transaction by its id or None if it is not found
+def create_order(order_data: Dict[str, Any]) -> Dict[str, Any]:
+    # insert a new transaction and return the created record
+    return _run(_create_order(order_data))
+
+
+def _checkout_refusal(listing: Optional[Dict[str, Any]], buyer_id: str) -> Optional[str]:
+    if not listing:
+        return "not_found"
+    if listing.get("seller_id") == buyer_id:
+        return "own_listing"
+    if listing.get("sold"):
+        return "sold"
+    quantity = listing.get("quantity", 1)
+    if isinstance(quantity, int) and quantity <= 0:
+        return "out_of_stock"
+    return None
+
+
+def _claim_stock(listing: Dict[str, Any]) -> Op:
+    # compare-and-set against the quantity we read: PostgREST cannot decrement in place, so the update is
+    # conditional on the row still holding that quantity and matches nothing if another buyer got there first.
+    # a NULL sold counts as unsold, as in _checkout_refusal
+    conditions: Dict[str, Any] = {PRODUCT_ID_FIELD: listing["id"], "sold__isnot": True}
+    quantity = listing.get("quantity")
+    if isinstance(quantity, int):
+        conditions["quantity"] = quantity
+        fields: Dict[str, Any] = {"quantity": quantity - 1, "sold": quantity - 1 <= 0}
+    else:
+        fields = {"sold": True}
+    resp = yield Request("update", PRODUCTS_TABLE, conditions, body=fields)
+    resp.raise_for_status()
+    rows = resp.json()
+    if not rows:
+        return None
+    claimed = _normalize_product(rows[0])
+    _listing_written(claimed.get("id"), claimed)
+    return claimed
+
+
+def _release_stock(listing_id: str) -> Op:
+    # give a claimed unit back after the order insert failed, with the same compare-and-set as _claim_stock
+    for _ in range(CHECKOUT_MAX_ATTEMPTS):
+        listing = yield from _fetch_listing(listing_id)
+        if not listing:
+            return
+        conditions: Dict[str, Any] = {PRODUCT_ID_FIELD: listing_id}
+        quantity = listing.get("quantity")
+        if isinstance(quantity, int):
+            conditions["quantity"] = quantity
+            fields: Dict[str, Any] = {"quantity": quantity + 1, "sold": False}
+        else:
+            fields = {"sold": False}
+        resp = yield Request("update", PRODUCTS_TABLE, conditions, body=fields)
+        resp.raise_for_status()
+        rows = resp.json()
+        if rows:
+            _listing_written(listing_id, _normalize_product(rows[0]))
+            return
+
+
+def _checkout_rpc(listing_id: str, buyer_id: str, payment_method: Optional[str]) -> Op:
+    # stock check, decrement and insert in one transaction; refusals come back as P0001 errors named by reason
+    args = {"p_listing_id": listing_id, "p_buyer_id": buyer_id, "p_payment_method": payment_method}
+    resp = yield Request("rpc", CHECKOUT_RPC, body=args)
+    if resp.status_code == 400:
+        error = resp.json()
+        if error.get("code") == "P0001":
+            raise CheckoutError(error.get("message", ""))
+    resp.raise_for_status()
+    order = _normalize_order(resp.json())
+    _listing_written(listing_id, order.get("product"))
+    return order
+
+
+def _checkout(listing_id: str, buyer_id: str, payment_method: Optional[str] = None) -> Op:
     _ensure_config()
-    url = f"{SUPABASE_URL}/rest/v1/{TRANSACTIONS_TABLE}"
-    params = {
-        TRANSACTION_ID_FIELD: f"eq.{order_id}",
-        "select": f"*,product:{PRODUCT_ID_FIELD}(*)",
-    }
-    resp = requests.get(url, headers=_headers(), params=params)
+    if CHECKOUT_RPC:
+        return (yield from _checkout_rpc(listing_id, buyer_id, payment_method))
+    # the cached listing only picks the first compare-and-set; a lost one re-reads it from upstream, and so does
+    # a sold or out-of-stock refusal, which idempotency would replay for the key's lifetime if the copy was stale
+    listing = yield from _get_listing(listing_id)
+    fresh = False
+    for _ in range(CHECKOUT_MAX_ATTEMPTS):
+        refusal = _checkout_refusal(listing, buyer_id)
+        if refusal in {"sold", "out_of_stock"} and not fresh:
+            listing = yield from _fetch_listing(listing_id)
+            fresh = True
+            refusal = _checkout_refusal(listing, buyer_id)
+        if refusal:
+            raise CheckoutError(refusal)
+        claimed = yield from _claim_stock(listing)
+        if claimed is not None:
+            break
+        listing = yield from _fetch_listing(listing_id)
+        fresh = True
+    else:
+        raise CheckoutError("contended")
+
+    order_data: Dict[str, Any] = {"prod_id": listing_id, "buyer_id": buyer_id}
+    if payment_method:
+        order_data["payment_method"] = payment_method
+    try:
+        return (yield from _create_order(order_data))
+    except Exception:
+        yield from _release_stock(listing_id)
+        raise
+
+
+def checkout(listing_id: str, buyer_id: str, payment_method: Optional[str] = None) -> Dict[str, Any]:
+    # buy one unit of a listing without overselling; returns the order with its product embedded
+    # and raises CheckoutError when the purchase is refused
+    return _run(_checkout(listing_id, buyer_id, payment_method))
+
+
+def _get_order(order_id: str) -> Op:
+    _ensure_config()
+    resp = yield Request("select", TRANSACTIONS_TABLE, {TRANSACTION_ID_FIELD: order_id}, embed=_PRODUCT_EMBED)
     resp.raise_for_status()
     orders = resp.json()
     return _normalize_order(orders[0]) if orders else None
 
 
-def update_order(order_id: str, order_data: Dict[str, Any]) -> Dict[str, Any]:
-    #update a transaction and return the updated record
+def get_order(order_id: str) -> Optional[Dict[str, Any]]:
+    # return a single transaction by its id or None if it is not found
+    return _run(_get_order(order_id))
+
+
+def _fetch_orders_by_id(
+    order_ids: List[str],
+    filters: Optional[Dict[str, Any]] = None,
+    fields: Optional[List[str]] = None,
+    expand: bool = True,
+) -> Op:
+    # one in.(...) query for ids that fit in a single request; filters (e.g. the caller's role) still apply
+    conditions = dict(filters or {}, **{f"{TRANSACTION_ID_FIELD}__in": order_ids})
+    resp = yield Request("select", TRANSACTIONS_TABLE, conditions, **_order_select(filters, fields, expand))
+    resp.raise_for_status()
+    found: Dict[str, Dict[str, Any]] = {}
+    for record in resp.json():
+        order = _normalize_order(record)
+        found[str(order["id"])] = _order_view(order, fields, expand)
+    return found
+
+
+def _get_orders_by_id(
+    order_ids: List[str],
+    filters: Optional[Dict[str, Any]] = None,
+    fields: Optional[List[str]] = None,
+    expand: bool = True,
+) -> Op:
     _ensure_config()
-    url = f"{SUPABASE_URL}/rest/v1/{TRANSACTIONS_TABLE}"
-    headers = _headers()
-    headers["Prefer"] = "return=representation"
-    params = {
-        TRANSACTION_ID_FIELD: f"eq.{order_id}",
-        "select": f"*,product:{PRODUCT_ID_FIELD}(*)",
-    }
-    resp = requests.patch(
-        url,
-        headers=headers,
-        params=params,
-        json=order_data,
+    found: Dict[str, Dict[str, Any]] = {}
+    for chunk in in_chunks(list(order_ids)):
+        found.update((yield from _fetch_orders_by_id(chunk, filters, fields, expand)))
+    return found
+
+
+def get_orders_by_id(
+    order_ids: List[str],
+    filters: Optional[Dict[str, Any]] = None,
+    fields: Optional[List[str]] = None,
+    expand: bool = True,
+) -> Dict[str, Dict[str, Any]]:
+    # many transactions by id as {id: order}; ids that do not exist or do not match filters are absent
+    return _run(_get_orders_by_id(order_ids, filters, fields, expand))
+
+
+def _update_order(order_id: str, order_data: Dict[str, Any]) -> Op:
+    _ensure_config()
+    resp = yield Request(
+        "update", TRANSACTIONS_TABLE, {TRANSACTION_ID_FIELD: order_id}, embed=_PRODUCT_EMBED, body=order_data
     )
     resp.raise_for_status()
     updated = resp.json()
     return _normalize_order(updated[0])
+
+
+def update_order(order_id: str, order_data: Dict[str, Any]) -> Dict[str, Any]:
+    #update a transaction and return the updated record
+    return _run(_update_order(order_id, order_data))
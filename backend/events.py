@@ -0,0 +1,131 @@
+# in-process pub/sub for listing and order changes, streamed to clients by GET /events as server-sent events.
+# each subscriber has a bounded queue: one that falls EVENTS_QUEUE_SIZE events behind is sent a reset and
+# disconnected instead of buffering without limit, and reconnects with Last-Event-ID to replay what it missed
+# from the last EVENTS_REPLAY_SIZE events. publish from the event loop (the route handlers).
+# the bus is per worker: a stream only carries writes handled by the worker it is connected to, and ids from
+# another worker's epoch are answered with a reset. clients that need every change also refetch periodically
+# (the home page does, every minute)
+
+from __future__ import annotations
+
+import asyncio
+import os
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Set
+
+EVENTS_QUEUE_SIZE: int = int(os.environ.get("EVENTS_QUEUE_SIZE", "256"))
+EVENTS_REPLAY_SIZE: int = int(os.environ.get("EVENTS_REPLAY_SIZE", "1000"))
+EVENTS_KEEPALIVE: float = float(os.environ.get("EVENTS_KEEPALIVE", "15"))
+
+LISTING_EVENTS = ("listing.created", "listing.updated", "listing.deleted")
+ORDER_EVENTS = ("order.created", "order.updated")
+
+Event = Dict[str, Any]
+
+
+class Subscription:
+    def __init__(self, accepts: Callable[[Event], bool], queue_size: int):
+        self.accepts = accepts
+        self.queue: "asyncio.Queue[Optional[Event]]" = asyncio.Queue(queue_size)
+        # events missed before subscribing: replayed ones, or a single reset when they are no longer buffered
+        self.backlog: List[Event] = []
+        self.overflowed = False
+
+    async def next(self, timeout: float) -> Optional[Event]:
+        # the next event, None after an overflow; asyncio.TimeoutError when idle for timeout seconds
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+
+class EventBus:
+    def __init__(self, queue_size: int = EVENTS_QUEUE_SIZE, replay_size: int = EVENTS_REPLAY_SIZE):
+        self.queue_size = queue_size
+        # ids are "<epoch>.<sequence>" so an id from before a restart is recognised and answered with a reset
+        self.epoch = format(int(time.time() * 1000), "x")
+        self._seq = 0
+        self._recent: Deque[Event] = deque(maxlen=replay_size)
+        self._subscribers: Set[Subscription] = set()
+        self._stats: Dict[str, int] = {"published": 0, "delivered": 0, "overflows": 0, "replayed": 0, "resets": 0}
+
+    def publish(self, kind: str, data: Dict[str, Any], **routing: Any) -> Event:
+        # routing holds the keys subscribers filter on (seller_id, buyer_id, category); only data is sent
+        self._seq += 1
+        event = {"id": f"{self.epoch}.{self._seq}", "seq": self._seq, "type": kind, "data": data, **routing}
+        self._recent.append(event)
+        self._stats["published"] += 1
+        for subscription in list(self._subscribers):
+            if subscription.overflowed or not subscription.accepts(event):
+                continue
+            try:
+                subscription.queue.put_nowait(event)
+                self._stats["delivered"] += 1
+            except asyncio.QueueFull:
+                self._overflow(subscription)
+        return event
+
+    def _overflow(self, subscription: Subscription) -> None:
+        # drop what the slow consumer has queued and leave only the end-of-stream marker
+        subscription.overflowed = True
+        while not subscription.queue.empty():
+            subscription.queue.get_nowait()
+        subscription.queue.put_nowait(None)
+        self._stats["overflows"] += 1
+
+    def _reset(self) -> Event:
+        self._stats["resets"] += 1
+        return {"id": f"{self.epoch}.{self._seq}", "type": "reset", "data": {"reason": "events missed, refetch"}}
+
+    def subscribe(self, accepts: Callable[[Event], bool], last_event_id: Optional[str] = None) -> Subscription:
+        # register before returning so nothing published after the backlog is taken can be missed
+        subscription = Subscription(accepts, self.queue_size)
+        if last_event_id:
+            epoch, _, seq = last_event_id.partition(".")
+            oldest = self._recent[0]["seq"] if self._recent else self._seq + 1
+            if epoch != self.epoch or not seq.isdigit() or int(seq) < oldest - 1:
+                subscription.backlog.append(self._reset())
+            else:
+                subscription.backlog = [event for event in self._recent if event["seq"] > int(seq) and accepts(event)]
+                self._stats["replayed"] += len(subscription.backlog)
+        self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        self._subscribers.discard(subscription)
+
+    def close(self) -> None:
+        # end every open stream, e.g. when the worker shuts down: streams never finish on their own, so a
+        # graceful shutdown would otherwise wait out its timeout. clients reconnect elsewhere with Last-Event-ID
+        for subscription in list(self._subscribers):
+            if subscription.overflowed:
+                continue
+            subscription.overflowed = True
+            while not subscription.queue.empty():
+                subscription.queue.get_nowait()
+            subscription.queue.put_nowait(None)
+
+    def listing_changed(self, kind: str, listing: Optional[Dict[str, Any]]) -> None:
+        if not listing:
+            return
+        data = listing if kind != "listing.deleted" else {"id": listing.get("id")}
+        self.publish(kind, data, seller_id=listing.get("seller_id"), category=listing.get("category"))
+
+    def order_changed(self, kind: str, order: Optional[Dict[str, Any]]) -> None:
+        if not order:
+            return
+        product = order.get("product") or {}
+        self.publish(
+            kind,
+            order,
+            buyer_id=order.get("buyer_id"),
+            seller_id=order.get("seller_id") or product.get("seller_id"),
+            category=product.get("category"),
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        stats: Dict[str, Any] = dict(self._stats)
+        stats["subscribers"] = len(self._subscribers)
+        stats["buffered"] = len(self._recent)
+        return stats
+
+
+event_bus = EventBus()
@@ -0,0 +1,156 @@
+# Idempotency-Key support for POST /orders and POST /listings. clients retrying a timed-out POST send the same
+# key, and the request runs once per (user, key): a duplicate that arrives while the first is still running
+# waits for it, and one that arrives later gets the recorded response replayed (with Idempotent-Replayed:
+# true) without touching Supabase. reusing a key for a different request is refused with 422.
+#
+# records live in a bounded cache (cache.py) for IDEMPOTENCY_TTL seconds. IDEMPOTENCY_BACKEND=redis (the default
+# when REDIS_URL is set) shares them across workers, so a retry that lands on another worker is still answered
+# from the record; IDEMPOTENCY_BACKEND=memory only holds within a worker, so the launcher (server.py) will not run
+# several workers with it. successes and definite refusals (4xx) are recorded;
+# "try again" answers (409, 429, 5xx) and upstream failures release the key so the retry runs again
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from fastapi import HTTPException, Response, status
+
+from .cache import CacheBackend, build_cache
+
+IDEMPOTENCY_BACKEND: str = (os.environ.get("IDEMPOTENCY_BACKEND") or ("redis" if os.environ.get("REDIS_URL") else "memory")).lower()
+IDEMPOTENCY_MAX_KEYS: int = int(os.environ.get("IDEMPOTENCY_MAX_KEYS", "10000"))
+# how long a completed response is replayed for
+IDEMPOTENCY_TTL: float = float(os.environ.get("IDEMPOTENCY_TTL", "86400"))
+# how long a request may hold its key before a duplicate on another worker may run it again (a crashed worker)
+IDEMPOTENCY_LOCK_TTL: float = float(os.environ.get("IDEMPOTENCY_LOCK_TTL", "30"))
+# longest a duplicate waits for the first request on another worker before it is answered 409
+IDEMPOTENCY_WAIT: float = float(os.environ.get("IDEMPOTENCY_WAIT", "10"))
+
+MAX_KEY_LENGTH = 255
+# refusals that ask the client to try again (e.g. a contended checkout), so they are not replayed
+RETRYABLE_STATUSES = frozenset({409, 429})
+POLL_INTERVAL = 0.05
+
+# (None, body) for a response, (status, detail) for a refusal
+Outcome = Tuple[Optional[int], Any]
+
+
+def request_fingerprint(method: str, path: str, payload: Any) -> str:
+    return hashlib.sha256(json.dumps([method, path, payload], sort_keys=True, default=str).encode()).hexdigest()
+
+
+class IdempotencyStore:
+    def __init__(self, records: CacheBackend, ttl: float = IDEMPOTENCY_TTL, lock_ttl: float = IDEMPOTENCY_LOCK_TTL,
+                 wait: float = IDEMPOTENCY_WAIT):
+        self.records = records
+        self.ttl = ttl
+        self.lock_ttl = lock_ttl
+        self.wait = wait
+        # requests running in this process, so local duplicates await them instead of polling the records
+        self._tasks: Dict[Any, Tuple[str, "asyncio.Future[Outcome]"]] = {}
+        self._lock = threading.Lock()
+        self._stats = {"executed": 0, "replayed": 0, "joined": 0, "conflicts": 0, "mismatches": 0, "released": 0}
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._stats[name] += 1
+
+    async def run(self, user_id: str, key: Optional[str], fingerprint: str, call: Callable[[], Awaitable[Any]],
+                  response: Response) -> Any:
+        # call() once per (user, key); its result, or the recorded one for a duplicate. HTTPExceptions are
+        # part of the outcome and raised again for every duplicate
+        if key is None:
+            return await call()
+        if not key or len(key) > MAX_KEY_LENGTH or not key.isascii() or not key.isprintable():
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Idempotency-Key must be 1 to {MAX_KEY_LENGTH} printable ASCII characters",
+            )
+        record_key = f"idempotency:{user_id}:{key}"
+        deadline = time.monotonic() + self.wait
+        while True:
+            local = self._tasks.get((asyncio.get_running_loop(), record_key))
+            if local is not None:
+                self._check(local[0], fingerprint)
+                self._count("joined")
+                outcome = await asyncio.shield(local[1])
+                return self._answer(outcome, response, replayed=True)
+            record = self.records.get(record_key)
+            if record is not None:
+                self._check(record["fingerprint"], fingerprint)
+                if record["state"] == "done":
+                    self._count("replayed")
+                    return self._answer((record["status"], record["body"]), response, replayed=True)
+            elif self.records.add(record_key, {"state": "running", "fingerprint": fingerprint}, ttl=self.lock_ttl):
+                return self._answer(await self._execute(record_key, fingerprint, call), response, replayed=False)
+            # running on another worker: wait for its record
+            if time.monotonic() >= deadline:
+                self._count("conflicts")
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail="A request with this Idempotency-Key is still in progress",
+                    headers={"Retry-After": "1"},
+                )
+            await asyncio.sleep(POLL_INTERVAL)
+
+    async def _execute(self, record_key: str, fingerprint: str, call: Callable[[], Awaitable[Any]]) -> Outcome:
+        # run call() as a task local duplicates can share; a cancelled first request does not cancel it
+        task = asyncio.ensure_future(self._outcome(record_key, fingerprint, call))
+        task_key = (asyncio.get_running_loop(), record_key)
+        self._tasks[task_key] = (fingerprint, task)
+        task.add_done_callback(lambda _: self._tasks.pop(task_key, None))
+        self._count("executed")
+        return await asyncio.shield(task)
+
+    async def _outcome(self, record_key: str, fingerprint: str, call: Callable[[], Awaitable[Any]]) -> Outcome:
+        try:
+            outcome: Outcome = (None, await call())
+        except HTTPException as exc:
+            if exc.status_code >= 500 or exc.status_code in RETRYABLE_STATUSES:
+                self._release(record_key)
+                raise
+            outcome = (exc.status_code, exc.detail)
+        except BaseException:
+            self._release(record_key)
+            raise
+        record = {"state": "done", "fingerprint": fingerprint, "status": outcome[0], "body": outcome[1]}
+        self.records.set(record_key, record, ttl=self.ttl)
+        return outcome
+
+    def _release(self, record_key: str) -> None:
+        self.records.delete(record_key)
+        self._count("released")
+
+    def _check(self, recorded: str, fingerprint: str) -> None:
+        if recorded != fingerprint:
+            self._count("mismatches")
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="Idempotency-Key was already used for a different request",
+            )
+
+    @staticmethod
+    def _answer(outcome: Outcome, response: Response, replayed: bool) -> Any:
+        status_code, body = outcome
+        if replayed:
+            response.headers["Idempotent-Replayed"] = "true"
+        if status_code is not None:
+            headers = {"Idempotent-Replayed": "true"} if replayed else None
+            raise HTTPException(status_code=status_code, detail=body, headers=headers)
+        return body
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats: Dict[str, Any] = dict(self._stats)
+        stats["in_flight"] = len(self._tasks)
+        stats["backend"] = self.records.stats()["backend"]
+        return stats
+
+
+idempotent_requests = IdempotencyStore(build_cache(IDEMPOTENCY_BACKEND, IDEMPOTENCY_MAX_KEYS, IDEMPOTENCY_TTL, stale_ttl=0))
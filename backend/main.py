@@ -2,124 +2,465 @@
 
 from __future__ import annotations
 
+import asyncio
+import hmac
+import json
+import logging
 import os
-from typing import List, Dict, Any, Optional
-import re
-from difflib import SequenceMatcher
+from datetime import datetime
+from typing import AsyncIterator, List, Dict, Any, Optional, Tuple, Union, get_args
 
-from fastapi import Depends, FastAPI, HTTPException, status
+from fastapi import Body, Depends, FastAPI, Header, HTTPException, Query, Request, Response, status
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 import jwt
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import ValidationError
 
-from . import database, schemas
+from . import async_database, auth, database, metrics, resilience, responses, schemas, transport
+from .cache import (
+    LISTING_CACHE_TTL, PROFILE_CACHE_TTL, WORKERS, etag_cache, listing_cache, profile_cache, shared_across_workers,
+)
+from .events import EVENTS_KEEPALIVE, LISTING_EVENTS, ORDER_EVENTS, event_bus
+from .idempotency import idempotent_requests, request_fingerprint
+from .search import listing_index as search_index
+from .resilience import upstream_guard
+from .singleflight import upstream_reads
+from .summary import category_summary
 
-app = FastAPI(title="UMarket API", version="0.1.0")
+app = FastAPI(
+    title="UMarket API",
+    version="0.1.0",
+    default_response_class=responses.FastJSONResponse if responses.FAST_RESPONSES else responses.TimedJSONResponse,
+)
 
 frontend_origin_env = os.getenv("FRONTEND_URLS") or os.getenv("FRONTEND_URL", "http://localhost:3000")
 frontend_origins = [origin.strip() for origin in frontend_origin_env.split(",") if origin.strip()]
 
+# page size used when a list request has no limit, and the most rows a single request may ask for
+DEFAULT_PAGE_SIZE = int(os.getenv("API_DEFAULT_PAGE_SIZE", "100"))
+MAX_PAGE_SIZE = int(os.getenv("API_MAX_PAGE_SIZE", "500"))
+# most ids accepted by a single batch lookup such as GET /users?ids=
+MAX_BATCH_IDS = int(os.getenv("API_MAX_BATCH_IDS", "100"))
+# most entries accepted by POST/PATCH /listings/batch
+MAX_BATCH_ITEMS = int(os.getenv("API_MAX_BATCH_ITEMS", "100"))
+# rows per upstream read for the NDJSON exports, and a bearer token that may export every transaction
+EXPORT_CHUNK_SIZE = int(os.getenv("API_EXPORT_CHUNK_SIZE", "1000"))
+EXPORT_TOKEN = os.getenv("API_EXPORT_TOKEN", "")
+# bearer token required by GET /metrics when set; leave empty where the endpoint is only reachable internally
+METRICS_TOKEN = os.getenv("API_METRICS_TOKEN", "")
+# Cache-Control for public reads: browsers revalidate with If-None-Match, shared caches (CDN, reverse proxy)
+# may serve a copy for as long as the listing/profile caches would
+LISTINGS_CACHE_CONTROL = os.getenv(
+    "API_LISTINGS_CACHE_CONTROL", f"public, max-age=0, s-maxage={int(LISTING_CACHE_TTL)}, stale-while-revalidate=30"
+)
+PROFILES_CACHE_CONTROL = os.getenv(
+    "API_PROFILES_CACHE_CONTROL", f"public, max-age=60, s-maxage={int(PROFILE_CACHE_TTL)}"
+)
+
+
+def _request_priority(method: str, path: str) -> int:
+    # order in which requests give way when Supabase is slow: checkout last, then other writes, then reads a
+    # signed-in user is waiting on; browsing, search, the summary and exports are shed first
+    if method == "POST" and path == "/orders":
+        return resilience.CRITICAL
+    if method not in {"GET", "HEAD"}:
+        return resilience.HIGH
+    if path in {"/listings", "/listings/summary", "/events"} or path.endswith("/export"):
+        return resilience.LOW
+    return resilience.NORMAL
+
+
+app.add_middleware(resilience.PriorityMiddleware, classify=_request_priority)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=frontend_origins,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Total-Count", "ETag", "Idempotent-Replayed"],
 )
+if responses.compression_enabled():
+    app.add_middleware(responses.CompressionMiddleware)
+if metrics.METRICS_ENABLED:
+    # added last so it is outermost and its timings include compression
+    app.add_middleware(metrics.MetricsMiddleware)
 
 _http_bearer = HTTPBearer(auto_error=False)
 
 
-def get_current_user_id(credential: HTTPAuthorizationCredentials = Depends(_http_bearer)) -> str:
+@app.exception_handler(resilience.UpstreamUnavailable)
+async def _upstream_unavailable(request: Request, exc: resilience.UpstreamUnavailable) -> Response:
+    # shed or refused by an open breaker, with no stale copy to serve instead
+    return JSONResponse(
+        {"detail": str(exc)}, status_code=status.HTTP_503_SERVICE_UNAVAILABLE, headers={"Retry-After": resilience.retry_after(exc)}
+    )
+
+
+async def _upstream_failed(request: Request, exc: Exception) -> Response:
+    # a Supabase outage, timeout or 5xx is a 503 the client may retry rather than an unhandled 500
+    if not transport.upstream_fault(exc):
+        raise exc
+    return JSONResponse(
+        {"detail": "Upstream request failed"},
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        headers={"Retry-After": str(max(1, int(resilience.SHED_RETRY_AFTER)))},
+    )
+
+
+for _error in transport.UPSTREAM_ERRORS:
+    app.add_exception_handler(_error, _upstream_failed)
+
+
+@app.on_event("startup")
+async def _check_idempotency_scope() -> None:
+    # the launcher refuses this combination; uvicorn --workers on its own does not
+    if not shared_across_workers(idempotent_requests.records):
+        logging.getLogger("uvicorn.error").warning(
+            "Idempotency-Key records are kept per worker with %d workers: a retried POST on another worker runs "
+            "again. Set REDIS_URL (IDEMPOTENCY_BACKEND=redis) or run one worker", WORKERS,
+        )
+
+
+@app.on_event("shutdown")
+async def _close_upstream() -> None:
+    await transport.aclose()
+    transport.close()
+    database.storage.close()
+
+
+async def get_current_user_id(credential: HTTPAuthorizationCredentials = Depends(_http_bearer)) -> str:
     # validate the Supabase JWT sent via the Authorization header and return the user's UUID
     if credential is None or not credential.credentials:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Missing bearer token")
 
-    token = credential.credentials
-    secret = os.getenv("SUPABASE_JWT_SECRET")
-    if not secret:
-        raise RuntimeError("SUPABASE_JWT_SECRET environment variable must be set")
-
     try:
-        payload = jwt.decode(token, secret, algorithms=["HS256"], options={"verify_aud": False})
+        with metrics.span("auth"):
+            user_id = auth.user_id_for_token(credential.credentials)
     except jwt.PyJWTError as exc:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid authentication token",
         ) from exc
 
-    user_id = payload.get("sub") or payload.get("user_id")
     if not user_id:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token missing subject")
     return user_id
 
 
-@app.get("/listings", response_model=List[schemas.Listing])
-def list_listings(
+async def get_export_scope(credential: HTTPAuthorizationCredentials = Depends(_http_bearer)) -> Optional[str]:
+    # None for the analytics export token (all transactions), otherwise the authenticated user's id
+    if EXPORT_TOKEN and credential is not None and hmac.compare_digest(credential.credentials, EXPORT_TOKEN):
+        return None
+    return await get_current_user_id(credential)
+
+
+async def get_optional_user_id(
+    credential: Optional[HTTPAuthorizationCredentials] = Depends(_http_bearer),
+) -> Optional[str]:
+    # the authenticated user's id when a bearer token is sent, None for anonymous requests
+    if credential is None or not credential.credentials:
+        return None
+    return await get_current_user_id(credential)
+
+
+def _page_limit(limit: Optional[int]) -> int:
+    # limits above MAX_PAGE_SIZE are refused with 422 by the query validation; follow X-Next-Cursor for more
+    return limit or min(DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE)
+
+
+def _encoded(response: Response, content: Any, fields: Any) -> Any:
+    # with API_FAST_RESPONSES, trim the normalized rows to the model's fields and encode them directly
+    # instead of validating them again; otherwise FastAPI validates and serializes through the response model
+    if not responses.FAST_RESPONSES or content is None:
+        return content
+    if isinstance(content, list):
+        return responses.json_response([database.select_fields(item, fields) for item in content], response)
+    return responses.json_response(database.select_fields(content, fields), response)
+
+
+def _validator_key(kind: str, *parts: Any) -> str:
+    # listing resources are keyed on the listings version, so any write through the API retires their validators
+    return f"etag:{kind}:{database.listings_version()}:{json.dumps(parts, sort_keys=True, default=str)}"
+
+
+def _not_modified(request: Request, key: str, cache_control: str) -> Optional[Response]:
+    # answer If-None-Match from the validator recorded for this resource version, before going upstream. only
+    # when every worker shares the version and the tags: a worker that did not see a write would still match
+    # the old tag. otherwise the tag is compared with the body once it is read (_validated)
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match or not shared_across_workers(etag_cache):
+        return None
+    etag = etag_cache.get(key)
+    if etag and responses.etag_matches(if_none_match, etag):
+        return responses.not_modified(etag, cache_control)
+    return None
+
+
+def _validated(
+    request: Request, response: Response, key: Optional[str], ttl: float, cache_control: str, content: Any
+) -> Optional[Response]:
+    # tag a freshly read body and remember the tag under key; 304 when it is what the client already holds
+    etag = responses.etag_for(content)
+    if key is not None and shared_across_workers(etag_cache):
+        etag_cache.set(key, etag, ttl=ttl)
+    if responses.etag_matches(request.headers.get("if-none-match"), etag):
+        return responses.not_modified(etag, cache_control)
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = cache_control
+    return None
+
+
+def _paged(response: Response, page: Dict[str, Any]) -> List[Dict[str, Any]]:
+    # keep list bodies for existing clients and carry pagination state in headers
+    if page.get("next_cursor"):
+        response.headers["X-Next-Cursor"] = page["next_cursor"]
+    if page.get("total") is not None:
+        response.headers["X-Total-Count"] = str(page["total"])
+    return page["items"]
+
+
+@app.get("/health")
+async def health(request: Request, response: Response) -> Dict[str, Any]:
+    # liveness plus upstream connection pool and cache statistics for monitoring. a worker that is shutting
+    # down (server.py) answers 503 so load balancers stop routing to it while it finishes what it has
+    draining = getattr(request.app.state, "draining", False)
+    if draining:
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    return {
+        "status": "draining" if draining else "ok",
+        "upstream": transport.pool_stats(),
+        "listing_cache": listing_cache.stats(),
+        "profile_cache": profile_cache.stats(),
+        "profile_reads": async_database.profile_reads.stats(),
+        "etag_cache": etag_cache.stats(),
+        "auth": auth.stats(),
+        "encoding": responses.encoding_stats(),
+        "summary": category_summary.stats(),
+        "events": event_bus.stats(),
+        "storage": database.storage.stats(),
+        "upstream_guard": upstream_guard.stats(),
+        "idempotency": idempotent_requests.stats(),
+    }
+
+
+BREAKER_STATES = {"closed": 0, "half_open": 1, "open": 2}
+
+
+def _stat_samples() -> List[Tuple[str, str, str, Dict[str, str], float]]:
+    # existing counters from /health, re-exposed for Prometheus at scrape time
+    upstream = transport.pool_stats()
+    samples: List[Tuple[str, str, str, Dict[str, str], float]] = [
+        ("umarket_upstream_in_flight", "gauge", "Supabase calls in flight.", {}, upstream["in_flight"]),
+        ("umarket_upstream_retries_total", "counter", "Supabase calls retried.", {}, upstream["retries"]),
+        ("umarket_upstream_async_connections", "gauge", "Open aiohttp connections.", {}, upstream["async_connections"]),
+    ]
+    for name, cache in (("listing", listing_cache), ("profile", profile_cache), ("etag", etag_cache)):
+        stats = cache.stats()
+        for result in ("hits", "misses"):
+            samples.append(("umarket_cache_lookups_total", "counter", "Cache lookups by cache and result.",
+                            {"cache": name, "result": result}, stats[result]))
+    verification = auth.stats()
+    samples.append(("umarket_auth_verifications_total", "counter", "JWT signature verifications (cache misses).",
+                    {}, verification["verifications"]))
+    samples.append(("umarket_event_subscribers", "gauge", "Open /events streams.", {}, event_bus.stats()["subscribers"]))
+    coalescing = upstream_reads.stats()
+    samples.append(("umarket_upstream_coalesced_total", "counter",
+                    "Supabase reads answered by joining an identical call already in flight (calls saved).",
+                    {}, coalescing["coalesced"]))
+    samples.append(("umarket_upstream_coalesced_errors_total", "counter",
+                    "Coalesced reads that received the shared call's error.", {}, coalescing["shared_errors"]))
+    guard = upstream_guard.stats()
+    limiters, breakers = guard["limiters"].items(), guard["breakers"].items()
+    for name, kind, help_text, key in (
+        ("umarket_upstream_concurrency_limit", "gauge", "Adaptive concurrency limit per endpoint class.", "limit"),
+        ("umarket_upstream_limiter_in_flight", "gauge", "Calls holding a limiter slot.", "in_flight"),
+        ("umarket_upstream_limiter_waiting", "gauge", "Calls queued for a limiter slot.", "waiting"),
+    ):
+        samples.extend((name, kind, help_text, {"endpoint": endpoint}, limiter[key]) for endpoint, limiter in limiters)
+    samples.extend(
+        ("umarket_upstream_shed_total", "counter", "Calls refused by the limiter, by request priority.",
+         {"endpoint": endpoint, "priority": priority}, count)
+        for endpoint, limiter in limiters for priority, count in limiter["shed"].items()
+    )
+    samples.extend(("umarket_upstream_breaker_state", "gauge", "Circuit breaker state: 0 closed, 1 half-open, 2 open.",
+                    {"endpoint": endpoint}, BREAKER_STATES[breaker["state"]]) for endpoint, breaker in breakers)
+    samples.extend(("umarket_upstream_breaker_opened_total", "counter", "Times the circuit breaker opened.",
+                    {"endpoint": endpoint}, breaker["opened"]) for endpoint, breaker in breakers)
+    samples.extend(("umarket_upstream_breaker_rejected_total", "counter", "Calls failed fast by an open breaker.",
+                    {"endpoint": endpoint}, breaker["rejected"]) for endpoint, breaker in breakers)
+    samples.append(("umarket_upstream_stale_served_total", "counter",
+                    "Reads answered from an expired cache entry while upstream was unavailable.", {}, guard["served_stale"]))
+    idempotency = idempotent_requests.stats()
+    samples.extend(("umarket_idempotent_requests_total", "counter",
+                    "POSTs with an Idempotency-Key by outcome: executed, replayed from the record, joined while in "
+                    "flight, 409 still in progress, 422 key reused.", {"outcome": outcome}, idempotency[outcome])
+                   for outcome in ("executed", "replayed", "joined", "conflicts", "mismatches"))
+    return samples
+
+
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics(credential: Optional[HTTPAuthorizationCredentials] = Depends(_http_bearer)) -> Response:
+    # Prometheus text format: request and upstream histograms plus the /health counters
+    if METRICS_TOKEN and (credential is None or not hmac.compare_digest(credential.credentials, METRICS_TOKEN)):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid metrics token")
+    return Response(metrics.render(_stat_samples()), media_type="text/plain; version=0.0.4")
+
+
+def _csv(value: Optional[str]) -> List[str]:
+    return [part.strip() for part in (value or "").split(",") if part.strip()]
+
+
+def _sort(sort: str, direction: str) -> str:
+    try:
+        return database.sort_spec(sort, direction == "desc")
+    except ValueError as exc:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc)) from exc
+
+
+def _range_filters(prefix: str, min_price: Optional[float], max_price: Optional[float]) -> Dict[str, Any]:
+    if min_price is not None and max_price is not None and min_price > max_price:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="min_price must not exceed max_price")
+    return {f"{prefix}price__gte": min_price, f"{prefix}price__lte": max_price}
+
+
+def _category_filter(prefix: str, category: Optional[str]) -> Dict[str, Any]:
+    categories = _csv(category)
+    if len(categories) > 1:
+        return {f"{prefix}category__in": categories}
+    return {f"{prefix}category": categories[0] if categories else None}
+
+
+def _fields(fields: Optional[str], allowed: Tuple[str, ...], embeds: Tuple[str, ...] = ()) -> Optional[List[str]]:
+    try:
+        return database.parse_fields(fields, allowed, embeds)
+    except ValueError as exc:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc)) from exc
+
+
+@app.get(
+    "/listings",
+    response_model=Union[List[schemas.Listing], List[schemas.PartialListing], List[Optional[schemas.PartialListing]]],
+    response_model_exclude_unset=True,
+)
+async def list_listings(
+    request: Request,
+    response: Response,
     seller_id: Optional[str] = None,
     sold: Optional[bool] = None,
+    category: Optional[str] = Query(None, description="Category slug, or several separated by commas"),
+    min_price: Optional[float] = Query(None, ge=0),
+    max_price: Optional[float] = Query(None, ge=0),
+    q: Optional[str] = Query(None, description="Substring of the listing name, matched in the database"),
+    fulltext: bool = Query(False, description="Match q as a full-text query instead of a substring"),
+    sort: str = Query("created_at", description="created_at, price or name"),
+    direction: str = Query("desc", pattern="^(asc|desc)$"),
     search: Optional[str] = None,
-) -> List[schemas.Listing]:
-    # return all listings, optional filtering by seller or sold flag
+    fields: Optional[str] = Query(None, description="Comma separated listing fields to return, e.g. id,name,price"),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    count: bool = False,
+    ids: Optional[str] = Query(
+        None, description="Comma separated listing ids, returned in this order with null for ids not found"
+    ),
+) -> List[Dict[str, Any]]:
+    # return listings one page at a time, filtered and ordered by the database (newest first by default).
+    # follow X-Next-Cursor for the next page; count=true adds X-Total-Count. search= ranks fuzzy matches
+    # in process and ignores the sort; no match is an empty list, and its X-Next-Cursor pages through the best
+    # SEARCH_MAX_RESULTS matches. ids= looks up known listings instead of paging; the other filters
+    # still apply. responses carry an ETag; If-None-Match is answered with 304
 
-    filters: Dict[str, Any] = {}
-    if seller_id:
-        filters["seller_id"] = seller_id
-    if sold is not None:
-        filters["sold"] = sold
-    listings = database.get_listings(filters if filters else None)
-    if not search:
-        return listings
-
-    term = search.strip().lower()
-    if not term:
-        return listings
-
-    def _tokenize(value: str) -> List[str]:
-        return re.findall(r"[a-z0-9]+", value.lower())
-
-    def _score_listing(item: Dict[str, Any]) -> float:
-        fields = [
-            str(item.get("name", "")),
-            str(item.get("category", "")),
-            str(item.get("description", "")),
-        ]
-        scores = []
-        for field in fields:
-            if not field:
-                continue
-            field_lower = field.lower()
-            if term in field_lower:
-                scores.append(1.0)
-                continue
-            scores.append(SequenceMatcher(None, term, field_lower).ratio())
-            tokens = _tokenize(field)
-            for token in tokens:
-                if term in token:
-                    scores.append(0.95)
-                else:
-                    scores.append(SequenceMatcher(None, term, token).ratio())
-        return max(scores) if scores else 0.0
-
-    scored = []
-    for listing in listings:
-        score = _score_listing(listing)
-        if score >= 0.35:
-            scored.append((score, listing))
-
-    if not scored:
-        return listings
-
-    scored.sort(key=lambda pair: pair[0], reverse=True)
-    return [item for _, item in scored]
+    filters: Dict[str, Any] = {"seller_id": seller_id or None, "sold": sold}
+    filters.update(_category_filter("", category))
+    filters.update(_range_filters("", min_price, max_price))
+    if q and q.strip():
+        filters["name__wfts" if fulltext else "name__icontains"] = q.strip()
+    filters = {key: value for key, value in filters.items() if value is not None}
+    page_size = _page_limit(limit)
+    order = _sort(sort, direction)
+    selected = _fields(fields, database.LISTING_FIELDS)
+    if ids is not None:
+        return await _listings_by_id(request, response, _parse_ids(ids), filters, selected)
+    key = _validator_key("listings", filters, page_size, cursor, count, order, selected, search)
+    not_modified = _not_modified(request, key, LISTINGS_CACHE_CONTROL)
+    if not_modified is not None:
+        return not_modified
+
+    async def _fetch_page() -> List[Dict[str, Any]]:
+        try:
+            page = await async_database.get_listings_page(
+                filters or None, limit=page_size, cursor=cursor, count=count, sort=order, fields=selected
+            )
+        except ValueError as exc:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc)) from exc
+        return _paged(response, page)
+
+    async def _search(query: str) -> List[Dict[str, Any]]:
+        try:
+            offset = database.decode_search_cursor(cursor, query) if cursor else 0
+        except ValueError as exc:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc)) from exc
+        await search_index.refresh_if_stale_async(async_database.get_listings)
+
+        def _matches_filters(item: Dict[str, Any]) -> bool:
+            return database.filter_matches(item, filters)
+
+        # every page ranks with the same budget so consecutive pages slice one ranking
+        budget = max(search_index.max_results, page_size)
+        scored = search_index.search(query, predicate=_matches_filters, limit=budget)
+        end = offset + page_size
+        if end < len(scored):
+            response.headers["X-Next-Cursor"] = database.encode_search_cursor(query, end)
+        return [database.select_fields(item, selected) for _, item in scored[offset:end]]
+
+    items = await _search(search.strip()) if search and search.strip() else await _fetch_page()
+    paging = {name: response.headers.get(name) for name in ("X-Next-Cursor", "X-Total-Count")}
+    view = selected or database.LISTING_FIELDS
+    validated = _validated(request, response, key, LISTING_CACHE_TTL, LISTINGS_CACHE_CONTROL, [items, paging])
+    return validated or _encoded(response, items, view)
+
+
+async def _listings_by_id(
+    request: Request, response: Response, listing_ids: List[str], filters: Dict[str, Any], selected: Optional[List[str]]
+) -> Any:
+    # cached listings are answered locally and the rest read with in.(...) queries, in request order
+    key = _validator_key("listings-ids", listing_ids, filters, selected)
+    not_modified = _not_modified(request, key, LISTINGS_CACHE_CONTROL)
+    if not_modified is not None:
+        return not_modified
+    found = await async_database.get_listings_by_id(listing_ids, cached=True)
+    items = [
+        database.select_fields(found[listing_id], selected)
+        if listing_id in found and database.filter_matches(found[listing_id], filters) else None
+        for listing_id in listing_ids
+    ]
+    validated = _validated(request, response, key, LISTING_CACHE_TTL, LISTINGS_CACHE_CONTROL, items)
+    return validated or _encoded(response, items, selected or database.LISTING_FIELDS)
 
 
 @app.post("/listings", response_model=schemas.Listing, status_code=status.HTTP_201_CREATED)
-def create_listing(listing: schemas.ListingCreate, user_id: str = Depends(get_current_user_id)):
-    #create a new listing owned by the authenticaed user
+async def create_listing(
+    listing: schemas.ListingCreate,
+    response: Response,
+    user_id: str = Depends(get_current_user_id),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
+):
+    #create a new listing owned by the authenticaed user; a retry with the same Idempotency-Key gets the
+    # first listing back instead of creating another
+
+    async def create() -> Dict[str, Any]:
+        created = await async_database.create_listing(_new_listing_row(listing, user_id))
+        search_index.upsert(created)
+        event_bus.listing_changed("listing.created", created)
+        return created
+
+    fingerprint = request_fingerprint("POST", "/listings", listing.dict())
+    return await idempotent_requests.run(user_id, idempotency_key, fingerprint, create, response)
+
 
+def _new_listing_row(listing: schemas.ListingCreate, user_id: str) -> Dict[str, Any]:
     data = listing.dict(exclude_unset=True)
-    listing_data = {
+    return {
         "seller_id": user_id,
         "name": data["name"],
         "price": data["price"],
@@ -127,28 +468,236 @@ def create_listing(listing: schemas.ListingCreate, user_id: str = Depends(get_cu
         "sold": False,
         "category": data["category"],
     }
-    created = database.create_listing(listing_data)
-    return created
 
 
-@app.get("/listings/{listing_id}", response_model=schemas.Listing)
-def retrieve_listing(listing_id: str) -> schemas.Listing:
+def _listing_changes(listing: schemas.ListingUpdate) -> Dict[str, Any]:
+    # only fields the client set to a value; explicit nulls are ignored
+    data = listing.dict(exclude_unset=True)
+    return {
+        field: data[field]
+        for field in ("name", "price", "quantity", "sold", "category")
+        if data.get(field) is not None
+    }
+
+
+def _batch_items(items: List[Any]) -> None:
+    if not items:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Batch must not be empty")
+    if len(items) > MAX_BATCH_ITEMS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"at most {MAX_BATCH_ITEMS} entries per batch",
+        )
+
+
+def _validation_error(exc: ValidationError) -> str:
+    return "; ".join(f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}" for error in exc.errors())
+
+
+@app.post("/listings/batch", response_model=List[schemas.ListingBatchResult])
+async def create_listings_batch(
+    items: List[Dict[str, Any]] = Body(...),
+    user_id: str = Depends(get_current_user_id),
+):
+    # create many listings with one bulk insert; invalid entries are reported in place and not inserted
+    _batch_items(items)
+    results: List[Dict[str, Any]] = [{"index": index} for index in range(len(items))]
+    rows: List[Dict[str, Any]] = []
+    positions: List[int] = []
+    for index, item in enumerate(items):
+        try:
+            listing = schemas.ListingCreate.parse_obj(item)
+        except ValidationError as exc:
+            results[index].update(status=status.HTTP_422_UNPROCESSABLE_ENTITY, error=_validation_error(exc))
+            continue
+        rows.append(_new_listing_row(listing, user_id))
+        positions.append(index)
+
+    created = await async_database.create_listings(rows)
+    for index, listing in zip(positions, created):
+        search_index.upsert(listing)
+        event_bus.listing_changed("listing.created", listing)
+        results[index].update(status=status.HTTP_201_CREATED, listing=listing)
+    return results
+
+
+@app.patch("/listings/batch", response_model=List[schemas.ListingBatchResult])
+async def edit_listings_batch(
+    items: List[Dict[str, Any]] = Body(...),
+    user_id: str = Depends(get_current_user_id),
+):
+    # update many listings: one in.(...) lookup for ownership, then one PATCH per distinct set of changes
+    _batch_items(items)
+    results: List[Dict[str, Any]] = [{"index": index} for index in range(len(items))]
+    updates: Dict[str, Tuple[int, schemas.ListingBatchUpdate]] = {}
+    for index, item in enumerate(items):
+        try:
+            update = schemas.ListingBatchUpdate.parse_obj(item)
+        except ValidationError as exc:
+            results[index].update(status=status.HTTP_422_UNPROCESSABLE_ENTITY, error=_validation_error(exc))
+            continue
+        if update.id in updates:
+            results[index].update(status=status.HTTP_409_CONFLICT, error="Listing appears more than once in the batch")
+            continue
+        updates[update.id] = (index, update)
+
+    existing = await async_database.get_listings_by_id(list(updates))
+    changes: Dict[str, Dict[str, Any]] = {}
+    for listing_id, (index, update) in updates.items():
+        current = existing.get(listing_id)
+        if not current:
+            results[index].update(status=status.HTTP_404_NOT_FOUND, error="Listing not found")
+        elif current.get("seller_id") != user_id:
+            results[index].update(status=status.HTTP_403_FORBIDDEN, error="You are not authorized to edit this listing")
+        elif _listing_changes(update):
+            changes[listing_id] = _listing_changes(update)
+        else:
+            results[index].update(status=status.HTTP_200_OK, listing=current)
+
+    updated = {str(listing["id"]): listing for listing in await async_database.update_listings(changes)}
+    for listing_id in changes:
+        index = updates[listing_id][0]
+        listing = updated.get(listing_id)
+        if listing is None:
+            # deleted between the ownership check and the update
+            results[index].update(status=status.HTTP_404_NOT_FOUND, error="Listing not found")
+            continue
+        search_index.upsert(listing)
+        event_bus.listing_changed("listing.updated", listing)
+        results[index].update(status=status.HTTP_200_OK, listing=listing)
+    return results
+
+
+def _export_position(since: Optional[str], since_id: Optional[str], filters: Dict[str, Any]) -> Optional[str]:
+    # resume after the last row received: since=<its created_at> and since_id=<its id> continue exactly after
+    # it; since alone continues after that timestamp
+    if since is None:
+        if since_id is not None:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="since_id requires since")
+        return None
+    try:
+        datetime.fromisoformat(since)
+    except ValueError as exc:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="since must be an ISO 8601 timestamp") from exc
+    if since_id is None:
+        filters["created_at__gt"] = since
+        return None
+    return database.encode_cursor({"created_at": since, "id": since_id}, database.EXPORT_SORT)
+
+
+async def _ndjson(chunks: AsyncIterator[List[Dict[str, Any]]]) -> StreamingResponse:
+    # read the first chunk before answering so a bad request or upstream failure still gets an error status
+    try:
+        first = await chunks.__anext__()
+    except StopAsyncIteration:
+        first = []
+    except ValueError as exc:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc)) from exc
+
+    async def body() -> AsyncIterator[bytes]:
+        try:
+            yield responses.ndjson_lines(first)
+            async for chunk in chunks:
+                yield responses.ndjson_lines(chunk)
+        finally:
+            await chunks.aclose()
+
+    return StreamingResponse(body(), media_type="application/x-ndjson", headers={"X-Accel-Buffering": "no"})
+
+
+@app.get("/listings/export", response_class=StreamingResponse)
+async def export_listings(
+    seller_id: Optional[str] = None,
+    sold: Optional[bool] = None,
+    category: Optional[str] = Query(None, description="Category slug, or several separated by commas"),
+    since: Optional[str] = Query(None, description="created_at of the last listing received, to resume"),
+    since_id: Optional[str] = Query(None, description="id of the last listing received, with since"),
+):
+    # stream every matching listing as newline-delimited JSON, oldest first, reading upstream in chunks
+    filters: Dict[str, Any] = {"seller_id": seller_id or None, "sold": sold}
+    filters.update(_category_filter("", category))
+    filters = {key: value for key, value in filters.items() if value is not None}
+    cursor = _export_position(since, since_id, filters)
+    return await _ndjson(async_database.export_listings(filters or None, cursor, EXPORT_CHUNK_SIZE))
+
+
+@app.get("/listings/summary", response_model=schemas.ListingsSummary)
+async def summarize_listings(
+    request: Request,
+    response: Response,
+    newest: int = Query(4, ge=0, le=20, description="Newest available listings to include per category"),
+):
+    # available listing counts, price ranges and the newest listings per category, from the in-process
+    # aggregate. reconciliation can change it without a listing write, so the ETag is always checked on content
+    await category_summary.refresh_if_stale(
+        lambda: async_database.export_listings({"sold": False}, None, EXPORT_CHUNK_SIZE)
+    )
+    summary = category_summary.snapshot(newest, get_args(schemas.CategorySlug))
+    key = _validator_key("listings-summary", newest)
+    validated = _validated(request, response, key, LISTING_CACHE_TTL, LISTINGS_CACHE_CONTROL, summary)
+    return validated or summary
+
+
+@app.get(
+    "/listings/{listing_id}",
+    response_model=Union[schemas.Listing, schemas.PartialListing],
+    response_model_exclude_unset=True,
+)
+async def retrieve_listing(
+    listing_id: str,
+    request: Request,
+    response: Response,
+    fields: Optional[str] = Query(None, description="Comma separated listing fields to return"),
+) -> Dict[str, Any]:
     #fetch a listing by ID
-    listing = database.get_listing(listing_id)
+    selected = _fields(fields, database.LISTING_FIELDS)
+    key = _validator_key("listing", listing_id, selected)
+    not_modified = _not_modified(request, key, LISTINGS_CACHE_CONTROL)
+    if not_modified is not None:
+        return not_modified
+    listing = await async_database.get_listing(listing_id, selected)
     if not listing:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Listing not found")
-    return listing
+    validated = _validated(request, response, key, LISTING_CACHE_TTL, LISTINGS_CACHE_CONTROL, listing)
+    return validated or _encoded(response, listing, selected or database.LISTING_FIELDS)
+
+
+@app.get("/listings/{listing_id}/detail", response_model=schemas.ListingDetail)
+async def retrieve_listing_detail(listing_id: str, request: Request, response: Response) -> Dict[str, Any]:
+    # the item page in one round trip: the listing and its seller's profile. the profile needs the listing's
+    # seller_id, so the two reads are chained here rather than by the browser (both are usually cached)
+    key = _validator_key("listing-detail", listing_id)
+    not_modified = _not_modified(request, key, LISTINGS_CACHE_CONTROL)
+    if not_modified is not None:
+        return not_modified
+    listing = await async_database.get_listing(listing_id)
+    if not listing:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Listing not found")
+    seller = None
+    if listing.get("seller_id"):
+        try:
+            seller = await async_database.get_user_profile(listing["seller_id"])
+        except (resilience.UpstreamUnavailable, *transport.UPSTREAM_ERRORS):
+            # the listing is still worth showing without its seller; the validator comes from this body and is
+            # not stored, so the next request reads the profile again
+            key = None
+    detail = dict(listing, seller=seller)
+    ttl = min(LISTING_CACHE_TTL, PROFILE_CACHE_TTL)
+    validated = _validated(request, response, key, ttl, LISTINGS_CACHE_CONTROL, detail)
+    if validated is not None or not responses.FAST_RESPONSES:
+        return validated or detail
+    return responses.json_response(dict(database.select_fields(listing, database.LISTING_FIELDS), seller=seller), response)
 
 
 @app.patch("/listings/{listing_id}", response_model=schemas.Listing)
-def edit_listing(
+async def edit_listing(
     listing_id: str,
     listing: schemas.ListingUpdate,
     user_id: str = Depends(get_current_user_id),
 ):
     # update a listing, only the owner should be allowed to edit
 
-    existing = database.get_listing(listing_id)
+    existing = await async_database.get_listing(listing_id)
     if not existing:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Listing not found")
     if existing.get("seller_id") != user_id:
@@ -157,29 +706,20 @@ def edit_listing(
             detail="You are not authorized to edit this listing",
         )
 
-    data = listing.dict(exclude_unset=True)
-    update_data: Dict[str, Any] = {}
-    if data.get("name") is not None:
-        update_data["name"] = data["name"]
-    if data.get("price") is not None:
-        update_data["price"] = data["price"]
-    if data.get("quantity") is not None:
-        update_data["quantity"] = data["quantity"]
-    if data.get("sold") is not None:
-        update_data["sold"] = data["sold"]
-    if data.get("category") is not None:
-        update_data["category"] = data["category"]
+    update_data = _listing_changes(listing)
     if not update_data:
         return existing
-    updated = database.update_listing(listing_id, update_data)
+    updated = await async_database.update_listing(listing_id, update_data)
+    search_index.upsert(updated)
+    event_bus.listing_changed("listing.updated", updated)
     return updated
 
 
 @app.delete("/listings/{listing_id}", status_code=status.HTTP_204_NO_CONTENT)
-def remove_listing(listing_id: str, user_id: str = Depends(get_current_user_id)):
+async def remove_listing(listing_id: str, user_id: str = Depends(get_current_user_id)):
     # delete a listing, only owner should be allowed to delete
 
-    existing = database.get_listing(listing_id)
+    existing = await async_database.get_listing(listing_id)
     if not existing:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Listing not found")
     if existing.get("seller_id") != user_id:
@@ -187,16 +727,41 @@ def remove_listing(listing_id: str, user_id: str = Depends(get_current_user_id))
             status_code=status.HTTP_403_FORBIDDEN,
             detail="You are not authorized to delete this listing",
         )
-    database.delete_listing(listing_id)
+    await async_database.delete_listing(listing_id)
+    search_index.remove(listing_id)
+    event_bus.listing_changed("listing.deleted", existing)
     return None
 
 
-@app.get("/orders", response_model=List[schemas.Order])
-def list_orders(
+@app.get(
+    "/orders",
+    response_model=Union[List[schemas.Order], List[schemas.PartialOrder], List[Optional[schemas.PartialOrder]]],
+    response_model_exclude_unset=True,
+)
+async def list_orders(
+    response: Response,
     role: str = "buyer",
+    category: Optional[str] = Query(None, description="Product category slug, or several separated by commas"),
+    min_price: Optional[float] = Query(None, ge=0),
+    max_price: Optional[float] = Query(None, ge=0),
+    direction: str = Query("desc", pattern="^(asc|desc)$"),
+    fields: Optional[str] = Query(
+        None, description="Comma separated order fields, product.<field> for product fields, e.g. id,product.name"
+    ),
+    expand: Optional[str] = Query(
+        None, pattern="^(product)?$", description="product to embed the whole product, empty to leave it out"
+    ),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    count: bool = False,
+    ids: Optional[str] = Query(
+        None, description="Comma separated order ids, returned in this order with null for ids not found"
+    ),
     user_id: str = Depends(get_current_user_id),
-) -> List[schemas.Order]:
-    # return transactions for the current user as buyer or seller
+) -> List[Dict[str, Any]]:
+    # return transactions for the current user as buyer or seller by date (newest first by default), one page
+    # at a time; product filters are applied by the database through the embedded product. ids= looks up
+    # known orders instead; orders outside the caller's role and filters come back as null like missing ones
     if role not in {"buyer", "seller"}:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -207,69 +772,161 @@ def list_orders(
         filters["buyer_id"] = user_id
     else:
         filters["product.seller_id"] = user_id
-    orders = database.get_orders(filters)
-    return orders
+    filters.update(_category_filter("product.", category))
+    filters.update(_range_filters("product.", min_price, max_price))
+    filters = {key: value for key, value in filters.items() if value is not None}
+    selected, expand_product = _order_fields(fields, expand)
+    if ids is not None:
+        order_ids = _parse_ids(ids)
+        found = await async_database.get_orders_by_id(order_ids, filters, selected, expand_product)
+        orders = [found.get(order_id) for order_id in order_ids]
+        return _encoded(response, orders, _order_view(selected, expand_product))
+    try:
+        page = await async_database.get_orders_page(
+            filters,
+            limit=_page_limit(limit),
+            cursor=cursor,
+            count=count,
+            sort=_sort("created_at", direction),
+            fields=selected,
+            expand=expand_product,
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc)) from exc
+    return _encoded(response, _paged(response, page), _order_view(selected, expand_product))
 
 
-@app.post("/orders", response_model=schemas.Order, status_code=status.HTTP_201_CREATED)
-def create_order(order: schemas.OrderCreate, user_id: str = Depends(get_current_user_id)):
-    # create a new transaction for a product listing
+def _order_fields(fields: Optional[str], expand: Optional[str]) -> Tuple[Optional[List[str]], bool]:
+    selected = _fields(fields, database.ORDER_FIELDS, ("product",))
+    # without fields= the whole product is embedded as before; with fields= only when asked for
+    return selected, expand == "product" if expand is not None else selected is None
 
-    listing = database.get_listing(order.listing_id)
-    if not listing:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Listing not found")
-    if listing["seller_id"] == user_id:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="You cannot purchase your own listing",
-        )
-    if listing.get("sold"):
+
+def _order_view(selected: Optional[List[str]], expand_product: bool) -> List[str]:
+    view = list(selected or database.ORDER_FIELDS)
+    if expand_product and not any(field.startswith("product.") for field in view):
+        view.extend(f"product.{field}" for field in database.LISTING_FIELDS)
+    return view
+
+
+DASHBOARD_SECTIONS = ("listings", "purchases", "sales")
+
+
+@app.get("/dashboard", response_model=schemas.Dashboard, response_model_exclude_unset=True)
+async def dashboard(
+    response: Response,
+    include: Optional[str] = Query(None, description="Comma separated sections: listings, purchases, sales (all by default)"),
+    fields: Optional[str] = Query(
+        None, description="Comma separated order fields for purchases and sales, as for GET /orders"
+    ),
+    expand: Optional[str] = Query(None, pattern="^(product)?$"),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Rows per section"),
+    user_id: str = Depends(get_current_user_id),
+) -> Dict[str, Any]:
+    # the current user's listings, purchases and sales in one response, read concurrently so the page waits for
+    # the slowest section rather than all of them in turn; each section is a page as /listings and /orders return
+    sections = list(dict.fromkeys(_csv(include))) or list(DASHBOARD_SECTIONS)
+    unknown = [section for section in sections if section not in DASHBOARD_SECTIONS]
+    if unknown:
         raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Listing has already been sold",
+            status_code=status.HTTP_400_BAD_REQUEST, detail=f"unknown dashboard section: {', '.join(unknown)}"
         )
-    quantity = listing.get("quantity", 1)
-    if isinstance(quantity, int) and quantity <= 0:
+    selected, expand_product = _order_fields(fields, expand)
+    page_size = _page_limit(limit)
+    reads = {
+        "listings": lambda: async_database.get_listings_page({"seller_id": user_id}, limit=page_size),
+        "purchases": lambda: async_database.get_orders_page(
+            {"buyer_id": user_id}, limit=page_size, fields=selected, expand=expand_product
+        ),
+        "sales": lambda: async_database.get_orders_page(
+            {"product.seller_id": user_id}, limit=page_size, fields=selected, expand=expand_product
+        ),
+    }
+    pages = await async_database.gather(*(reads[section]() for section in sections))
+    payload = dict(zip(sections, pages))
+    if not responses.FAST_RESPONSES:
+        return payload
+    views = {"listings": database.LISTING_FIELDS, "purchases": _order_view(selected, expand_product)}
+    views["sales"] = views["purchases"]
+    # pages may be the cached objects, so trim into copies
+    trimmed = {
+        section: dict(page, items=[database.select_fields(item, views[section]) for item in page["items"]])
+        for section, page in payload.items()
+    }
+    return responses.json_response(trimmed, response)
+
+
+@app.get("/orders/export", response_class=StreamingResponse)
+async def export_orders(
+    role: str = "buyer",
+    category: Optional[str] = Query(None, description="Product category slug, or several separated by commas"),
+    since: Optional[str] = Query(None, description="created_at of the last order received, to resume"),
+    since_id: Optional[str] = Query(None, description="id of the last order received, with since"),
+    user_id: Optional[str] = Depends(get_export_scope),
+):
+    # stream transactions with their product as newline-delimited JSON, oldest first. users export their own
+    # orders as buyer or seller; the API_EXPORT_TOKEN bearer exports every transaction and ignores role
+    if role not in {"buyer", "seller"}:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Listing is out of stock",
+            detail="role must be 'buyer' or 'seller'",
         )
+    filters: Dict[str, Any] = {}
+    if user_id is not None:
+        filters["buyer_id" if role == "buyer" else "product.seller_id"] = user_id
+    filters.update(_category_filter("product.", category))
+    filters = {key: value for key, value in filters.items() if value is not None}
+    cursor = _export_position(since, since_id, filters)
+    return await _ndjson(async_database.export_orders(filters or None, cursor, EXPORT_CHUNK_SIZE))
 
-    order_payload: Dict[str, Any] = {
-        "prod_id": order.listing_id,
-        "buyer_id": user_id,
-    }
-    if order.payment_method:
-        order_payload["payment_method"] = order.payment_method
 
-    created = database.create_order(order_payload)
+_CHECKOUT_REFUSALS = {
+    "not_found": (status.HTTP_404_NOT_FOUND, "Listing not found"),
+    "own_listing": (status.HTTP_400_BAD_REQUEST, "You cannot purchase your own listing"),
+    "sold": (status.HTTP_400_BAD_REQUEST, "Listing has already been sold"),
+    "out_of_stock": (status.HTTP_400_BAD_REQUEST, "Listing is out of stock"),
+    "contended": (status.HTTP_409_CONFLICT, "Listing is being purchased by others, please retry"),
+}
 
-    update_fields: Dict[str, Any] = {}
-    if isinstance(quantity, int):
-        new_quantity = max(quantity - 1, 0)
-        update_fields["quantity"] = new_quantity
-        if new_quantity == 0:
-            update_fields["sold"] = True
-    else:
-        update_fields["sold"] = True
-    if update_fields:
-        database.update_listing(order.listing_id, update_fields)
 
-    return created
+@app.post("/orders", response_model=schemas.Order, status_code=status.HTTP_201_CREATED)
+async def create_order(
+    order: schemas.OrderCreate,
+    response: Response,
+    user_id: str = Depends(get_current_user_id),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
+):
+    # create a new transaction for a product listing. with an Idempotency-Key, a retried purchase is answered
+    # with the first attempt's order (or refusal) rather than buying the listing again
+
+    async def place() -> Dict[str, Any]:
+        try:
+            created = await async_database.checkout(order.listing_id, user_id, order.payment_method)
+        except async_database.CheckoutError as exc:
+            status_code, detail = _CHECKOUT_REFUSALS.get(exc.reason, (status.HTTP_400_BAD_REQUEST, exc.reason))
+            raise HTTPException(status_code=status_code, detail=detail) from exc
+        if created.get("product"):
+            search_index.upsert(created["product"])
+            event_bus.listing_changed("listing.updated", created["product"])
+        event_bus.order_changed("order.created", created)
+        return created
+
+    fingerprint = request_fingerprint("POST", "/orders", order.dict())
+    return await idempotent_requests.run(user_id, idempotency_key, fingerprint, place, response)
 
 
 @app.patch("/orders/{order_id}", response_model=schemas.Order)
-def update_order(
+async def update_order(
     order_id: str,
     payload: schemas.OrderUpdate,
     user_id: str = Depends(get_current_user_id),
 ):
-    order = database.get_order(order_id)
+    order = await async_database.get_order(order_id)
     if not order:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Order not found")
     product = order.get("product")
     if not product:
-        product = database.get_listing(order.get("listing_id"))
+        product = await async_database.get_listing(order.get("listing_id"))
     if not product:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Associated listing not found")
     if product.get("seller_id") != user_id and order.get("buyer_id") != user_id:
@@ -280,13 +937,101 @@ def update_order(
     update_fields = payload.dict(exclude_unset=True)
     if not update_fields:
         return order
-    updated = database.update_order(order_id, update_fields)
+    updated = await async_database.update_order(order_id, update_fields)
+    event_bus.order_changed("order.updated", updated)
     return updated
 
 
+def _parse_ids(ids: str) -> List[str]:
+    # split a comma separated id list, keeping first-seen order
+    parsed = list(dict.fromkeys(part.strip() for part in ids.split(",") if part.strip()))
+    if not parsed:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="ids must not be empty")
+    if len(parsed) > MAX_BATCH_IDS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"at most {MAX_BATCH_IDS} ids per request",
+        )
+    return parsed
+
+
+def _event_filter(
+    user_id: Optional[str], types: List[str], seller_id: Optional[str], buyer_id: Optional[str], categories: List[str]
+):
+    # listing events are public; order events only reach their buyer or seller
+    def accepts(event: Dict[str, Any]) -> bool:
+        if types and event["type"] not in types:
+            return False
+        if event["type"] in ORDER_EVENTS and user_id not in {event.get("buyer_id"), event.get("seller_id")}:
+            return False
+        if seller_id and event.get("seller_id") != seller_id:
+            return False
+        if buyer_id and event.get("buyer_id") != buyer_id:
+            return False
+        return not categories or event.get("category") in categories
+
+    return accepts
+
+
+@app.get("/events", response_class=StreamingResponse)
+async def stream_events(
+    types: Optional[str] = Query(None, description="Comma separated event types, e.g. listing.created,order.created"),
+    seller_id: Optional[str] = None,
+    buyer_id: Optional[str] = None,
+    category: Optional[str] = Query(None, description="Category slug, or several separated by commas"),
+    last_event_id: Optional[str] = Header(None, alias="Last-Event-ID"),
+    since: Optional[str] = Query(None, description="Last event id received, for clients that cannot set Last-Event-ID"),
+    user_id: Optional[str] = Depends(get_optional_user_id),
+):
+    # server-sent events for listing and order changes made through this worker. order events need a bearer
+    # token and only cover the caller's own orders. reconnecting with Last-Event-ID replays missed events,
+    # or sends a reset event when they are no longer buffered
+    selected = _csv(types)
+    unknown = set(selected) - set(LISTING_EVENTS) - set(ORDER_EVENTS)
+    if unknown:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Unknown event types: {', '.join(sorted(unknown))}")
+    accepts = _event_filter(user_id, selected, seller_id, buyer_id, _csv(category))
+
+    async def body() -> AsyncIterator[bytes]:
+        # subscribe once streaming starts so the finally below always runs for a registered subscriber
+        subscription = event_bus.subscribe(accepts, last_event_id or since)
+        try:
+            yield b"retry: 3000\n\n"
+            for event in subscription.backlog:
+                yield responses.sse_event(event)
+            while True:
+                try:
+                    event = await subscription.next(EVENTS_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    yield b": keepalive\n\n"
+                    continue
+                if event is None:
+                    # fell too far behind: end the stream, the client reconnects and replays from its last id
+                    return
+                yield responses.sse_event(event)
+        finally:
+            event_bus.unsubscribe(subscription)
+
+    return StreamingResponse(
+        body(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/users", response_model=List[schemas.UserProfile])
+async def retrieve_user_profiles(ids: str = Query(..., description="Comma separated user ids")):
+    # resolve several profiles in one round trip, in request order; unknown ids are left out
+    user_ids = _parse_ids(ids)
+    profiles = await async_database.get_user_profiles(user_ids)
+    return [profiles[user_id] for user_id in user_ids if profiles[user_id]]
+
+
 @app.get("/users/{user_id}", response_model=schemas.UserProfile)
-def retrieve_user_profile(user_id: str):
-    profile = database.get_user_profile(user_id)
+async def retrieve_user_profile(user_id: str, request: Request, response: Response):
+    # profiles are edited in Supabase Auth, not through this API, so there is no version to key a validator on:
+    # the ETag is compared with the profile as read (from the profile cache at most PROFILE_CACHE_TTL old)
+    profile = await async_database.get_user_profile(user_id)
     if not profile:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
-    return profile
+    return _validated(request, response, None, PROFILE_CACHE_TTL, PROFILES_CACHE_CONTROL, profile) or profile
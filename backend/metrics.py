@@ -0,0 +1,290 @@
+# request and upstream-call instrumentation: per-route latency histograms recorded by MetricsMiddleware and
+# every Supabase call made through transport (method, table, status, bytes, duration). exposed in Prometheus
+# text format by GET /metrics, per response as a Server-Timing header (METRICS_SERVER_TIMING=true) and as a
+# sampled log line for requests slower than METRICS_SLOW_REQUEST_MS with their breakdown
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import random
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+METRICS_ENABLED: bool = os.environ.get("METRICS_ENABLED", "true").lower() in {"1", "true", "yes", "on"}
+METRICS_SERVER_TIMING: bool = os.environ.get("METRICS_SERVER_TIMING", "false").lower() in {"1", "true", "yes", "on"}
+# 0 disables the slow-request log; a sample rate below 1 logs only that fraction of slow requests
+METRICS_SLOW_REQUEST_MS: float = float(os.environ.get("METRICS_SLOW_REQUEST_MS", "0"))
+METRICS_SLOW_REQUEST_SAMPLE: float = float(os.environ.get("METRICS_SLOW_REQUEST_SAMPLE", "1"))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+logger = logging.getLogger(__name__)
+
+Labels = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: Tuple[str, ...], values: Iterable[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, label_names: Tuple[str, ...] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self._lock = threading.Lock()
+        self._values: Dict[Labels, float] = {}
+
+    def inc(self, labels: Labels = (), amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        lines.extend(f"{self.name}{_labels(self.label_names, labels)} {value:g}" for labels, value in values)
+        return lines
+
+
+class Histogram:
+    # fixed buckets, counted per bucket and made cumulative when rendered
+
+    def __init__(self, name: str, help_text: str, label_names: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        # labels -> [per-bucket counts (+Inf last), sum, count]
+        self._series: Dict[Labels, List[Any]] = {}
+
+    def observe(self, labels: Labels, value: float) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> List[str]:
+        with self._lock:
+            series = sorted((labels, (list(counts), total, count)) for labels, (counts, total, count) in self._series.items())
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for labels, (counts, total, count) in series:
+            cumulative = 0
+            for bound, bucket in zip((*self.buckets, "+Inf"), counts):
+                cumulative += bucket
+                le = f'le="{bound:g}"' if bound != "+Inf" else 'le="+Inf"'
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, labels)} {total:.6f}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, labels)} {count}")
+        return lines
+
+
+http_requests = Counter("umarket_http_requests_total", "HTTP requests by route and status.", ("method", "route", "status"))
+http_latency = Histogram(
+    "umarket_http_request_duration_seconds",
+    "Time until the response headers are sent, so streamed responses count their setup, not their length.",
+    ("method", "route"),
+)
+upstream_requests = Counter(
+    "umarket_upstream_requests_total", "Supabase calls by method, table and status.", ("method", "table", "status")
+)
+upstream_latency = Histogram(
+    "umarket_upstream_request_duration_seconds", "Duration of Supabase calls, retries counted separately.", ("method", "table")
+)
+upstream_bytes = Counter("umarket_upstream_response_bytes_total", "Bytes read from Supabase.", ("method", "table"))
+_in_flight = 0
+
+
+class RequestTimings:
+    # breakdown of one request, shared with the tasks it spawns through a context variable
+
+    __slots__ = ("started", "spans", "calls", "upstream_wall", "_open", "_open_since")
+
+    def __init__(self) -> None:
+        self.started = time.perf_counter()
+        self.spans: Dict[str, float] = {}
+        # (method, table, status, bytes, seconds) per upstream call
+        self.calls: List[Tuple[str, str, str, int, float]] = []
+        # wall time with at least one upstream call in flight, so concurrent calls are not double counted
+        self.upstream_wall = 0.0
+        self._open = 0
+        self._open_since = 0.0
+
+    def upstream_started(self) -> None:
+        if self._open == 0:
+            self._open_since = time.perf_counter()
+        self._open += 1
+
+    def upstream_finished(self, call: Tuple[str, str, str, int, float]) -> None:
+        self.calls.append(call)
+        self._open -= 1
+        if self._open == 0:
+            self.upstream_wall += time.perf_counter() - self._open_since
+
+
+_current: ContextVar[Optional[RequestTimings]] = ContextVar("request_timings", default=None)
+
+
+@contextmanager
+def span(name: str) -> Iterator[None]:
+    # time a stage of the current request (e.g. auth); a no-op outside a request
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.spans[name] = timings.spans.get(name, 0.0) + time.perf_counter() - started
+
+
+def upstream_table(url: str) -> str:
+    # low-cardinality label for a Supabase URL: the table, rpc/<function>, auth or storage
+    path = urlsplit(url).path
+    if path.startswith("/rest/v1/"):
+        return path[len("/rest/v1/"):].strip("/") or "rest"
+    if path.startswith("/auth/"):
+        return "auth"
+    if path.startswith("/storage/"):
+        return "storage"
+    return "other"
+
+
+def upstream_started() -> Optional[RequestTimings]:
+    timings = _current.get()
+    if timings is not None:
+        timings.upstream_started()
+    return timings
+
+
+def upstream_finished(
+    timings: Optional[RequestTimings], method: str, url: str, status: Any, size: int, seconds: float
+) -> None:
+    # status is the HTTP status, or "error" when the call raised
+    if not METRICS_ENABLED:
+        return
+    table = upstream_table(url)
+    upstream_requests.inc((method, table, str(status)))
+    upstream_latency.observe((method, table), seconds)
+    upstream_bytes.inc((method, table), size)
+    if timings is not None:
+        timings.upstream_finished((method, table, str(status), size, seconds))
+
+
+def _route(scope: Scope) -> str:
+    # the matched route's path template, so ids do not become label values
+    endpoint = scope.get("endpoint")
+    app = scope.get("app")
+    if endpoint is None or app is None:
+        return "unmatched"
+    templates = getattr(app, "_metrics_routes", None)
+    if templates is None:
+        templates = {getattr(route, "endpoint", None): getattr(route, "path", "") for route in app.routes}
+        app._metrics_routes = templates
+    return templates.get(endpoint, "unmatched")
+
+
+def server_timing(timings: RequestTimings, now: float) -> str:
+    total = now - timings.started
+    parts = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in timings.spans.items()]
+    if timings.calls:
+        parts.append(f'upstream;dur={timings.upstream_wall * 1000:.1f};desc="{len(timings.calls)} calls"')
+    app_time = total - timings.upstream_wall - sum(timings.spans.values())
+    parts.append(f"app;dur={max(app_time, 0.0) * 1000:.1f}")
+    parts.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(parts)
+
+
+class MetricsMiddleware:
+    # outermost middleware: times each request to its response headers and attaches the breakdown
+
+    def __init__(self, app: ASGIApp, server_timing_header: bool = METRICS_SERVER_TIMING):
+        self.app = app
+        self.server_timing_header = server_timing_header
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        global _in_flight
+        if scope["type"] != "http" or not METRICS_ENABLED:
+            await self.app(scope, receive, send)
+            return
+        timings = RequestTimings()
+        token = _current.set(timings)
+        state: Dict[str, Any] = {"status": 500, "headers_at": None}
+
+        async def send_with_timing(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                now = time.perf_counter()
+                state["status"] = message["status"]
+                state["headers_at"] = now
+                if self.server_timing_header:
+                    MutableHeaders(scope=message).append("Server-Timing", server_timing(timings, now))
+            await send(message)
+
+        _in_flight += 1
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _in_flight -= 1
+            _current.reset(token)
+            self._record(scope, timings, state)
+
+    def _record(self, scope: Scope, timings: RequestTimings, state: Dict[str, Any]) -> None:
+        finished = state["headers_at"] or time.perf_counter()
+        seconds = finished - timings.started
+        route = _route(scope)
+        http_requests.inc((scope["method"], route, str(state["status"])))
+        http_latency.observe((scope["method"], route), seconds)
+        if METRICS_SLOW_REQUEST_MS and seconds * 1000 >= METRICS_SLOW_REQUEST_MS \
+                and random.random() < METRICS_SLOW_REQUEST_SAMPLE:
+            logger.warning("slow request %s", json.dumps({
+                "method": scope["method"],
+                "path": scope["path"],
+                "route": route,
+                "status": state["status"],
+                "ms": round(seconds * 1000, 1),
+                "spans_ms": {name: round(value * 1000, 1) for name, value in timings.spans.items()},
+                "upstream_ms": round(timings.upstream_wall * 1000, 1),
+                "upstream": [
+                    {"method": method, "table": table, "status": status, "bytes": size, "ms": round(call * 1000, 1)}
+                    for method, table, status, size, call in timings.calls
+                ],
+            }))
+
+
+def render(samples: Iterable[Tuple[str, str, str, Dict[str, str], float]] = ()) -> str:
+    # Prometheus text exposition; samples are (name, type, help, labels, value) read from existing stats at scrape time
+    lines: List[str] = []
+    for metric in (http_requests, http_latency, upstream_requests, upstream_latency, upstream_bytes):
+        lines.extend(metric.render())
+    described = set()
+    in_flight = ("umarket_http_requests_in_flight", "gauge", "Requests being handled.", {}, _in_flight)
+    for name, kind, help_text, labels, value in (in_flight, *samples):
+        if name not in described:
+            described.add(name)
+            lines.extend([f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"])
+        lines.append(f"{name}{_labels(tuple(labels), labels.values())} {value:g}")
+    return "\n".join(lines) + "\n"
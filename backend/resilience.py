@@ -0,0 +1,464 @@
+# overload protection for upstream calls, per endpoint class (REST reads, REST writes, auth admin API):
+# - an adaptive concurrency limit: calls beyond it wait in a priority queue instead of piling onto a slow
+#   Supabase. the limit follows the gradient between the long-term and the recent average call latency
+#   (Netflix's Gradient2): it shrinks while recent calls are more than UPSTREAM_LATENCY_TOLERANCE x slower
+#   than usual, shrinks by a tenth per round trip while calls fail, and otherwise grows by about its square
+#   root as long as it is being used
+# - priority-aware shedding: each request carries a priority (PriorityMiddleware); low priorities may only
+#   fill part of the limit and wait a shorter share of UPSTREAM_QUEUE_TIMEOUT, and a call whose predicted wait
+#   (calls queued ahead of it / calls completing per second) is already longer is refused at once with Overloaded,
+#   so browse and search reads are shed long before a checkout has to wait
+# - a circuit breaker that opens once BREAKER_FAILURE_RATIO of the last BREAKER_WINDOW calls failed
+#   (connection errors, timeouts, 5xx, 429) and fails fast with CircuitOpen for BREAKER_COOLDOWN seconds,
+#   then lets one probe call through to decide whether to close again
+# both errors are UpstreamUnavailable: cached reads fall back to stale entries, anything else becomes a 503
+# with Retry-After. UPSTREAM_GUARD_ENABLED=false sends every call straight through
+
+from __future__ import annotations
+
+import asyncio
+import heapq
+import itertools
+import math
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Deque, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+UPSTREAM_GUARD_ENABLED: bool = os.environ.get("UPSTREAM_GUARD_ENABLED", "true").lower() in {"1", "true", "yes", "on"}
+UPSTREAM_LIMIT_INITIAL: int = int(os.environ.get("UPSTREAM_LIMIT_INITIAL", "20"))
+UPSTREAM_LIMIT_MIN: int = int(os.environ.get("UPSTREAM_LIMIT_MIN", "2"))
+UPSTREAM_LIMIT_MAX: int = int(os.environ.get("UPSTREAM_LIMIT_MAX", "200"))
+UPSTREAM_LATENCY_TOLERANCE: float = float(os.environ.get("UPSTREAM_LATENCY_TOLERANCE", "2.0"))
+# longest a call waits for a slot; lower priorities get a fraction of it
+UPSTREAM_QUEUE_TIMEOUT: float = float(os.environ.get("UPSTREAM_QUEUE_TIMEOUT", "2.0"))
+BREAKER_WINDOW: int = int(os.environ.get("BREAKER_WINDOW", "20"))
+BREAKER_MIN_CALLS: int = int(os.environ.get("BREAKER_MIN_CALLS", "10"))
+BREAKER_FAILURE_RATIO: float = float(os.environ.get("BREAKER_FAILURE_RATIO", "0.5"))
+BREAKER_COOLDOWN: float = float(os.environ.get("BREAKER_COOLDOWN", "5"))
+# Retry-After sent with a shed request
+SHED_RETRY_AFTER: float = float(os.environ.get("SHED_RETRY_AFTER", "1"))
+
+CRITICAL, HIGH, NORMAL, LOW = 0, 1, 2, 3
+PRIORITY_NAMES = {CRITICAL: "critical", HIGH: "high", NORMAL: "normal", LOW: "low"}
+# per priority: (share of the limit it may fill, share of UPSTREAM_QUEUE_TIMEOUT it may wait for a slot)
+SHEDDING: Dict[int, Tuple[float, float]] = {
+    CRITICAL: (1.0, 1.0),
+    HIGH: (1.0, 1.0),
+    NORMAL: (0.9, 0.5),
+    LOW: (0.75, 0.25),
+}
+ENDPOINT_CLASSES = ("rest_read", "rest_write", "auth")
+READ_METHODS = frozenset({"GET", "HEAD"})
+
+_priority: ContextVar[int] = ContextVar("upstream_priority", default=NORMAL)
+
+
+class UpstreamUnavailable(Exception):
+    # the call was not sent; retry_after is a hint in seconds for the client
+    def __init__(self, message: str, endpoint: str, retry_after: float):
+        super().__init__(message)
+        self.endpoint = endpoint
+        self.retry_after = retry_after
+
+
+class CircuitOpen(UpstreamUnavailable):
+    pass
+
+
+class Overloaded(UpstreamUnavailable):
+    pass
+
+
+def endpoint_class(method: str, url: str) -> str:
+    if urlsplit(url).path.startswith("/auth/"):
+        return "auth"
+    return "rest_read" if method in READ_METHODS else "rest_write"
+
+
+def current_priority() -> int:
+    return _priority.get()
+
+
+@contextmanager
+def priority(level: int) -> Iterator[None]:
+    # run work outside a request (scripts, background jobs) at the given priority
+    token = _priority.set(level)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class _Waiter:
+    __slots__ = ("priority", "granted", "abandoned", "event", "loop", "future")
+
+    def __init__(self, priority: int, loop: Optional[asyncio.AbstractEventLoop] = None):
+        self.priority = priority
+        self.granted = False
+        self.abandoned = False
+        self.loop = loop
+        self.event = threading.Event() if loop is None else None
+        self.future: Optional["asyncio.Future[None]"] = loop.create_future() if loop is not None else None
+
+    def wake(self) -> bool:
+        # False when the waiting loop is gone, so the slot must go to someone else
+        if self.event is not None:
+            self.event.set()
+            return True
+        try:
+            self.loop.call_soon_threadsafe(_resolve, self.future)
+        except RuntimeError:
+            return False
+        return True
+
+
+def _resolve(future: "asyncio.Future[None]") -> None:
+    if not future.done():
+        future.set_result(None)
+
+
+class AdaptiveLimiter:
+    # in-flight calls against one endpoint class, with a limit adjusted from their latency and errors
+
+    def __init__(self, name: str, initial: int = UPSTREAM_LIMIT_INITIAL, minimum: int = UPSTREAM_LIMIT_MIN,
+                 maximum: int = UPSTREAM_LIMIT_MAX, tolerance: float = UPSTREAM_LATENCY_TOLERANCE,
+                 queue_timeout: float = UPSTREAM_QUEUE_TIMEOUT):
+        self.name = name
+        self.minimum = minimum
+        self.maximum = maximum
+        self.tolerance = tolerance
+        self.queue_timeout = queue_timeout
+        self.limit = float(min(max(initial, minimum), maximum))
+        self.in_flight = 0
+        self._lock = threading.Lock()
+        # (priority, arrival, waiter): highest priority first, then first come first served
+        self._queue: List[Tuple[int, int, _Waiter]] = []
+        self._waiting = {priority: 0 for priority in PRIORITY_NAMES}
+        self._arrivals = itertools.count()
+        # exponential moving averages of call latency over roughly the last 10 and 500 calls
+        self._recent: Optional[float] = None
+        self._usual: Optional[float] = None
+        self._last_decrease = 0.0
+        # when the last calls finished, to tell how fast the queue drains
+        self._finished: Deque[float] = deque(maxlen=50)
+        self._stats = {"admitted": 0, "queued": 0, "timeouts": 0, "decreases": 0}
+        self._shed = {priority: 0 for priority in PRIORITY_NAMES}
+
+    def _admissible(self, priority: int) -> bool:
+        return self.in_flight < max(1, int(self.limit * SHEDDING[priority][0]))
+
+    def _first_waiting(self) -> Optional[_Waiter]:
+        while self._queue and self._queue[0][2].abandoned:
+            heapq.heappop(self._queue)
+        return self._queue[0][2] if self._queue else None
+
+    def _admit(self, priority: int) -> bool:
+        # lock held: take a slot now unless the limit is reached or an equal or higher priority is waiting
+        first = self._first_waiting()
+        if (first is not None and first.priority <= priority) or not self._admissible(priority):
+            return False
+        self.in_flight += 1
+        self._stats["admitted"] += 1
+        return True
+
+    def _drain_rate(self) -> float:
+        # calls finished per second recently; unknown (infinite) until there is enough history to judge
+        if len(self._finished) < 10:
+            return math.inf
+        return len(self._finished) / max(time.monotonic() - self._finished[0], 1e-6)
+
+    def _max_wait(self, priority: int) -> float:
+        return self.queue_timeout * SHEDDING[priority][1]
+
+    def _enqueue(self, waiter: _Waiter) -> None:
+        # lock held: join the queue, or shed the call when the calls ahead of it would outlast its wait
+        ahead = sum(count for priority, count in self._waiting.items() if priority <= waiter.priority)
+        if ahead and ahead > self._drain_rate() * self._max_wait(waiter.priority):
+            self._shed[waiter.priority] += 1
+            raise Overloaded(f"Upstream {self.name} overloaded", self.name, SHED_RETRY_AFTER)
+        heapq.heappush(self._queue, (waiter.priority, next(self._arrivals), waiter))
+        self._waiting[waiter.priority] += 1
+        self._stats["queued"] += 1
+
+    def _grant(self) -> None:
+        # lock held: hand freed slots to the waiters in priority order
+        while True:
+            waiter = self._first_waiting()
+            if waiter is None or not self._admissible(waiter.priority):
+                return
+            heapq.heappop(self._queue)
+            self._waiting[waiter.priority] -= 1
+            if waiter.wake():
+                waiter.granted = True
+                self.in_flight += 1
+                self._stats["admitted"] += 1
+
+    def _abandon(self, waiter: _Waiter) -> bool:
+        # lock held: False when the slot was granted just as the wait ended, so the caller owns it
+        if waiter.granted:
+            return False
+        waiter.abandoned = True
+        self._waiting[waiter.priority] -= 1
+        return True
+
+    def _timed_out(self, waiter: _Waiter) -> bool:
+        if not self._abandon(waiter):
+            return False
+        self._shed[waiter.priority] += 1
+        self._stats["timeouts"] += 1
+        return True
+
+    def acquire(self, priority: int) -> None:
+        with self._lock:
+            if self._admit(priority):
+                return
+            waiter = _Waiter(priority)
+            self._enqueue(waiter)
+        if waiter.event.wait(self._max_wait(priority)):
+            return
+        with self._lock:
+            if not self._timed_out(waiter):
+                return
+        raise Overloaded(f"Upstream {self.name} overloaded", self.name, SHED_RETRY_AFTER)
+
+    async def aacquire(self, priority: int) -> None:
+        with self._lock:
+            if self._admit(priority):
+                return
+            waiter = _Waiter(priority, asyncio.get_running_loop())
+            self._enqueue(waiter)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), self._max_wait(priority))
+            return
+        except asyncio.TimeoutError:
+            with self._lock:
+                if not self._timed_out(waiter):
+                    return
+        except asyncio.CancelledError:
+            with self._lock:
+                if not self._abandon(waiter):
+                    self._release(None, False)
+            raise
+        raise Overloaded(f"Upstream {self.name} overloaded", self.name, SHED_RETRY_AFTER)
+
+    def release(self, seconds: Optional[float], ok: bool) -> None:
+        # seconds is the call's duration, None when it ended without telling anything about upstream
+        with self._lock:
+            self._release(seconds, ok)
+
+    def _release(self, seconds: Optional[float], ok: bool) -> None:
+        if seconds is not None:
+            self._finished.append(time.monotonic())
+            self._adjust(seconds, ok)
+        self.in_flight -= 1
+        self._grant()
+
+    def _adjust(self, seconds: float, ok: bool) -> None:
+        if not ok:
+            # failures cut the limit at most once per round trip, as the calls in flight failed together
+            now = time.monotonic()
+            if now - self._last_decrease >= seconds:
+                self.limit = max(float(self.minimum), self.limit * 0.9)
+                self._last_decrease = now
+                self._stats["decreases"] += 1
+            return
+        if self._recent is None:
+            self._recent = self._usual = seconds
+        self._recent += (seconds - self._recent) * 0.1
+        self._usual += (seconds - self._usual) * 0.002
+        if self._usual > self._recent * 2:
+            # a slow spell has ended; forget it faster than the average alone would
+            self._usual *= 0.95
+        gradient = max(0.5, min(1.0, self.tolerance * self._usual / self._recent))
+        if gradient == 1.0 and self.in_flight * 2 < self.limit:
+            # the limit is not what holds calls back, so there is nothing to learn from growing it
+            return
+        if gradient < 1.0:
+            self._stats["decreases"] += 1
+        target = self.limit * gradient + math.sqrt(self.limit)
+        self.limit = min(float(self.maximum), max(float(self.minimum), self.limit * 0.8 + target * 0.2))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats: Dict[str, Any] = dict(self._stats)
+            stats["limit"] = round(self.limit, 2)
+            stats["in_flight"] = self.in_flight
+            stats["waiting"] = sum(self._waiting.values())
+            stats["shed"] = {PRIORITY_NAMES[priority]: count for priority, count in self._shed.items()}
+        for name, value in (("recent_ms", self._recent), ("usual_ms", self._usual)):
+            stats[name] = round(value * 1000, 2) if value is not None else None
+        return stats
+
+
+class CircuitBreaker:
+    CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+
+    def __init__(self, name: str, window: int = BREAKER_WINDOW, min_calls: int = BREAKER_MIN_CALLS,
+                 failure_ratio: float = BREAKER_FAILURE_RATIO, cooldown: float = BREAKER_COOLDOWN):
+        self.name = name
+        self.window = window
+        self.min_calls = min_calls
+        self.failure_ratio = failure_ratio
+        self.cooldown = cooldown
+        self.state = self.CLOSED
+        self._lock = threading.Lock()
+        self._outcomes: List[bool] = []
+        self._opened_at = 0.0
+        self._probing = False
+        self._stats = {"opened": 0, "rejected": 0}
+
+    def allow(self) -> None:
+        # raise CircuitOpen unless the call may go upstream; in half-open state only one probe at a time
+        with self._lock:
+            if self.state == self.OPEN:
+                remaining = self._opened_at + self.cooldown - time.monotonic()
+                if remaining > 0:
+                    self._stats["rejected"] += 1
+                    raise CircuitOpen(f"Upstream {self.name} unavailable", self.name, remaining)
+                self.state = self.HALF_OPEN
+            if self.state == self.HALF_OPEN:
+                if self._probing:
+                    self._stats["rejected"] += 1
+                    raise CircuitOpen(f"Upstream {self.name} unavailable", self.name, self.cooldown)
+                self._probing = True
+
+    def record(self, ok: Optional[bool]) -> None:
+        # ok is None for a call that was never sent (shed) or was cancelled, which frees the probe slot only
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self._probing = False
+                if ok is None:
+                    return
+                if ok:
+                    self.state = self.CLOSED
+                    self._outcomes = []
+                else:
+                    self._open()
+            elif self.state == self.CLOSED and ok is not None:
+                self._outcomes.append(ok)
+                del self._outcomes[:-self.window]
+                failures = self._outcomes.count(False)
+                if len(self._outcomes) >= self.min_calls and failures >= len(self._outcomes) * self.failure_ratio:
+                    self._open()
+
+    def _open(self) -> None:
+        self.state = self.OPEN
+        self._opened_at = time.monotonic()
+        self._outcomes = []
+        self._stats["opened"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats: Dict[str, Any] = dict(self._stats)
+            stats["state"] = self.state
+            stats["recent_failures"] = self._outcomes.count(False)
+            stats["recent_calls"] = len(self._outcomes)
+        return stats
+
+
+def _healthy(response: Any) -> bool:
+    # client errors are answers; only server errors and rate limiting count against upstream
+    return response.status_code < 500 and response.status_code != 429
+
+
+class UpstreamGuard:
+    def __init__(self, enabled: bool = UPSTREAM_GUARD_ENABLED):
+        self.enabled = enabled
+        self.limiters = {name: AdaptiveLimiter(name) for name in ENDPOINT_CLASSES}
+        self.breakers = {name: CircuitBreaker(name) for name in ENDPOINT_CLASSES}
+        self._lock = threading.Lock()
+        self._stale = 0
+
+    def send(self, method: str, url: str, call: Callable[[], Any]) -> Any:
+        # blocking: run call() once the breaker and the limiter let it through
+        if not self.enabled:
+            return call()
+        name = endpoint_class(method, url)
+        limiter, breaker = self.limiters[name], self.breakers[name]
+        breaker.allow()
+        try:
+            limiter.acquire(current_priority())
+        except Overloaded:
+            breaker.record(None)
+            raise
+        started = time.perf_counter()
+        ok = False
+        try:
+            response = call()
+            ok = _healthy(response)
+            return response
+        finally:
+            limiter.release(time.perf_counter() - started, ok)
+            breaker.record(ok)
+
+    async def asend(self, method: str, url: str, call: Callable[[], Awaitable[Any]]) -> Any:
+        if not self.enabled:
+            return await call()
+        name = endpoint_class(method, url)
+        limiter, breaker = self.limiters[name], self.breakers[name]
+        breaker.allow()
+        try:
+            await limiter.aacquire(current_priority())
+        except (Overloaded, asyncio.CancelledError):
+            breaker.record(None)
+            raise
+        started = time.perf_counter()
+        outcome: Optional[bool] = False
+        try:
+            response = await call()
+            outcome = _healthy(response)
+            return response
+        except asyncio.CancelledError:
+            # the caller went away; says nothing about upstream
+            outcome = None
+            raise
+        finally:
+            limiter.release(None if outcome is None else time.perf_counter() - started, bool(outcome))
+            breaker.record(outcome)
+
+    def served_stale(self) -> None:
+        with self._lock:
+            self._stale += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stale = self._stale
+        return {
+            "enabled": self.enabled,
+            "served_stale": stale,
+            "limiters": {name: limiter.stats() for name, limiter in self.limiters.items()},
+            "breakers": {name: breaker.stats() for name, breaker in self.breakers.items()},
+        }
+
+
+def retry_after(exc: UpstreamUnavailable) -> str:
+    # whole seconds, at least one
+    return str(max(1, math.ceil(exc.retry_after)))
+
+
+class PriorityMiddleware:
+    # tags each request with the priority its upstream calls are admitted and shed with
+
+    def __init__(self, app: ASGIApp, classify: Callable[[str, str], int]):
+        self.app = app
+        self.classify = classify
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        token = _priority.set(self.classify(scope["method"], scope["path"]))
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _priority.reset(token)
+
+
+upstream_guard = UpstreamGuard()
@@ -0,0 +1,248 @@
+# how responses are written: a faster JSON response class for API_FAST_RESPONSES, gzip/brotli negotiation for
+# large bodies, and ETag validators for conditional GETs. orjson and brotli are optional
+# (pip install orjson brotli); without them the stdlib encoder and gzip are used
+
+from __future__ import annotations
+
+import gzip
+import hashlib
+import json
+import os
+import zlib
+from typing import Any, Dict, List, Optional
+
+from fastapi.responses import JSONResponse, Response
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from . import metrics
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# return already-normalized rows straight from the list/detail routes instead of re-validating them through
+# the response model; upstream values pass through as stored (timestamps keep PostgREST's formatting)
+FAST_RESPONSES: bool = os.environ.get("API_FAST_RESPONSES", "false").lower() in {"1", "true", "yes", "on"}
+# gzip/brotli for responses to clients that accept it ("off" disables); bodies under the minimum size go out as is
+API_COMPRESSION: str = os.environ.get("API_COMPRESSION", "on").lower()
+COMPRESSION_MIN_SIZE: int = int(os.environ.get("API_COMPRESSION_MIN_SIZE", "1024"))
+GZIP_LEVEL: int = int(os.environ.get("API_GZIP_LEVEL", "6"))
+BROTLI_QUALITY: int = int(os.environ.get("API_BROTLI_QUALITY", "4"))
+
+# media types that are already compressed or must reach the client unbuffered
+_UNCOMPRESSED_TYPES = ("text/event-stream", "image/", "video/", "audio/", "application/zip", "application/gzip")
+
+
+class TimedJSONResponse(JSONResponse):
+    # the stdlib encoder, with encoding time reported as the request's serialize span
+
+    def render(self, content: Any) -> bytes:
+        with metrics.span("serialize"):
+            return super().render(content)
+
+
+class FastJSONResponse(TimedJSONResponse):
+    # orjson when available: encodes datetimes natively and returns bytes without an intermediate str
+
+    def render(self, content: Any) -> bytes:
+        if orjson is None:
+            return super().render(content)
+        with metrics.span("serialize"):
+            return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+
+
+def json_response(content: Any, response: Optional[Any] = None, status_code: int = 200) -> FastJSONResponse:
+    # encode content directly, carrying over headers set on the route's injected Response
+    headers = dict(response.headers) if response is not None else None
+    return FastJSONResponse(content, status_code=status_code, headers=headers)
+
+
+def ndjson_lines(items: List[Any]) -> bytes:
+    # one JSON document per line, for streamed exports
+    if orjson is not None:
+        return b"".join(orjson.dumps(item, option=orjson.OPT_NON_STR_KEYS, default=str) + b"\n" for item in items)
+    return "".join(json.dumps(item, default=str) + "\n" for item in items).encode()
+
+
+def sse_event(event: Dict[str, Any]) -> bytes:
+    # one server-sent event: id, event type and the JSON data on a single data line
+    if orjson is not None:
+        data = orjson.dumps(event["data"], option=orjson.OPT_NON_STR_KEYS, default=str)
+    else:
+        data = json.dumps(event["data"], default=str).encode()
+    return b"id: %s\nevent: %s\ndata: %s\n\n" % (event["id"].encode(), event["type"].encode(), data)
+
+
+def etag_for(content: Any) -> str:
+    # strong validator from a digest of the content; key order does not matter
+    if orjson is not None:
+        encoded = orjson.dumps(content, option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS, default=str)
+    else:
+        encoded = json.dumps(content, sort_keys=True, separators=(",", ":"), default=str).encode()
+    return f'"{hashlib.blake2b(encoded, digest_size=16).hexdigest()}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    # If-None-Match uses weak comparison, so W/ tags added by compression still match
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    return any(tag.strip().removeprefix("W/") == opaque for tag in if_none_match.split(","))
+
+
+def not_modified(etag: str, cache_control: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": cache_control})
+
+
+def _accepted_encodings(header: str) -> Dict[str, float]:
+    # "gzip, br;q=0.8, *;q=0" -> {"gzip": 1.0, "br": 0.8, "*": 0.0}
+    accepted: Dict[str, float] = {}
+    for part in header.split(","):
+        name, _, params = part.strip().partition(";")
+        if not name:
+            continue
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+    return accepted
+
+
+def negotiate_encoding(header: str) -> Optional[str]:
+    # prefer brotli (smaller JSON at comparable cost) when the module is installed, then gzip
+    accepted = _accepted_encodings(header)
+    wildcard = accepted.get("*", 0.0)
+    offers = ["br", "gzip"] if brotli is not None else ["gzip"]
+    ranked = [(accepted.get(name, wildcard), -index, name) for index, name in enumerate(offers)]
+    quality, _, name = max(ranked)
+    return name if quality > 0 else None
+
+
+class _Compressor:
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == "br":
+            self._brotli = brotli.Compressor(quality=BROTLI_QUALITY)
+        else:
+            self._gzip = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def chunk(self, data: bytes) -> bytes:
+        # compress and flush so a streamed chunk reaches the client without waiting for the next one
+        if self.encoding == "br":
+            return self._brotli.process(data) + self._brotli.flush()
+        return self._gzip.compress(data) + self._gzip.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        if self.encoding == "br":
+            return self._brotli.finish()
+        return self._gzip.flush(zlib.Z_FINISH)
+
+
+def compress(data: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+class CompressionMiddleware:
+    # pure ASGI so streamed responses are compressed chunk by chunk instead of being buffered
+
+    def __init__(self, app: ASGIApp, minimum_size: int = COMPRESSION_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        await self.app(scope, receive, _CompressingSend(send, encoding, self.minimum_size))
+
+
+class _CompressingSend:
+    def __init__(self, send: Send, encoding: str, minimum_size: int):
+        self.send = send
+        self.encoding = encoding
+        self.minimum_size = minimum_size
+        self.start: Optional[Message] = None
+        self.compressor: Optional[_Compressor] = None
+        self.passthrough = False
+
+    def _skip(self, headers: MutableHeaders) -> bool:
+        content_type = headers.get("content-type", "")
+        return "content-encoding" in headers or any(content_type.startswith(kind) for kind in _UNCOMPRESSED_TYPES)
+
+    def _encoded_start(self, start: Message, headers: MutableHeaders, length: Optional[int]) -> Message:
+        headers["Content-Encoding"] = self.encoding
+        # the encoded bytes differ from the identity body, so a strong validator becomes weak
+        etag = headers.get("etag")
+        if etag and not etag.startswith("W/"):
+            headers["ETag"] = "W/" + etag
+        headers.add_vary_header("Accept-Encoding")
+        if length is None:
+            del headers["content-length"]
+        else:
+            headers["Content-Length"] = str(length)
+        return start
+
+    async def __call__(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            self.start = message
+            return
+        if message["type"] != "http.response.body" or self.passthrough:
+            await self.send(message)
+            return
+
+        body: bytes = message.get("body", b"")
+        more_body: bool = message.get("more_body", False)
+        if self.compressor is None:
+            # first body message: decide from the headers and, for a single-message body, its size
+            start = self.start
+            headers = MutableHeaders(raw=start["headers"])
+            if self._skip(headers) or (not more_body and len(body) < self.minimum_size):
+                self.passthrough = True
+                headers.add_vary_header("Accept-Encoding")
+                await self.send(start)
+                await self.send(message)
+                return
+            if not more_body:
+                compressed = compress(body, self.encoding)
+                await self.send(self._encoded_start(start, headers, len(compressed)))
+                await self.send({"type": "http.response.body", "body": compressed, "more_body": False})
+                return
+            self.compressor = _Compressor(self.encoding)
+            await self.send(self._encoded_start(start, headers, None))
+
+        payload = self.compressor.chunk(body) if body else b""
+        if not more_body:
+            payload += self.compressor.finish()
+        await self.send({"type": "http.response.body", "body": payload, "more_body": more_body})
+
+
+def compression_enabled() -> bool:
+    return API_COMPRESSION not in {"off", "false", "0", "no"}
+
+
+def encoding_stats() -> Dict[str, Any]:
+    return {
+        "fast_responses": FAST_RESPONSES,
+        "json_encoder": "orjson" if orjson is not None else "json",
+        "compression": (["br", "gzip"] if brotli is not None else ["gzip"]) if compression_enabled() else [],
+        "compression_min_size": COMPRESSION_MIN_SIZE,
+    }
@@ -1,5 +1,5 @@
 from datetime import datetime
-from typing import Optional, Literal 
+from typing import List, Optional, Literal, Union
 
 from pydantic import BaseModel, Field
 
@@ -50,6 +50,49 @@ class Listing(ListingBase):
         orm_mode = True
 
 
+class PartialListing(BaseModel):
+    # a listing trimmed by fields=; only the requested keys are present in responses
+
+    id: Optional[str] = None
+    seller_id: Optional[str] = None
+    name: Optional[str] = None
+    price: Optional[float] = None
+    quantity: Optional[int] = None
+    sold: Optional[bool] = None
+    category: Optional[CategorySlug] = None
+    created_at: Optional[datetime] = None
+
+
+class CategorySummary(BaseModel):
+    # available listings of one category: how many, their price range and the newest few
+
+    category: str
+    available: int
+    min_price: Optional[float] = None
+    max_price: Optional[float] = None
+    newest: List[Listing] = []
+
+
+class ListingsSummary(BaseModel):
+    available: int
+    categories: List[CategorySummary]
+
+
+class ListingBatchUpdate(ListingUpdate):
+    # one entry of PATCH /listings/batch: the listing to change plus the fields to change
+
+    id: str = Field(..., example="6c73f63a-4f0f-4a84-9620-3aafc4a5d1b5")
+
+
+class ListingBatchResult(BaseModel):
+    # outcome of one batch entry, reported at the entry's position in the request
+
+    index: int
+    status: int = Field(..., description="HTTP status the entry would have had as a single request")
+    listing: Optional[Listing] = None
+    error: Optional[str] = None
+
+
 class OrderCreate(BaseModel):
     # payload required to create a new transaction
 
@@ -72,6 +115,18 @@ class Order(BaseModel):
         orm_mode = True
 
 
+class PartialOrder(BaseModel):
+    # an order trimmed by fields= and expand=; only the requested keys are present in responses
+
+    id: Optional[str] = None
+    listing_id: Optional[str] = None
+    buyer_id: Optional[str] = None
+    seller_id: Optional[str] = None
+    payment_method: Optional[str] = None
+    created_at: Optional[datetime] = None
+    product: Optional[PartialListing] = None
+
+
 class OrderUpdate(BaseModel):
     payment_method: Optional[str] = Field(None, example="cash")
 
@@ -86,3 +141,29 @@ class UserProfile(BaseModel):
 
     class Config:
         orm_mode = True
+
+
+class ListingDetail(Listing):
+    # the item page in one response: the listing plus its seller's profile (null when the user is gone)
+
+    seller: Optional[UserProfile] = None
+
+
+class ListingPage(BaseModel):
+    items: List[Listing]
+    next_cursor: Optional[str] = None
+    total: Optional[int] = None
+
+
+class OrderPage(BaseModel):
+    items: Union[List[Order], List[PartialOrder]]
+    next_cursor: Optional[str] = None
+    total: Optional[int] = None
+
+
+class Dashboard(BaseModel):
+    # the seller dashboard in one response; sections not asked for with include= are left out
+
+    listings: Optional[ListingPage] = None
+    purchases: Optional[OrderPage] = None
+    sales: Optional[OrderPage] = None
@@ -0,0 +1,312 @@
+# in-process fuzzy search for listings: inverted token index + character trigram postings over name/category/description
+
+from __future__ import annotations
+
+import asyncio
+import os
+import re
+import threading
+import time
+from collections import Counter
+from difflib import SequenceMatcher
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+MATCH_THRESHOLD: float = 0.35
+SEARCH_FIELDS: Tuple[str, ...] = ("name", "category", "description")
+SEARCH_INDEX_TTL: float = float(os.environ.get("SEARCH_INDEX_TTL", "300"))
+SEARCH_MAX_TOKEN_CANDIDATES: int = int(os.environ.get("SEARCH_MAX_TOKEN_CANDIDATES", "256"))
+SEARCH_MAX_RESULTS: int = int(os.environ.get("SEARCH_MAX_RESULTS", "200"))
+# tokens up to this length also get one-deletion postings: short misspellings and transpositions ("lmap",
+# "sfoa") share no trigram with the word they mean
+SEARCH_FUZZY_TOKEN_LENGTH: int = int(os.environ.get("SEARCH_FUZZY_TOKEN_LENGTH", "8"))
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(value: str) -> List[str]:
+    return _TOKEN_RE.findall(value.lower())
+
+
+def trigrams(token: str) -> Set[str]:
+    # tokens are padded so one and two character tokens still produce postings
+    padded = f" {token} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+def deletions(token: str) -> Set[str]:
+    # the token and every string one character shorter: two tokens within one edit or transposition of each
+    # other share at least one of these
+    variants = {token[:i] + token[i + 1 :] for i in range(len(token))}
+    variants.add(token)
+    return variants
+
+
+def _fields(listing: Dict[str, Any]) -> Tuple[str, ...]:
+    return tuple(str(listing.get(field) or "").lower() for field in SEARCH_FIELDS)
+
+
+def _ratio(term: str, value: str, floor: float) -> float:
+    # SequenceMatcher ratio, skipped when the cheap upper bounds cannot beat floor
+    if 2.0 * min(len(term), len(value)) / (len(term) + len(value)) <= floor:
+        return 0.0
+    matcher = SequenceMatcher(None, term, value)
+    if matcher.real_quick_ratio() <= floor or matcher.quick_ratio() <= floor:
+        return 0.0
+    return matcher.ratio()
+
+
+def score_listing(term: str, listing: Dict[str, Any]) -> float:
+    # reference scorer: best match of the term against every field and every token of the listing
+    scores = []
+    for field in _fields(listing):
+        if not field:
+            continue
+        if term in field:
+            scores.append(1.0)
+            continue
+        scores.append(SequenceMatcher(None, term, field).ratio())
+        for token in tokenize(field):
+            if term in token:
+                scores.append(0.95)
+            else:
+                scores.append(SequenceMatcher(None, term, token).ratio())
+    return max(scores) if scores else 0.0
+
+
+class SearchIndex:
+    # listings are kept in memory with token -> listing ids, trigram -> tokens and (for short tokens)
+    # deletion -> tokens postings. queries generate candidate tokens from shared trigrams or deletions and
+    # score each distinct token once, so the work per query follows the vocabulary and the result budget,
+    # not the catalog size.
+
+    def __init__(
+        self,
+        ttl: float = SEARCH_INDEX_TTL,
+        max_token_candidates: int = SEARCH_MAX_TOKEN_CANDIDATES,
+        max_results: int = SEARCH_MAX_RESULTS,
+        fuzzy_token_length: int = SEARCH_FUZZY_TOKEN_LENGTH,
+    ):
+        self.ttl = ttl
+        self.max_token_candidates = max_token_candidates
+        self.max_results = max_results
+        self.fuzzy_token_length = fuzzy_token_length
+        self._lock = threading.RLock()
+        self._refresh_lock = threading.Lock()
+        self._async_refresh_lock: Optional[asyncio.Lock] = None
+        self._docs: Dict[str, Dict[str, Any]] = {}
+        self._doc_fields: Dict[str, Tuple[str, ...]] = {}
+        self._doc_tokens: Dict[str, Set[str]] = {}
+        self._doc_seq: Dict[str, int] = {}
+        self._token_docs: Dict[str, Set[str]] = {}
+        self._gram_tokens: Dict[str, Set[str]] = {}
+        self._deletion_tokens: Dict[str, Set[str]] = {}
+        self._seq = 0
+        self._loaded_at: Optional[float] = None
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded_at is not None
+
+    def is_stale(self) -> bool:
+        if self._loaded_at is None:
+            return True
+        return self.ttl > 0 and time.monotonic() - self._loaded_at > self.ttl
+
+    def rebuild(self, listings: Iterable[Dict[str, Any]]) -> None:
+        # replace the whole index, built off-lock so searches keep using the old data meanwhile
+        fresh = SearchIndex(self.ttl, self.max_token_candidates, self.max_results, self.fuzzy_token_length)
+        for listing in listings:
+            fresh._add(listing)
+        with self._lock:
+            self._docs = fresh._docs
+            self._doc_fields = fresh._doc_fields
+            self._doc_tokens = fresh._doc_tokens
+            self._doc_seq = fresh._doc_seq
+            self._token_docs = fresh._token_docs
+            self._gram_tokens = fresh._gram_tokens
+            self._deletion_tokens = fresh._deletion_tokens
+            self._seq = fresh._seq
+            self._loaded_at = time.monotonic()
+
+    def refresh_if_stale(self, loader: Callable[[], Iterable[Dict[str, Any]]]) -> None:
+        # reload from the data layer when stale; only one caller rebuilds while the rest keep the old snapshot
+        if not self.is_stale():
+            return
+        if not self._refresh_lock.acquire(blocking=not self.loaded):
+            return
+        try:
+            if self.is_stale():
+                self.rebuild(loader())
+        finally:
+            self._refresh_lock.release()
+
+    async def refresh_if_stale_async(self, loader: Callable[[], Awaitable[Iterable[Dict[str, Any]]]]) -> None:
+        # async variant for the event loop: the fetch is awaited and the CPU-bound rebuild runs in a thread
+        if not self.is_stale():
+            return
+        if self._async_refresh_lock is None:
+            self._async_refresh_lock = asyncio.Lock()
+        if self._async_refresh_lock.locked() and self.loaded:
+            return
+        async with self._async_refresh_lock:
+            if self.is_stale():
+                listings = await loader()
+                await asyncio.to_thread(self.rebuild, listings)
+
+    def upsert(self, listing: Optional[Dict[str, Any]]) -> None:
+        if not listing or not listing.get("id"):
+            return
+        with self._lock:
+            self._add(listing)
+
+    def remove(self, listing_id: str) -> None:
+        with self._lock:
+            self._remove(str(listing_id))
+
+    def get(self, listing_id: str) -> Optional[Dict[str, Any]]:
+        return self._docs.get(str(listing_id))
+
+    def _add(self, listing: Dict[str, Any]) -> None:
+        doc_id = str(listing["id"])
+        seq = self._doc_seq.get(doc_id)
+        self._remove(doc_id)
+        if seq is None:
+            self._seq += 1
+            seq = self._seq
+        fields = _fields(listing)
+        tokens = {token for field in fields for token in tokenize(field)}
+        self._docs[doc_id] = listing
+        self._doc_fields[doc_id] = fields
+        self._doc_tokens[doc_id] = tokens
+        self._doc_seq[doc_id] = seq
+        for token in tokens:
+            postings = self._token_docs.get(token)
+            if postings is None:
+                postings = self._token_docs[token] = set()
+                for gram in trigrams(token):
+                    self._gram_tokens.setdefault(gram, set()).add(token)
+                for variant in self._deletions(token):
+                    self._deletion_tokens.setdefault(variant, set()).add(token)
+            postings.add(doc_id)
+
+    def _remove(self, doc_id: str) -> None:
+        if doc_id not in self._docs:
+            return
+        del self._docs[doc_id]
+        del self._doc_fields[doc_id]
+        del self._doc_seq[doc_id]
+        for token in self._doc_tokens.pop(doc_id):
+            postings = self._token_docs[token]
+            postings.discard(doc_id)
+            if postings:
+                continue
+            del self._token_docs[token]
+            self._unlink(self._gram_tokens, trigrams(token), token)
+            self._unlink(self._deletion_tokens, self._deletions(token), token)
+
+    @staticmethod
+    def _unlink(postings: Dict[str, Set[str]], keys: Iterable[str], token: str) -> None:
+        for key in keys:
+            tokens = postings.get(key)
+            if tokens is None:
+                continue
+            tokens.discard(token)
+            if not tokens:
+                del postings[key]
+
+    def _deletions(self, token: str) -> Set[str]:
+        return deletions(token) if len(token) <= self.fuzzy_token_length else set()
+
+    def _token_scores(self, term: str) -> Dict[str, float]:
+        # score distinct vocabulary tokens that share at least one trigram with the query, plus short tokens
+        # within one edit or transposition of a query word
+        overlap: Counter = Counter()
+        near: Set[str] = set()
+        for query_token in tokenize(term):
+            for gram in trigrams(query_token):
+                for token in self._gram_tokens.get(gram, ()):
+                    overlap[token] += 1
+            for variant in self._deletions(query_token):
+                near.update(self._deletion_tokens.get(variant, ()))
+        candidates = [token for token, _ in overlap.most_common(self.max_token_candidates)]
+        candidates.extend(near.difference(candidates))
+        scores: Dict[str, float] = {}
+        for token in candidates:
+            if term in token:
+                scores[token] = 1.0
+                continue
+            score = _ratio(term, token, MATCH_THRESHOLD - 1e-9)
+            if score >= MATCH_THRESHOLD:
+                scores[token] = score
+        return scores
+
+    def search(
+        self,
+        query: str,
+        predicate: Optional[Callable[[Dict[str, Any]], bool]] = None,
+        limit: Optional[int] = None,
+    ) -> List[Tuple[float, Dict[str, Any]]]:
+        # return up to limit (score, listing) pairs at or above MATCH_THRESHOLD, best first.
+        # candidates are taken strongest first (verbatim phrase, every query word, then token
+        # score tiers) until twice the budget is reached, and only those are rescored on whole fields.
+        term = query.strip().lower()
+        if not term:
+            return []
+        budget = limit or self.max_results
+        cap = 2 * budget
+        with self._lock:
+            token_scores = self._token_scores(term)
+            chosen: Dict[str, float] = {}
+
+            def _take(doc_ids: Iterable[str], score_of: Callable[[str], float]) -> bool:
+                fresh = [
+                    doc_id
+                    for doc_id in doc_ids
+                    if doc_id not in chosen and (predicate is None or predicate(self._docs[doc_id]))
+                ]
+                if len(chosen) + len(fresh) > cap:
+                    fresh.sort(key=self._doc_seq.__getitem__)
+                    fresh = fresh[: cap - len(chosen)]
+                for doc_id in fresh:
+                    chosen[doc_id] = score_of(doc_id)
+                return len(chosen) >= cap
+
+            full = False
+            query_tokens = set(tokenize(term))
+            if len(query_tokens) > 1:
+                postings = sorted((self._token_docs.get(token, set()) for token in query_tokens), key=len)
+                every_word = set.intersection(*postings) if all(postings) else set()
+                phrase = [
+                    doc_id
+                    for doc_id in every_word
+                    if any(term in field for field in self._doc_fields[doc_id])
+                ]
+                best_word = max(token_scores.get(token, 0.0) for token in query_tokens)
+                full = _take(phrase, lambda _: 1.0) or _take(every_word, lambda _: best_word)
+
+            for token, score in sorted(token_scores.items(), key=lambda pair: -pair[1]):
+                if full:
+                    break
+                full = _take(self._token_docs.get(token, ()), lambda _: score)
+
+            scored: List[Tuple[float, int, Dict[str, Any]]] = []
+            field_scores: Dict[str, float] = {}
+            for doc_id, score in chosen.items():
+                if score < 1.0:
+                    for field in self._doc_fields[doc_id]:
+                        if not field:
+                            continue
+                        field_score = field_scores.get(field)
+                        if field_score is None:
+                            field_score = field_scores[field] = _ratio(term, field, MATCH_THRESHOLD)
+                        score = max(score, field_score)
+                scored.append((score, self._doc_seq[doc_id], self._docs[doc_id]))
+
+        scored.sort(key=lambda entry: (-entry[0], entry[1]))
+        return [(score, listing) for score, _, listing in scored[:budget]]
+
+
+listing_index = SearchIndex()
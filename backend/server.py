@@ -0,0 +1,225 @@
+# production launcher: python -m backend.server (the Dockerfile's command). runs WEB_CONCURRENCY uvicorn
+# workers (default: the CPUs this container may use, or one while Idempotency-Key records are kept in process)
+# on one shared socket, with uvloop and httptools when
+# installed (pip install uvloop httptools). the configuration is checked once before any worker starts, and
+# each worker sizes its threadpools and opens upstream connections before it takes traffic. on SIGTERM a
+# worker answers /health with 503 for SERVER_DRAIN_DELAY seconds while still serving, then stops accepting,
+# ends its event streams and waits up to SERVER_GRACEFUL_TIMEOUT seconds for requests in flight.
+# `uvicorn backend.main:app --reload` remains the way to run it during development
+
+from __future__ import annotations
+
+import asyncio
+import importlib.util
+import logging
+import math
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import FrameType
+from typing import Any, List, Optional
+
+import anyio.to_thread
+import uvicorn
+from uvicorn.supervisors.multiprocess import Multiprocess
+
+from . import async_database, auth, database, transport
+from .events import event_bus
+from .idempotency import IDEMPOTENCY_BACKEND, idempotent_requests
+
+HOST: str = os.environ.get("HOST", "0.0.0.0")
+PORT: int = int(os.environ.get("PORT", "8000"))
+# worker processes; 0 = one per usable CPU. every worker has its own caches, limiters and event stream, and
+# several workers need a shared IDEMPOTENCY_BACKEND
+WEB_CONCURRENCY: int = int(os.environ.get("WEB_CONCURRENCY", "0"))
+# auto picks uvloop / httptools when installed, else asyncio / h11
+SERVER_LOOP: str = os.environ.get("SERVER_LOOP", "auto")
+SERVER_HTTP: str = os.environ.get("SERVER_HTTP", "auto")
+# threads for sync dependencies and handlers (Starlette's threadpool) and asyncio.to_thread work such as search
+# index rebuilds. blocking data-layer calls each hold one of SUPABASE_POOL_SIZE connections, so more threads than
+# that would only queue on the pool
+SERVER_THREADPOOL_SIZE: int = int(os.environ.get("SERVER_THREADPOOL_SIZE", str(transport.SUPABASE_POOL_SIZE)))
+# keep-alive connections each worker opens to Supabase at startup, and how long it waits for them
+SERVER_PREWARM_CONNECTIONS: int = int(os.environ.get("SERVER_PREWARM_CONNECTIONS", "8"))
+SERVER_PREWARM_TIMEOUT: float = float(os.environ.get("SERVER_PREWARM_TIMEOUT", "5"))
+# seconds between SIGTERM and closing the listening socket, for load balancers to see /health fail
+SERVER_DRAIN_DELAY: float = float(os.environ.get("SERVER_DRAIN_DELAY", "0"))
+# seconds to wait for requests in flight once the socket is closed before cancelling them
+SERVER_GRACEFUL_TIMEOUT: int = int(os.environ.get("SERVER_GRACEFUL_TIMEOUT", "20"))
+# idle keep-alive connections from clients are closed after this many seconds; behind a load balancer set it
+# above the balancer's idle timeout so it never reuses a connection the worker is closing
+SERVER_KEEPALIVE_TIMEOUT: int = int(os.environ.get("SERVER_KEEPALIVE_TIMEOUT", "5"))
+SERVER_ACCESS_LOG: bool = os.environ.get("SERVER_ACCESS_LOG", "true").lower() == "true"
+
+logger = logging.getLogger("uvicorn.error")
+
+
+def available_cpus() -> int:
+    # CPUs this process may run on, capped by a cgroup CPU quota: in a container os.cpu_count() is the host's
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    for quota_file, period_file in (
+        ("/sys/fs/cgroup/cpu.max", None),
+        ("/sys/fs/cgroup/cpu/cpu.cfs_quota_us", "/sys/fs/cgroup/cpu/cpu.cfs_period_us"),
+    ):
+        try:
+            with open(quota_file) as handle:
+                fields = handle.read().split()
+            if period_file:
+                with open(period_file) as handle:
+                    fields.append(handle.read().strip())
+            quota, period = fields[0], fields[1]
+        except (OSError, IndexError):
+            continue
+        if quota not in ("max", "-1"):
+            cpus = min(cpus, max(1, math.ceil(int(quota) / int(period))))
+        break
+    return cpus
+
+
+def _choose(setting: str, fast: str, fallback: str) -> str:
+    if setting != "auto":
+        return setting
+    return fast if importlib.util.find_spec(fast) is not None else fallback
+
+
+def worker_count() -> int:
+    # WEB_CONCURRENCY, else one per usable CPU. a retried POST must find its Idempotency-Key record on whichever
+    # worker it lands, so with records kept in process the automatic count is one worker
+    if WEB_CONCURRENCY:
+        return WEB_CONCURRENCY
+    return available_cpus() if idempotent_requests.records.shared else 1
+
+
+def config_errors() -> List[str]:
+    # settings that would otherwise only fail on the first request that needs them
+    errors = database.config_errors()
+    try:
+        auth.jwt_secret()
+    except RuntimeError as exc:
+        errors.append(str(exc))
+    if WEB_CONCURRENCY < 0:
+        errors.append("WEB_CONCURRENCY must be 0 (one worker per CPU) or more")
+    if WEB_CONCURRENCY > 1 and not idempotent_requests.records.shared:
+        errors.append(
+            f"IDEMPOTENCY_BACKEND={IDEMPOTENCY_BACKEND} keeps Idempotency-Key records inside each worker, so a retry "
+            f"on another of the {WEB_CONCURRENCY} workers would run again; set REDIS_URL (IDEMPOTENCY_BACKEND=redis) "
+            "or WEB_CONCURRENCY=1"
+        )
+    for name, value in (
+        ("SERVER_THREADPOOL_SIZE", SERVER_THREADPOOL_SIZE),
+        ("SUPABASE_POOL_SIZE", transport.SUPABASE_POOL_SIZE),
+        ("SUPABASE_ASYNC_POOL_SIZE", transport.SUPABASE_ASYNC_POOL_SIZE),
+    ):
+        if value < 1:
+            errors.append(f"{name} must be at least 1")
+    return errors
+
+
+async def _start_worker() -> None:
+    # runs in each worker before it accepts connections
+    anyio.to_thread.current_default_thread_limiter().total_tokens = SERVER_THREADPOOL_SIZE
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(SERVER_THREADPOOL_SIZE, thread_name_prefix="umarket")
+    )
+    started = time.perf_counter()
+    connections = min(SERVER_PREWARM_CONNECTIONS, transport.SUPABASE_ASYNC_POOL_SIZE)
+    opened = await async_database.warm(connections, SERVER_PREWARM_TIMEOUT)
+    if opened < connections and database.storage.name == "supabase":
+        logger.warning("Worker [%d] opened %d of %d upstream connections", os.getpid(), opened, connections)
+    logger.info("Worker [%d] ready in %.0f ms", os.getpid(), (time.perf_counter() - started) * 1000)
+
+
+def create_app() -> Any:
+    # the app as a worker serves it (uvicorn factory): main.app plus the startup above. imported here rather
+    # than at the top so the supervisor, which only checks the configuration, starts without loading it
+    from .main import app
+
+    app.add_event_handler("startup", _start_worker)
+    return app
+
+
+def _set_draining() -> None:
+    from .main import app
+
+    app.state.draining = True
+
+
+class Server(uvicorn.Server):
+    # the first SIGTERM/SIGINT starts draining: /health fails for SERVER_DRAIN_DELAY seconds, then the socket
+    # is closed, event streams are ended and in-flight requests get SERVER_GRACEFUL_TIMEOUT seconds to finish.
+    # a second signal skips what is left of the delay
+    def __init__(self, config: uvicorn.Config) -> None:
+        super().__init__(config)
+        self._drain: Optional[asyncio.TimerHandle] = None
+
+    def handle_exit(self, sig: int, frame: Optional[FrameType]) -> None:
+        if self._drain is None and SERVER_DRAIN_DELAY > 0 and not self.should_exit:
+            _set_draining()
+            logger.info("Draining for %.0f s before shutting down", SERVER_DRAIN_DELAY)
+            self._drain = asyncio.get_event_loop().call_later(SERVER_DRAIN_DELAY, self._shut_down, sig, frame)
+            return
+        if self._drain is not None:
+            self._drain.cancel()
+        self._shut_down(sig, frame)
+
+    def _shut_down(self, sig: int, frame: Optional[FrameType]) -> None:
+        _set_draining()
+        event_bus.close()
+        super().handle_exit(sig, frame)
+
+
+class Supervisor(Multiprocess):
+    # uvicorn's supervisor terminates and joins workers one at a time, so their drain delays and graceful
+    # timeouts would add up; signal them all, then wait for them all
+    def shutdown(self) -> None:
+        for process in self.processes:
+            process.terminate()
+        for process in self.processes:
+            process.join()
+        logger.info("Stopping parent process [%d]", self.pid)
+
+
+def build_config(workers: Optional[int] = None) -> uvicorn.Config:
+    return uvicorn.Config(
+        "backend.server:create_app",
+        factory=True,
+        host=HOST,
+        port=PORT,
+        workers=workers or worker_count(),
+        loop=_choose(SERVER_LOOP, "uvloop", "asyncio"),
+        http=_choose(SERVER_HTTP, "httptools", "h11"),
+        lifespan="on",
+        timeout_graceful_shutdown=SERVER_GRACEFUL_TIMEOUT,
+        timeout_keep_alive=SERVER_KEEPALIVE_TIMEOUT,
+        access_log=SERVER_ACCESS_LOG,
+    )
+
+
+def main() -> None:
+    config = build_config()
+    errors = config_errors()
+    if errors:
+        for error in errors:
+            logger.error("Invalid configuration: %s", error)
+        sys.exit(2)
+    if not WEB_CONCURRENCY and config.workers < available_cpus():
+        logger.warning(
+            "IDEMPOTENCY_BACKEND=%s keeps Idempotency-Key records in process, so starting 1 worker instead of %d; "
+            "set REDIS_URL (IDEMPOTENCY_BACKEND=redis) to run one per CPU", IDEMPOTENCY_BACKEND, available_cpus(),
+        )
+    logger.info("Starting %d worker(s), loop=%s http=%s", config.workers, config.loop, config.http)
+    # workers inherit the resolved count, so in-process state knows whether it is the only copy (cache.WORKERS)
+    os.environ["WEB_CONCURRENCY"] = str(config.workers)
+    server = Server(config)
+    if config.workers > 1:
+        Supervisor(config, target=server.run, sockets=[config.bind_socket()]).run()
+    else:
+        server.run()
+
+
+if __name__ == "__main__":
+    main()
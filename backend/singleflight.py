@@ -0,0 +1,125 @@
+# request coalescing for upstream reads: concurrent identical calls (same method, table, normalized params
+# and headers) share one in-flight call and every waiter gets its result or its error. works for threads
+# (the blocking database functions) and coroutines (async_database). a read never joins a flight that
+# started before a write from this process finished, so a caller cannot see data older than its own write
+#
+# SINGLEFLIGHT_ENABLED=false turns it off
+
+from __future__ import annotations
+
+import asyncio
+import os
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+from . import metrics
+
+SINGLEFLIGHT_ENABLED: bool = os.environ.get("SINGLEFLIGHT_ENABLED", "true").lower() in {"1", "true", "yes", "on"}
+
+COALESCED_METHODS = frozenset({"GET", "HEAD"})
+
+
+class _Flight:
+    __slots__ = ("done", "result", "error", "waiters")
+
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    def __init__(self, enabled: bool = SINGLEFLIGHT_ENABLED):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._flights: Dict[Hashable, _Flight] = {}
+        self._tasks: Dict[Hashable, "asyncio.Future[Any]"] = {}
+        # bumped when a write finishes; part of every key so later reads start a fresh flight
+        self._epoch = 0
+        self._stats = {"leaders": 0, "coalesced": 0, "shared_errors": 0}
+
+    def key(self, method: str, url: str, params: Optional[Dict[str, Any]],
+            headers: Optional[Dict[str, str]]) -> Optional[Tuple[Any, ...]]:
+        # None for calls that must not be shared: writes, RPCs and anything when disabled
+        if not self.enabled or method not in COALESCED_METHODS:
+            return None
+        return (
+            self._epoch,
+            method,
+            url,
+            tuple(sorted((name, str(value)) for name, value in (params or {}).items())),
+            tuple(sorted((headers or {}).items())),
+        )
+
+    def written(self) -> None:
+        with self._lock:
+            self._epoch += 1
+
+    def do(self, key: Optional[Hashable], call: Callable[[], Any]) -> Any:
+        # blocking: the first caller runs call(), the rest wait on its result
+        if key is None:
+            return call()
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                self._stats["leaders"] += 1
+            else:
+                flight.waiters += 1
+                self._stats["coalesced"] += 1
+        if not leader:
+            with metrics.span("coalesced"):
+                flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+        try:
+            flight.result = call()
+            return flight.result
+        except BaseException as exc:
+            flight.error = exc
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+                if flight.error is not None:
+                    self._stats["shared_errors"] += flight.waiters
+            flight.done.set()
+
+    async def ado(self, key: Optional[Hashable], call: Callable[[], Awaitable[Any]]) -> Any:
+        # async: the first caller's call runs as a task the others await; shield keeps a cancelled
+        # waiter (the first one included) from cancelling the call the rest are waiting on
+        if key is None:
+            return await call()
+        loop = asyncio.get_running_loop()
+        key = (loop, key)
+        task = self._tasks.get(key)
+        if task is None:
+            task = self._tasks[key] = asyncio.ensure_future(call())
+            task.add_done_callback(lambda _: self._tasks.pop(key, None))
+            self._count("leaders")
+            return await asyncio.shield(task)
+        self._count("coalesced")
+        try:
+            with metrics.span("coalesced"):
+                return await asyncio.shield(task)
+        except Exception:
+            if task.done():
+                self._count("shared_errors")
+            raise
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._stats[name] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats: Dict[str, Any] = dict(self._stats)
+            stats["in_flight"] = len(self._flights) + len(self._tasks)
+        stats["enabled"] = self.enabled
+        return stats
+
+
+upstream_reads = SingleFlight()
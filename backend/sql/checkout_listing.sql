@@ -0,0 +1,49 @@
+-- one-round-trip checkout for POST /orders. run this in the Supabase SQL editor, then set
+-- SUPABASE_CHECKOUT_RPC=checkout_listing for the backend. assumes the default "Product" and "Transactions"
+-- tables; adjust the names if SUPABASE_PRODUCTS_TABLE / SUPABASE_TRANSACTIONS_TABLE are overridden.
+--
+-- the stock check, decrement and order insert run in one transaction, and the conditional UPDATE takes the
+-- row lock, so concurrent buyers can never take more units than exist. refusals are raised as P0001 with
+-- the reason as the message (not_found, own_listing, sold, out_of_stock), which database._checkout_rpc maps
+-- back to the API's error responses. the result is the order row with its product embedded.
+
+create or replace function public.checkout_listing(
+    p_listing_id "Product".prod_id%type,
+    p_buyer_id "Transactions".buyer_id%type,
+    p_payment_method text default null
+) returns json
+language plpgsql
+as $$
+declare
+    v_product "Product"%rowtype;
+    v_order "Transactions"%rowtype;
+begin
+    update "Product"
+       set quantity = greatest(coalesce(quantity, 1) - 1, 0),
+           sold = coalesce(quantity, 1) <= 1
+     where prod_id = p_listing_id
+       and not coalesce(sold, false)
+       and coalesce(quantity, 1) > 0
+       and seller_id is distinct from p_buyer_id
+    returning * into v_product;
+
+    if not found then
+        select * into v_product from "Product" where prod_id = p_listing_id;
+        if not found then
+            raise exception 'not_found';
+        elsif v_product.seller_id = p_buyer_id then
+            raise exception 'own_listing';
+        elsif v_product.sold then
+            raise exception 'sold';
+        else
+            raise exception 'out_of_stock';
+        end if;
+    end if;
+
+    insert into "Transactions" (prod_id, buyer_id, payment_method)
+    values (p_listing_id, p_buyer_id, p_payment_method)
+    returning * into v_order;
+
+    return (to_jsonb(v_order) || jsonb_build_object('product', to_jsonb(v_product)))::json;
+end;
+$$;
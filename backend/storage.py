@@ -0,0 +1,724 @@
+# where database operations run. every operation in database.py yields backend-neutral storage Requests (select,
+# count, insert, update, delete, rpc or user, with filters in the database filter spec) and a storage backend
+# answers them: STORAGE_BACKEND=supabase (the default) translates each one into a PostgREST call to SUPABASE_URL
+# sent through the pooled transport, STORAGE_BACKEND=sqlite runs it as SQL against an embedded SQLite file
+# (SQLITE_PATH) for tests, local development and offline deployments. both answer with responses shaped like
+# PostgREST's: status_code, json() and raise_for_status(), a Content-Range total on counts, and
+# {"code", "message"} error bodies
+
+from __future__ import annotations
+
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from . import metrics, transport
+from .resilience import upstream_guard
+from .singleflight import upstream_reads
+from .transport import Call
+
+STORAGE_BACKEND: str = os.environ.get("STORAGE_BACKEND", "supabase").lower()
+SQLITE_PATH: str = os.environ.get("SQLITE_PATH", "umarket.sqlite3")
+
+# filters are {key: value} with key "column" (equality) or "column__op"; "product.price__gte" filters the
+# columns of the embed named product. a None value adds no condition, except for is and isnot (its negation,
+# so sold__isnot=True also matches a NULL sold)
+FILTER_OPS = {"eq", "neq", "gt", "gte", "lt", "lte", "in", "is", "isnot", "like", "ilike", "icontains", "fts", "wfts"}
+
+_COMPARISONS = {"eq": "=", "neq": "!=", "gt": ">", "gte": ">=", "lt": "<", "lte": "<="}
+_FULLTEXT = {"fts", "wfts"}
+_WORD = re.compile(r"\w+")
+# the HTTP method a request maps to, so both backends report the same upstream metrics
+_METHODS = {"select": "GET", "count": "HEAD", "insert": "POST", "update": "PATCH", "delete": "DELETE",
+            "rpc": "POST", "user": "GET"}
+
+
+def split_filter_key(key: str) -> Tuple[str, str]:
+    column, _, op = key.partition("__")
+    op = op or "eq"
+    if op not in FILTER_OPS:
+        raise ValueError(f"Unsupported filter operator: {op}")
+    return column, op
+
+
+class Embed(NamedTuple):
+    # the row another table holds for a foreign key column, returned under alias; no columns returns nothing
+    # and only filters. with inner, rows whose embed is missing or filtered out are dropped
+    alias: str
+    column: str
+    columns: Tuple[str, ...] = ("*",)
+    inner: bool = False
+
+
+class Request(NamedTuple):
+    # one data operation: action is select, count, insert, update, delete, rpc or user and target the table,
+    # function name or user id. order is ((column, descending), ...) and after a position in that order
+    # (one value per column) to continue strictly past. inserts and updates return the written rows with
+    # columns and embed; count=True on a select also reports the total matching filters
+    action: str
+    target: str
+    filters: Optional[Dict[str, Any]] = None
+    columns: Tuple[str, ...] = ("*",)
+    embed: Optional[Embed] = None
+    order: Tuple[Tuple[str, bool], ...] = ()
+    after: Optional[Tuple[Any, ...]] = None
+    limit: Optional[int] = None
+    count: bool = False
+    body: Any = None
+
+
+class StorageBackend:
+    # answers the Requests yielded by database operations
+
+    name = "base"
+
+    def send(self, request: Request) -> Any:
+        raise NotImplementedError
+
+    async def asend(self, request: Request) -> Any:
+        raise NotImplementedError
+
+    async def awarm(self, request: Request, connections: int, timeout: float) -> int:
+        # open connections ahead of the first request by sending request on each; nothing to open by default
+        return 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": self.name}
+
+    def close(self) -> None:
+        pass
+
+
+def quote_value(value: Any) -> str:
+    return '"{}"'.format(str(value).replace("\\", "\\\\").replace('"', '\\"'))
+
+
+def _like_escape(term: str) -> str:
+    # literal substring for LIKE: escape its wildcards and drop PostgREST's * wildcard
+    return term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_").replace("*", "")
+
+
+def _filter_operand(op: str, value: Any) -> Tuple[str, str]:
+    if op == "in":
+        return "in", "({})".format(",".join(quote_value(item) for item in value))
+    if op in {"is", "isnot"}:
+        return "is" if op == "is" else "not.is", "null" if value is None else str(value).lower()
+    if op == "icontains":
+        return "ilike", f"*{_like_escape(str(value))}*"
+    if isinstance(value, bool):
+        return op, str(value).lower()
+    return op, str(value)
+
+
+def build_filters(filters: Optional[Dict[str, Any]]) -> Dict[str, str]:
+    # translate a filter spec into PostgREST params. a dict cannot repeat a query param, so a column with
+    # several conditions (price__gte and price__lte) is folded into and=(...) or <embed>.and=(...)
+    grouped: Dict[str, List[Tuple[str, str]]] = {}
+    for key, value in (filters or {}).items():
+        column, op = split_filter_key(key)
+        if value is None and op not in {"is", "isnot"}:
+            continue
+        grouped.setdefault(column, []).append(_filter_operand(op, value))
+    params: Dict[str, str] = {}
+    conjunctions: Dict[str, List[str]] = {}
+    for column, conditions in grouped.items():
+        if len(conditions) == 1:
+            op, operand = conditions[0]
+            params[column] = f"{op}.{operand}"
+            continue
+        embed, _, name = column.rpartition(".")
+        for op, operand in conditions:
+            operand = operand if op in {"in", "is", "not.is"} else quote_value(operand)
+            conjunctions.setdefault(embed, []).append(f"{name}.{op}.{operand}")
+    for embed, terms in conjunctions.items():
+        params[f"{embed}.and" if embed else "and"] = "({})".format(",".join(terms))
+    return params
+
+
+def _postgrest_select(request: Request) -> str:
+    # filtering on an embed's columns needs !inner, otherwise PostgREST only nulls out the embed
+    columns = list(request.columns)
+    embed = request.embed
+    if embed is not None:
+        inner = "!inner" if embed.inner else ""
+        columns.append(f"{embed.alias}:{embed.column}{inner}({','.join(embed.columns)})")
+    return ",".join(columns)
+
+
+def _postgrest_keyset(order: Tuple[Tuple[str, bool], ...], after: Tuple[Any, ...]) -> str:
+    # (a.lt."x",and(a.eq."x",id.lt."y")) for order=a.desc,id.desc
+    terms = []
+    for position, (column, descending) in enumerate(order):
+        parts = [f"{name}.eq.{quote_value(value)}" for (name, _), value in zip(order[:position], after)]
+        parts.append(f"{column}.{'lt' if descending else 'gt'}.{quote_value(after[position])}")
+        terms.append(parts[0] if len(parts) == 1 else f"and({','.join(parts)})")
+    return f"({','.join(terms)})"
+
+
+class SupabaseStorage(StorageBackend):
+    # requests become PostgREST calls. identical concurrent reads share one upstream call (singleflight.py);
+    # every other call is a write. the calls that do go out pass the concurrency limit and circuit breaker
+    # of resilience.py
+    name = "supabase"
+
+    def __init__(self, url: Optional[str] = None, api_key: Optional[str] = None):
+        self.url = url
+        self.api_key = api_key
+
+    def call(self, request: Request) -> Call:
+        headers = {
+            "apikey": self.api_key or "",
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json",
+            "Accept": "application/json",
+        }
+        if request.action == "user":
+            return Call("GET", f"{self.url}/auth/v1/admin/users/{request.target}", headers=headers)
+        if request.action == "rpc":
+            return Call("POST", f"{self.url}/rest/v1/rpc/{request.target}", headers=headers, json=request.body)
+        url = f"{self.url}/rest/v1/{request.target}"
+        params: Dict[str, Any] = build_filters(request.filters)
+        if request.action == "delete":
+            return Call("DELETE", url, params=params, headers=headers)
+        params["select"] = _postgrest_select(request)
+        if request.action in {"insert", "update"}:
+            headers["Prefer"] = "return=representation"
+            method = "POST" if request.action == "insert" else "PATCH"
+            return Call(method, url, params=params, headers=headers, json=request.body)
+        if request.order:
+            params["order"] = ",".join(f"{column}.{'desc' if descending else 'asc'}" for column, descending in request.order)
+        if request.after is not None:
+            params["or"] = _postgrest_keyset(request.order, request.after)
+        if request.action == "count":
+            headers.update({"Prefer": "count=exact", "Range-Unit": "items", "Range": "0-0"})
+            return Call("HEAD", url, params=params, headers=headers)
+        if request.limit is not None:
+            headers.update({"Range-Unit": "items", "Range": f"0-{request.limit - 1}"})
+        if request.count:
+            headers["Prefer"] = "count=exact"
+        return Call("GET", url, params=params, headers=headers)
+
+    def send(self, request: Request) -> Any:
+        call = self.call(request)
+
+        def guarded() -> Any:
+            return upstream_guard.send(call.method, call.url, lambda: transport.send(call))
+
+        key = upstream_reads.key(call.method, call.url, call.params, call.headers)
+        if key is not None:
+            return upstream_reads.do(key, guarded)
+        try:
+            return guarded()
+        finally:
+            upstream_reads.written()
+
+    async def asend(self, request: Request) -> Any:
+        call = self.call(request)
+
+        def guarded() -> Awaitable[Any]:
+            return upstream_guard.asend(call.method, call.url, lambda: transport.asend(call))
+
+        key = upstream_reads.key(call.method, call.url, call.params, call.headers)
+        if key is not None:
+            return await upstream_reads.ado(key, guarded)
+        try:
+            return await guarded()
+        finally:
+            upstream_reads.written()
+
+    async def awarm(self, request: Request, connections: int, timeout: float) -> int:
+        call = self.call(request)
+        return await transport.awarm(call.url, connections, timeout, params=call.params, headers=call.headers)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": self.name, "singleflight": upstream_reads.stats()}
+
+
+class LocalResponse(transport.UpstreamResponse):
+    # answered in process: json() hands back the rows without an encode and decode round trip
+
+    def __init__(self, status_code: int, payload: Any, headers: Dict[str, str], url: str):
+        self.status_code = status_code
+        self.payload = payload
+        self.headers = headers
+        self.url = url
+
+    @property
+    def content(self) -> bytes:
+        return b"" if self.payload is None else json.dumps(self.payload, default=str).encode()
+
+    def json(self) -> Any:
+        return self.payload
+
+
+class _Refused(Exception):
+    # becomes a PostgREST-style error response
+    def __init__(self, status: int, code: str, message: str):
+        super().__init__(message)
+        self.status = status
+        self.body = {"code": code, "message": message, "details": None, "hint": None}
+
+
+class _Table(NamedTuple):
+    name: str
+    key: str
+    # column -> declared type; BOOLEAN columns are stored as 0/1 and returned as bools
+    columns: Dict[str, str]
+    indexes: Tuple[Tuple[str, ...], ...]
+
+
+def _like(value: Any, pattern: str) -> bool:
+    # case-sensitive LIKE with * or % as the wildcard and backslash escapes, for like.
+    if value is None:
+        return False
+    regex = ""
+    escaped = False
+    for char in pattern:
+        if escaped:
+            regex += re.escape(char)
+            escaped = False
+        elif char == "\\":
+            escaped = True
+        elif char in "*%":
+            regex += ".*"
+        elif char == "_":
+            regex += "."
+        else:
+            regex += re.escape(char)
+    return re.fullmatch(regex, str(value), re.DOTALL) is not None
+
+
+def _fulltext(value: Any, query: str) -> bool:
+    # every word of the query appears in the value, an approximation of to_tsvector @@ to_tsquery
+    if value is None:
+        return False
+    words = set(_WORD.findall(str(value).lower()))
+    return all(term in words for term in _WORD.findall(query.lower()))
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat(timespec="microseconds")
+
+
+class SQLiteStorage(StorageBackend):
+    name = "sqlite"
+
+    def __init__(
+        self,
+        path: str = SQLITE_PATH,
+        products_table: str = "Product",
+        product_id: str = "prod_id",
+        transactions_table: str = "Transactions",
+        transaction_id: str = "id",
+    ):
+        self.path = path
+        self.products = _Table(
+            products_table,
+            product_id,
+            {product_id: "TEXT", "seller_id": "TEXT", "name": "TEXT", "description": "TEXT", "price": "REAL",
+             "quantity": "INTEGER", "sold": "BOOLEAN", "category": "TEXT", "created_at": "TEXT"},
+            (("seller_id", "created_at"), ("category", "created_at"), ("sold", "created_at"), ("created_at",)),
+        )
+        self.transactions = _Table(
+            transactions_table,
+            transaction_id,
+            {transaction_id: "TEXT", product_id: "TEXT", "buyer_id": "TEXT", "payment_method": "TEXT", "created_at": "TEXT"},
+            ((product_id,), ("buyer_id", "created_at"), ("created_at",)),
+        )
+        self.tables = {table.name: table for table in (self.products, self.transactions)}
+        # table -> foreign key column -> referenced table, for embeds
+        self.foreign_keys = {transactions_table: {product_id: self.products}}
+        self._lock = threading.RLock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._stats: Dict[str, int] = {"reads": 0, "writes": 0, "errors": 0}
+        # rpc name -> implementation, mirroring the functions in backend/sql
+        self.functions: Dict[str, Callable[[Dict[str, Any]], LocalResponse]] = {"checkout_listing": self._checkout_listing}
+
+    # connection and schema
+
+    def connection(self) -> sqlite3.Connection:
+        # opened on first use; one connection shared by the event loop and worker threads under a lock
+        if self._conn is None:
+            with self._lock:
+                if self._conn is None:
+                    conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+                    conn.row_factory = sqlite3.Row
+                    conn.execute("PRAGMA journal_mode=WAL")
+                    conn.execute("PRAGMA synchronous=NORMAL")
+                    conn.execute("PRAGMA busy_timeout=5000")
+                    conn.create_function("pg_like", 2, _like, deterministic=True)
+                    conn.create_function("pg_fts", 2, _fulltext, deterministic=True)
+                    self._create_schema(conn)
+                    self._conn = conn
+        return self._conn
+
+    def _create_schema(self, conn: sqlite3.Connection) -> None:
+        for table in self.tables.values():
+            columns = ", ".join(
+                f'"{column}" {kind}' + (" PRIMARY KEY" if column == table.key else "")
+                + (" NOT NULL" if column == "created_at" else "")
+                for column, kind in table.columns.items()
+            )
+            conn.execute(f'CREATE TABLE IF NOT EXISTS "{table.name}" ({columns})')
+            for index in table.indexes:
+                # the primary key closes every index so keyset pages (created_at, id) are read in index order
+                name = f"{table.name}_{'_'.join(index)}_idx".lower()
+                indexed = ", ".join(f'"{column}"' for column in (*index, table.key))
+                conn.execute(f'CREATE INDEX IF NOT EXISTS "{name}" ON "{table.name}" ({indexed})')
+        conn.execute("CREATE TABLE IF NOT EXISTS auth_users (id TEXT PRIMARY KEY, email TEXT, user_metadata TEXT)")
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        conn = self.connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    # seeding, for development data and benchmarks
+
+    def seed(self, table: str, rows: List[Dict[str, Any]]) -> None:
+        with self._lock, self._transaction() as conn:
+            for row in rows:
+                self._insert_row(conn, self.tables[table], row)
+
+    def add_user(self, user_id: str, email: str, **metadata: Any) -> None:
+        with self._lock:
+            self.connection().execute(
+                "INSERT OR REPLACE INTO auth_users (id, email, user_metadata) VALUES (?, ?, ?)",
+                (user_id, email, json.dumps(metadata)),
+            )
+
+    # requests
+
+    def send(self, request: Request) -> LocalResponse:
+        started = time.perf_counter()
+        timings = metrics.upstream_started()
+        status: Any = "error"
+        try:
+            with self._lock:
+                response = self._answer(request)
+            status = response.status_code
+            return response
+        finally:
+            if status == "error" or status >= 400:
+                self._stats["errors"] += 1
+            label = "/auth/" if request.action == "user" else f"/rest/v1/{_label(request)}"
+            metrics.upstream_finished(timings, _METHODS.get(request.action, "GET"), label, status, 0,
+                                      time.perf_counter() - started)
+
+    async def asend(self, request: Request) -> LocalResponse:
+        # run inline: an indexed statement takes microseconds, less than a hop to a worker thread
+        return self.send(request)
+
+    def stats(self) -> Dict[str, Any]:
+        stats: Dict[str, Any] = dict(self._stats)
+        stats["backend"] = self.name
+        stats["path"] = self.path
+        return stats
+
+    def _answer(self, request: Request) -> LocalResponse:
+        try:
+            if request.action == "user":
+                return self._user(request.target)
+            if request.action == "rpc":
+                function = self.functions.get(request.target)
+                if function is None:
+                    raise _Refused(404, "PGRST202", f"function {request.target} not found")
+                return function(request.body or {})
+            table = self.tables.get(request.target)
+            if table is None:
+                raise _Refused(404, "42P01", f'relation "{request.target}" does not exist')
+            if request.action in {"select", "count"}:
+                self._stats["reads"] += 1
+                return self._read(table, request)
+            self._stats["writes"] += 1
+            if request.action == "insert":
+                return self._insert(table, request)
+            if request.action == "update":
+                return self._update(table, request)
+            if request.action == "delete":
+                return self._delete(table, request)
+            raise _Refused(400, "PGRST100", f"unsupported action {request.action}")
+        except _Refused as refused:
+            return LocalResponse(refused.status, refused.body, {}, _label(request))
+        except sqlite3.IntegrityError as exc:
+            body = {"code": "23505", "message": str(exc), "details": None, "hint": None}
+            return LocalResponse(409, body, {}, _label(request))
+
+    # SQL building
+
+    def _column(self, table: _Table, column: str) -> str:
+        if column not in table.columns:
+            raise _Refused(400, "42703", f"column {table.name}.{column} does not exist")
+        return column
+
+    def _value(self, table: _Table, column: str, value: Any) -> Any:
+        if table.columns.get(column) == "BOOLEAN" and isinstance(value, str):
+            return {"true": 1, "false": 0}.get(value.lower(), value)
+        return value
+
+    def _condition(self, ref: str, table: _Table, column: str, op: str, value: Any, args: List[Any]) -> str:
+        # one column__op condition on ref."column"
+        target = f'{ref}."{self._column(table, column)}"'
+        if op in {"is", "isnot"}:
+            # SQLite's IS / IS NOT compare NULL like any other value, as PostgREST's is / not.is do
+            operands = {"none": "NULL", "null": "NULL", "true": "1", "false": "0"}
+            if str(value).lower() not in operands:
+                raise _Refused(400, "PGRST100", f"unexpected is {value!r}")
+            return f"{target} {'IS' if op == 'is' else 'IS NOT'} {operands[str(value).lower()]}"
+        if op == "in":
+            items = [self._value(table, column, item) for item in value]
+            args.extend(items)
+            return f"{target} IN ({', '.join('?' * len(items))})" if items else "0"
+        if op in {"ilike", "icontains"}:
+            # SQLite's LIKE is case-insensitive for ASCII, as close to ILIKE as the stdlib gets
+            args.append(f"%{_like_escape(str(value))}%" if op == "icontains" else str(value).replace("*", "%"))
+            return f"{target} LIKE ? ESCAPE '\\'"
+        if op == "like":
+            args.append(str(value))
+            return f"pg_like({target}, ?)"
+        if op in _FULLTEXT:
+            args.append(str(value))
+            return f"pg_fts({target}, ?)"
+        args.append(self._value(table, column, value))
+        return f"{target} {_COMPARISONS[op]} ?"
+
+    def _filters(self, ref: str, table: _Table, filters: Optional[Dict[str, Any]], embed: str,
+                 args: List[Any]) -> List[str]:
+        # conditions on the table's own columns (embed "") or on the columns of the named embed
+        conditions = []
+        for key, value in (filters or {}).items():
+            column, op = split_filter_key(key)
+            owner, _, name = column.rpartition(".")
+            if owner != embed or (value is None and op not in {"is", "isnot"}):
+                continue
+            conditions.append(self._condition(ref, table, name, op, value, args))
+        return conditions
+
+    def _after(self, table: _Table, request: Request, args: List[Any]) -> str:
+        # rows strictly past request.after in request.order: (a < x) or (a = x and id < y) when descending
+        terms = []
+        for position, (column, descending) in enumerate(request.order):
+            parts = [f't."{self._column(table, name)}" = ?' for name, _ in request.order[:position]]
+            parts.append(f't."{self._column(table, column)}" {"<" if descending else ">"} ?')
+            args.extend(request.after[:position + 1])
+            terms.append("(" + " AND ".join(parts) + ")")
+        return "(" + " OR ".join(terms) + ")"
+
+    def _from(self, table: _Table, request: Request, args: List[Any]) -> Tuple[str, List[str], Optional[tuple]]:
+        # FROM clause with the joined embed, WHERE conditions, and (alias, ref, target table, columns) of the embed
+        where_args: List[Any] = []
+        conditions = self._filters("t", table, request.filters, "", where_args)
+        if request.after is not None:
+            conditions.append(self._after(table, request, where_args))
+        source = f'"{table.name}" AS t'
+        shaped = None
+        embed = request.embed
+        if embed is not None:
+            target = self.foreign_keys.get(table.name, {}).get(embed.column)
+            if target is None:
+                raise _Refused(400, "PGRST200", f"no relationship between {table.name} and {embed.column}")
+            embed_args: List[Any] = []
+            embed_conditions = self._filters("e", target, request.filters, embed.alias, embed_args)
+            on = [f'e."{target.key}" = t."{embed.column}"']
+            if embed.inner:
+                # filters on an inner embed drop the parent row
+                conditions.extend(embed_conditions)
+                where_args.extend(embed_args)
+            else:
+                # filters on a plain embed only null it out
+                on.extend(embed_conditions)
+                args.extend(embed_args)
+            source += f' {"JOIN" if embed.inner else "LEFT JOIN"} "{target.name}" AS e ON {" AND ".join(on)}'
+            shaped = (embed.alias, "e", target, embed.columns)
+        args.extend(where_args)
+        return source, conditions, shaped
+
+    def _order(self, table: _Table, order: Tuple[Tuple[str, bool], ...]) -> str:
+        # PostgREST puts nulls last ascending and first descending
+        terms = [
+            f't."{self._column(table, column)}" {"DESC NULLS FIRST" if descending else "ASC NULLS LAST"}'
+            for column, descending in order
+        ]
+        return " ORDER BY " + ", ".join(terms) if terms else ""
+
+    def _plan(self, table: _Table, columns: Tuple[str, ...], shaped: Optional[tuple]) -> Tuple[List[str], Any, list]:
+        # resolve the select once per query: the SQL columns, and for the base row and the embed its column
+        # names, their first position and which are booleans; the embed's pk tells a missing row from an empty one
+        selected: List[str] = []
+
+        def fields(target: _Table, ref: str, names: Tuple[str, ...]) -> Tuple[Tuple[str, ...], int, Tuple[str, ...]]:
+            names = tuple(target.columns) if "*" in names else tuple(self._column(target, name) for name in names)
+            start = len(selected)
+            selected.extend(f'{ref}."{name}"' for name in names)
+            return names, start, tuple(name for name in names if target.columns[name] == "BOOLEAN")
+
+        base = fields(table, "t", columns or ("*",))
+        embeds = []
+        if shaped is not None and shaped[3]:
+            alias, ref, target, embed_columns = shaped
+            marker = len(selected)
+            selected.append(f'{ref}."{target.key}"')
+            embeds.append((alias, marker, fields(target, ref, embed_columns)))
+        return selected, base, embeds
+
+    @staticmethod
+    def _record(row: Tuple[Any, ...], plan: Tuple[Tuple[str, ...], int, Tuple[str, ...]]) -> Dict[str, Any]:
+        names, start, booleans = plan
+        record = dict(zip(names, row[start:start + len(names)]))
+        for name in booleans:
+            if record[name] is not None:
+                record[name] = bool(record[name])
+        return record
+
+    def _select_rows(self, table: _Table, request: Request) -> List[Dict[str, Any]]:
+        args: List[Any] = []
+        source, conditions, shaped = self._from(table, request, args)
+        selected, base, embeds = self._plan(table, request.columns, shaped)
+        sql = f"SELECT {', '.join(selected)} FROM {source}"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += self._order(table, request.order)
+        if request.limit is not None:
+            sql += " LIMIT ?"
+            args.append(request.limit)
+        # plain tuples read by position are much cheaper than sqlite3.Row lookups by name on large pages
+        cursor = self.connection().cursor()
+        cursor.row_factory = None
+        rows = []
+        for row in cursor.execute(sql, args):
+            record = self._record(row, base)
+            for alias, marker, plan in embeds:
+                record[alias] = None if row[marker] is None else self._record(row, plan)
+            rows.append(record)
+        return rows
+
+    def _count(self, table: _Table, request: Request) -> int:
+        args: List[Any] = []
+        source, conditions, _ = self._from(table, request, args)
+        sql = f"SELECT COUNT(*) FROM {source}" + (" WHERE " + " AND ".join(conditions) if conditions else "")
+        return self.connection().execute(sql, args).fetchone()[0]
+
+    # reads and writes
+
+    def _read(self, table: _Table, request: Request) -> LocalResponse:
+        counting = request.action == "count"
+        total = self._count(table, request._replace(after=None)) if counting or request.count else None
+        rows = [] if counting else self._select_rows(table, request)
+        shown = f"0-{len(rows) - 1}" if rows else "*"
+        extra = {"Content-Range": f"{shown}/{total if total is not None else '*'}"}
+        return LocalResponse(200, None if counting else rows, extra, _label(request))
+
+    def _representation(self, table: _Table, keys: List[Any], request: Request, status: int) -> LocalResponse:
+        # the written rows re-read with the request's columns and embed, in write order
+        if not keys:
+            return LocalResponse(status, [], {}, _label(request))
+        read = Request("select", table.name, {f"{table.key}__in": keys}, request.columns, request.embed)
+        rows = {str(row[table.key]) if table.key in row else None: row for row in self._select_rows(table, read)}
+        if None in rows:
+            # the columns left out the primary key, so fall back to read order
+            return LocalResponse(status, list(rows.values()), {}, _label(request))
+        return LocalResponse(status, [rows[str(key)] for key in keys if str(key) in rows], {}, _label(request))
+
+    def _stored(self, table: _Table, record: Dict[str, Any]) -> Dict[str, Any]:
+        stored = {}
+        for column, value in record.items():
+            self._column(table, column)
+            stored[column] = json.dumps(value) if isinstance(value, (dict, list)) else value
+        return stored
+
+    def _insert_row(self, conn: sqlite3.Connection, table: _Table, record: Dict[str, Any]) -> Any:
+        row = self._stored(table, record)
+        row.setdefault(table.key, str(uuid.uuid4()))
+        row.setdefault("created_at", _now())
+        columns = ", ".join(f'"{column}"' for column in row)
+        conn.execute(f'INSERT INTO "{table.name}" ({columns}) VALUES ({", ".join("?" * len(row))})', list(row.values()))
+        return row[table.key]
+
+    def _insert(self, table: _Table, request: Request) -> LocalResponse:
+        records = request.body if isinstance(request.body, list) else [request.body or {}]
+        with self._transaction() as conn:
+            keys = [self._insert_row(conn, table, record) for record in records]
+        return self._representation(table, keys, request, 201)
+
+    def _where(self, table: _Table, request: Request, args: List[Any]) -> str:
+        conditions = self._filters(f'"{table.name}"', table, request.filters, "", args)
+        return " WHERE " + " AND ".join(conditions) if conditions else ""
+
+    def _update(self, table: _Table, request: Request) -> LocalResponse:
+        changes = self._stored(table, request.body or {})
+        if not changes:
+            raise _Refused(400, "PGRST100", "empty update")
+        args: List[Any] = list(changes.values())
+        assignments = ", ".join(f'"{column}" = ?' for column in changes)
+        where = self._where(table, request, args)
+        with self._transaction() as conn:
+            sql = f'UPDATE "{table.name}" SET {assignments}{where} RETURNING "{table.key}"'
+            keys = [row[0] for row in conn.execute(sql, args).fetchall()]
+        return self._representation(table, keys, request, 200)
+
+    def _delete(self, table: _Table, request: Request) -> LocalResponse:
+        args: List[Any] = []
+        where = self._where(table, request, args)
+        with self._transaction() as conn:
+            conn.execute(f'DELETE FROM "{table.name}"{where}', args)
+        return LocalResponse(204, None, {}, _label(request))
+
+    def _user(self, user_id: str) -> LocalResponse:
+        row = self.connection().execute("SELECT id, email, user_metadata FROM auth_users WHERE id = ?", (user_id,)).fetchone()
+        if row is None:
+            return LocalResponse(404, {"msg": "User not found"}, {}, f"auth/users/{user_id}")
+        user = {"id": row["id"], "email": row["email"], "user_metadata": json.loads(row["user_metadata"] or "{}")}
+        return LocalResponse(200, user, {}, f"auth/users/{user_id}")
+
+    def _checkout_listing(self, args: Dict[str, Any]) -> LocalResponse:
+        # same contract as backend/sql/checkout_listing.sql, in one write transaction
+        products, orders = self.products, self.transactions
+        listing_id, buyer_id = args.get("p_listing_id"), args.get("p_buyer_id")
+        with self._transaction() as conn:
+            claimed = conn.execute(
+                f'UPDATE "{products.name}" SET quantity = max(coalesce(quantity, 1) - 1, 0), sold = coalesce(quantity, 1) <= 1 '
+                f'WHERE "{products.key}" = ? AND NOT coalesce(sold, 0) AND coalesce(quantity, 1) > 0 AND seller_id IS NOT ? '
+                f'RETURNING "{products.key}"',
+                (listing_id, buyer_id),
+            ).fetchone()
+            if claimed is None:
+                current = conn.execute(f'SELECT seller_id, sold FROM "{products.name}" WHERE "{products.key}" = ?', (listing_id,)).fetchone()
+                reason = ("not_found" if current is None else "own_listing" if current["seller_id"] == buyer_id
+                          else "sold" if current["sold"] else "out_of_stock")
+                raise _Refused(400, "P0001", reason)
+            order_id = self._insert_row(conn, orders, {products.key: listing_id, "buyer_id": buyer_id,
+                                                       "payment_method": args.get("p_payment_method")})
+        read = Request("select", orders.name, {orders.key: order_id}, embed=Embed("product", products.key))
+        return LocalResponse(200, self._select_rows(orders, read)[0], {}, "rpc/checkout_listing")
+
+
+def _label(request: Request) -> str:
+    return f"rpc/{request.target}" if request.action == "rpc" else request.target
+
+
+def build_storage(backend: str = STORAGE_BACKEND, path: str = SQLITE_PATH, url: Optional[str] = None,
+                  api_key: Optional[str] = None, **tables: str) -> StorageBackend:
+    # url and api_key locate supabase; tables: products_table, product_id, transactions_table, transaction_id
+    if backend == "supabase":
+        return SupabaseStorage(url, api_key)
+    if backend == "sqlite":
+        return SQLiteStorage(path, **tables)
+    raise RuntimeError(f"Unknown STORAGE_BACKEND: {backend!r}")
@@ -0,0 +1,168 @@
+# per-category aggregate of available listings behind GET /listings/summary: counts, price range and newest
+# listings. the backend's own listing writes update it in place; a rebuild from upstream every
+# SUMMARY_RECONCILE_INTERVAL seconds picks up changes made elsewhere (other workers, the database directly)
+
+from __future__ import annotations
+
+import asyncio
+import os
+import threading
+import time
+from bisect import bisect_left, insort
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+SUMMARY_RECONCILE_INTERVAL: float = float(os.environ.get("SUMMARY_RECONCILE_INTERVAL", "120"))
+SUMMARY_MAX_NEWEST: int = int(os.environ.get("SUMMARY_MAX_NEWEST", "20"))
+
+
+def is_available(listing: Dict[str, Any]) -> bool:
+    quantity = listing.get("quantity")
+    return not listing.get("sold") and (quantity is None or quantity > 0)
+
+
+class _Category:
+    # ids in the category plus (price, id) and (created_at, id) kept sorted for range and newest lookups
+
+    __slots__ = ("ids", "by_price", "by_age")
+
+    def __init__(self) -> None:
+        self.ids: Set[str] = set()
+        self.by_price: List[Tuple[float, str]] = []
+        self.by_age: List[Tuple[str, str]] = []
+
+
+def _discard(entries: List[Tuple[Any, str]], entry: Tuple[Any, str]) -> None:
+    index = bisect_left(entries, entry)
+    if index < len(entries) and entries[index] == entry:
+        del entries[index]
+
+
+class CategorySummary:
+    def __init__(self, reconcile_interval: float = SUMMARY_RECONCILE_INTERVAL):
+        self.reconcile_interval = reconcile_interval
+        self._lock = threading.RLock()
+        self._docs: Dict[str, Dict[str, Any]] = {}
+        self._categories: Dict[str, _Category] = {}
+        # writes seen while a rebuild is reading upstream, replayed onto the rebuilt aggregate
+        self._pending: Optional[Dict[str, Optional[Dict[str, Any]]]] = None
+        self._loaded_at: Optional[float] = None
+        self._reconcile: Optional["asyncio.Future[None]"] = None
+        self._stats: Dict[str, Any] = {"updates": 0, "reconciliations": 0, "reconcile_errors": 0, "last_drift": 0}
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded_at is not None
+
+    def is_stale(self) -> bool:
+        if self._loaded_at is None:
+            return True
+        return self.reconcile_interval > 0 and time.monotonic() - self._loaded_at > self.reconcile_interval
+
+    def apply(self, listing_id: Any, record: Optional[Dict[str, Any]]) -> None:
+        # record is the listing as written, None once deleted
+        with self._lock:
+            if self._pending is not None:
+                self._pending[str(listing_id)] = record
+            self._apply(str(listing_id), record)
+            self._stats["updates"] += 1
+
+    def _apply(self, listing_id: str, record: Optional[Dict[str, Any]]) -> None:
+        self._remove(listing_id)
+        if record is not None and is_available(record):
+            self._add(listing_id, record)
+
+    def _add(self, listing_id: str, listing: Dict[str, Any]) -> None:
+        category = self._categories.setdefault(listing.get("category") or "miscellaneous", _Category())
+        self._docs[listing_id] = listing
+        category.ids.add(listing_id)
+        if listing.get("price") is not None:
+            insort(category.by_price, (float(listing["price"]), listing_id))
+        insort(category.by_age, (str(listing.get("created_at") or ""), listing_id))
+
+    def _remove(self, listing_id: str) -> None:
+        listing = self._docs.pop(listing_id, None)
+        if listing is None:
+            return
+        name = listing.get("category") or "miscellaneous"
+        category = self._categories[name]
+        category.ids.discard(listing_id)
+        if listing.get("price") is not None:
+            _discard(category.by_price, (float(listing["price"]), listing_id))
+        _discard(category.by_age, (str(listing.get("created_at") or ""), listing_id))
+        if not category.ids:
+            del self._categories[name]
+
+    async def reconcile(self, loader: Callable[[], AsyncIterator[List[Dict[str, Any]]]]) -> None:
+        # rebuild from upstream chunks off-lock, then swap it in with the writes made meanwhile replayed on top
+        fresh = CategorySummary(self.reconcile_interval)
+        with self._lock:
+            self._pending = {}
+        try:
+            async for chunk in loader():
+                for listing in chunk:
+                    fresh._apply(str(listing["id"]), listing)
+        except BaseException:
+            with self._lock:
+                self._pending = None
+            raise
+        with self._lock:
+            for listing_id, record in self._pending.items():
+                fresh._apply(listing_id, record)
+            names = set(self._categories) | set(fresh._categories)
+            drift = sum(abs(len(self._category_ids(name)) - len(fresh._category_ids(name))) for name in names)
+            self._docs = fresh._docs
+            self._categories = fresh._categories
+            self._pending = None
+            self._stats["last_drift"] = drift if self.loaded else 0
+            self._stats["reconciliations"] += 1
+            self._loaded_at = time.monotonic()
+
+    def _category_ids(self, name: str) -> Set[str]:
+        category = self._categories.get(name)
+        return category.ids if category is not None else set()
+
+    async def refresh_if_stale(self, loader: Callable[[], AsyncIterator[List[Dict[str, Any]]]]) -> None:
+        # the first call waits for the initial build; later ones keep serving the current aggregate while a
+        # single background task reconciles it
+        if not self.is_stale():
+            return
+        if self._reconcile is None or self._reconcile.done():
+            self._reconcile = asyncio.ensure_future(self.reconcile(loader))
+            self._reconcile.add_done_callback(self._reconciled)
+        if not self.loaded:
+            await asyncio.shield(self._reconcile)
+
+    def _reconciled(self, task: "asyncio.Future[None]") -> None:
+        if not task.cancelled() and task.exception() is not None:
+            self._stats["reconcile_errors"] += 1
+
+    def snapshot(self, newest: int = 4, categories: Iterable[str] = ()) -> Dict[str, Any]:
+        # every category in categories (empty ones included) followed by any other category that has listings
+        newest = max(0, min(newest, SUMMARY_MAX_NEWEST))
+        with self._lock:
+            names = list(dict.fromkeys([*categories, *sorted(self._categories)]))
+            result = []
+            for name in names:
+                category = self._categories.get(name) or _Category()
+                recent = category.by_age[len(category.by_age) - newest:] if newest else []
+                result.append({
+                    "category": name,
+                    "available": len(category.ids),
+                    "min_price": category.by_price[0][0] if category.by_price else None,
+                    "max_price": category.by_price[-1][0] if category.by_price else None,
+                    "newest": [self._docs[listing_id] for _, listing_id in reversed(recent)],
+                })
+            return {"available": len(self._docs), "categories": result}
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["listings"] = len(self._docs)
+        stats["age_seconds"] = round(time.monotonic() - self._loaded_at, 1) if self._loaded_at is not None else None
+        return stats
+
+
+category_summary = CategorySummary()
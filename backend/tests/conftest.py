@@ -0,0 +1,49 @@
+import time
+from typing import Dict
+
+import jwt
+import pytest
+
+from backend import database
+from backend.cache import etag_cache, listing_cache, profile_cache
+from backend.storage import SQLiteStorage
+
+JWT_SECRET = "test-secret"
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    # the data layer on an empty SQLite file, with the in-process caches cleared around each test
+    storage = SQLiteStorage(
+        str(tmp_path / "umarket.sqlite3"),
+        products_table=database.PRODUCTS_TABLE,
+        product_id=database.PRODUCT_ID_FIELD,
+        transactions_table=database.TRANSACTIONS_TABLE,
+        transaction_id=database.TRANSACTION_ID_FIELD,
+    )
+    monkeypatch.setattr(database, "storage", storage)
+    for cache in (listing_cache, profile_cache, etag_cache):
+        cache.clear()
+    yield storage
+    for cache in (listing_cache, profile_cache, etag_cache):
+        cache.clear()
+    storage.close()
+
+
+@pytest.fixture
+def client(store, monkeypatch):
+    # the API on the SQLite store, with tokens signed by a test secret
+    from fastapi.testclient import TestClient
+
+    from backend import auth, main
+
+    monkeypatch.setenv("SUPABASE_JWT_SECRET", JWT_SECRET)
+    auth.jwt_secret.cache_clear()
+    with TestClient(main.app) as test_client:
+        yield test_client
+    auth.jwt_secret.cache_clear()
+
+
+def bearer(user_id: str) -> Dict[str, str]:
+    token = jwt.encode({"sub": user_id, "exp": int(time.time()) + 3600}, JWT_SECRET, algorithm="HS256")
+    return {"Authorization": f"Bearer {token}"}
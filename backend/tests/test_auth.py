@@ -0,0 +1,76 @@
+import time
+
+import jwt
+import pytest
+
+from backend import auth
+
+from .conftest import JWT_SECRET, bearer
+
+
+@pytest.fixture(autouse=True)
+def tokens(monkeypatch):
+    monkeypatch.setenv("SUPABASE_JWT_SECRET", JWT_SECRET)
+    auth.jwt_secret.cache_clear()
+    auth._token_cache.clear()
+    yield auth._token_cache
+    auth._token_cache.clear()
+    auth.jwt_secret.cache_clear()
+
+
+def _token(secret=JWT_SECRET, **claims):
+    return jwt.encode(claims, secret, algorithm="HS256")
+
+
+def _verifications():
+    return auth.stats()["verifications"]
+
+
+@pytest.mark.parametrize("token, detail", [
+    (_token(secret="another-secret", sub="u1", exp=int(time.time()) + 3600), "Invalid authentication token"),
+    (_token(sub="u1", exp=int(time.time()) - 10), "Invalid authentication token"),
+    (_token(exp=int(time.time()) + 3600), "Token missing subject"),
+], ids=["bad-signature", "expired", "no-subject"])
+def test_refused_tokens_keep_their_401_detail(client, token, detail):
+    for _ in range(2):
+        resp = client.get("/dashboard", headers={"Authorization": f"Bearer {token}"})
+        assert resp.status_code == 401
+        assert resp.json()["detail"] == detail
+
+
+def test_valid_token_is_accepted_from_the_cache(client):
+    headers = bearer("u1")
+    assert client.get("/dashboard", headers=headers).status_code == 200
+    verified = _verifications()
+    assert client.get("/dashboard", headers=headers).status_code == 200
+    assert _verifications() == verified
+
+
+@pytest.mark.parametrize("token", [
+    _token(secret="another-secret", sub="u1", exp=int(time.time()) + 3600),
+    _token(sub="u1", exp=int(time.time()) - 10),
+    _token(exp=int(time.time()) + 3600),
+    "not-a-jwt",
+], ids=["bad-signature", "expired", "no-subject", "malformed"])
+def test_failures_are_never_cached(tokens, token):
+    for _ in range(2):
+        verified = _verifications()
+        try:
+            assert auth.user_id_for_token(token) is None
+        except jwt.PyJWTError:
+            pass
+        assert _verifications() == verified + 1
+    assert len(tokens) == 0
+
+
+def test_cached_token_expires_with_its_exp(tokens):
+    exp = int(time.time()) + 2
+    token = _token(sub="u1", exp=exp)
+    assert auth.user_id_for_token(token) == "u1"
+    verified = _verifications()
+    assert auth.user_id_for_token(token) == "u1"
+    assert _verifications() == verified
+
+    time.sleep(max(0.0, exp - time.time()) + 0.05)
+    with pytest.raises(jwt.ExpiredSignatureError):
+        auth.user_id_for_token(token)
@@ -0,0 +1,59 @@
+from backend import async_database, database
+from backend.storage import Request
+
+from .conftest import bearer
+
+
+def _listing(listing_id, seller_id="seller", **fields):
+    row = {database.PRODUCT_ID_FIELD: listing_id, "seller_id": seller_id, "name": f"Item {listing_id}",
+           "description": "Barely used", "price": 10.0, "quantity": 1, "sold": False, "category": "decor"}
+    row.update(fields)
+    return row
+
+
+def _row(store, listing_id):
+    rows = store.send(Request("select", database.PRODUCTS_TABLE, {database.PRODUCT_ID_FIELD: listing_id})).json()
+    return rows[0] if rows else None
+
+
+def test_batch_edit_changes_only_the_given_fields(store, client):
+    store.seed(database.PRODUCTS_TABLE, [_listing("a"), _listing("b"), _listing("c"), _listing("d", "other")])
+    resp = client.patch("/listings/batch", headers=bearer("seller"), json=[
+        {"id": "a", "price": 25.0},
+        {"id": "b", "price": 25.0},
+        {"id": "c", "name": "Renamed", "quantity": 4},
+        {"id": "d", "price": 1.0},
+        {"id": "missing", "price": 1.0},
+        {"id": "a", "price": 30.0},
+    ])
+    assert resp.status_code == 200
+    assert [result["status"] for result in resp.json()] == [200, 200, 200, 403, 404, 409]
+    assert resp.json()[2]["listing"]["name"] == "Renamed"
+    assert _row(store, "a")["price"] == 25.0 and _row(store, "a")["name"] == "Item a"
+    assert _row(store, "c")["quantity"] == 4 and _row(store, "c")["description"] == "Barely used"
+    assert _row(store, "d")["price"] == 10.0
+    assert _row(store, "missing") is None
+
+
+def test_listing_deleted_after_the_ownership_check_is_not_recreated(store, client, monkeypatch):
+    store.seed(database.PRODUCTS_TABLE, [_listing("a"), _listing("b")])
+    read = async_database.get_listings_by_id
+
+    async def read_then_delete(listing_ids, cached=False):
+        found = await read(listing_ids, cached)
+        store.connection().execute(f'DELETE FROM "{database.PRODUCTS_TABLE}" WHERE "{database.PRODUCT_ID_FIELD}" = ?', ("b",))
+        return found
+
+    monkeypatch.setattr(async_database, "get_listings_by_id", read_then_delete)
+    resp = client.patch("/listings/batch", headers=bearer("seller"),
+                        json=[{"id": "a", "price": 12.0}, {"id": "b", "price": 12.0}])
+    assert [result["status"] for result in resp.json()] == [200, 404]
+    assert _row(store, "a")["price"] == 12.0
+    assert _row(store, "b") is None
+
+
+def test_update_listings_never_inserts(store):
+    store.seed(database.PRODUCTS_TABLE, [_listing("a")])
+    updated = database.update_listings({"gone": {"price": 5.0}, "a": {"price": 5.0}})
+    assert [listing["id"] for listing in updated] == ["a"]
+    assert _row(store, "gone") is None
@@ -0,0 +1,55 @@
+import pytest
+
+from backend import database, main
+
+from .test_batch import _listing
+
+
+@pytest.fixture
+def seeded(store):
+    store.seed(database.PRODUCTS_TABLE, [_listing("a"), _listing("b", sold=True), _listing("c")])
+    for user_id in ("u1", "u2", "u3"):
+        store.add_user(user_id, f"{user_id}@example.com", full_name=f"User {user_id}")
+    return store
+
+
+def test_listings_by_id_keep_request_order_with_null_for_missing(client, seeded):
+    resp = client.get("/listings", params={"ids": "c,missing,a,b"})
+    assert resp.status_code == 200
+    assert [item and item["id"] for item in resp.json()] == ["c", None, "a", "b"]
+
+
+def test_listings_by_id_apply_the_other_filters(client, seeded):
+    resp = client.get("/listings", params={"ids": "a,b,c", "sold": "false"})
+    assert [item and item["id"] for item in resp.json()] == ["a", None, "c"]
+
+
+def test_listings_by_id_answer_cached_and_fetched_ids_alike(client, seeded):
+    database.get_listing("c")
+    resp = client.get("/listings", params={"ids": "a,c", "fields": "id,price"})
+    assert resp.json() == [{"id": "a", "price": 10.0}, {"id": "c", "price": 10.0}]
+
+
+def test_users_by_id_keep_request_order_and_leave_out_missing(client, seeded):
+    resp = client.get("/users", params={"ids": "u3,missing,u1"})
+    assert resp.status_code == 200
+    assert [profile["id"] for profile in resp.json()] == ["u3", "u1"]
+    assert resp.json()[0]["full_name"] == "User u3"
+
+
+@pytest.mark.parametrize("path, ids, expected", [
+    ("/listings", "b, a,b ,a", ["b", "a"]),
+    ("/users", "u2,u1,u2", ["u2", "u1"]),
+])
+def test_duplicate_ids_are_answered_once_in_first_seen_order(client, seeded, path, ids, expected):
+    resp = client.get(path, params={"ids": ids})
+    assert [item["id"] for item in resp.json()] == expected
+
+
+@pytest.mark.parametrize("path, ids", [("/listings", ["a", "b", "c"]), ("/users", ["u1", "u2", "u3"])])
+def test_id_count_is_limited_after_duplicates_are_dropped(client, seeded, monkeypatch, path, ids):
+    monkeypatch.setattr(main, "MAX_BATCH_IDS", 3)
+    assert client.get(path, params={"ids": ",".join(ids + ids[:1])}).status_code == 200
+    refused = client.get(path, params={"ids": ",".join(ids + ["extra"])})
+    assert refused.status_code == 400 and refused.json()["detail"] == "at most 3 ids per request"
+    assert client.get(path, params={"ids": " , "}).status_code == 400
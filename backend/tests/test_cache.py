@@ -0,0 +1,72 @@
+import pytest
+
+from backend import database
+from backend.cache import listing_cache
+
+LISTING = "listing-1"
+
+
+@pytest.fixture
+def seeded(store):
+    store.seed(database.PRODUCTS_TABLE, [{
+        database.PRODUCT_ID_FIELD: LISTING, "seller_id": "seller", "name": "Desk lamp", "price": 12.0,
+        "quantity": 2, "sold": False, "category": "decor",
+    }])
+    # fill the id entry and a cached list, and show they are served from the cache
+    database.get_listing(LISTING)
+    database.get_listings({"category": "decor"})
+    store.connection().execute(f'UPDATE "{database.PRODUCTS_TABLE}" SET name = ?', ("Changed outside the API",))
+    assert database.get_listing(LISTING)["name"] == "Desk lamp"
+    assert [item["name"] for item in database.get_listings({"category": "decor"})] == ["Desk lamp"]
+    return store
+
+
+def _cached(listing_id=LISTING):
+    return listing_cache.get(database._listing_key(listing_id))
+
+
+def _decor_ids():
+    return sorted(item["id"] for item in database.get_listings({"category": "decor"}))
+
+
+def test_create_drops_cached_lists(seeded):
+    version = database.listings_version()
+    created = database.create_listing({"seller_id": "seller", "name": "Floor lamp", "price": 30.0, "category": "decor"})
+    assert database.listings_version() == version + 1
+    assert _cached(created["id"]) == created
+    assert _decor_ids() == sorted([LISTING, created["id"]])
+
+
+def test_update_replaces_the_id_entry_and_drops_cached_lists(seeded):
+    version = database.listings_version()
+    database.update_listing(LISTING, {"price": 8.0})
+    assert database.listings_version() == version + 1
+    assert _cached()["price"] == 8.0
+    assert database.get_listing(LISTING)["price"] == 8.0
+    assert [item["price"] for item in database.get_listings({"category": "decor"})] == [8.0]
+
+
+def test_batch_update_replaces_the_id_entries(seeded):
+    version = database.listings_version()
+    database.update_listings({LISTING: {"category": "furniture"}})
+    assert database.listings_version() == version + 1
+    assert _cached()["category"] == "furniture"
+    assert _decor_ids() == []
+
+
+def test_delete_evicts_the_id_entry_and_drops_cached_lists(seeded):
+    version = database.listings_version()
+    assert database.delete_listing(LISTING)
+    assert database.listings_version() == version + 1
+    assert _cached() is None
+    assert database.get_listing(LISTING) is None
+    assert _decor_ids() == []
+
+
+def test_checkout_decrement_updates_the_id_entry_and_drops_cached_lists(seeded):
+    version = database.listings_version()
+    database.checkout(LISTING, "buyer")
+    assert database.listings_version() == version + 1
+    assert _cached()["quantity"] == 1
+    assert database.get_listing(LISTING)["quantity"] == 1
+    assert [item["quantity"] for item in database.get_listings({"category": "decor"})] == [1]
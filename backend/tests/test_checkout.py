@@ -0,0 +1,99 @@
+import pytest
+
+from backend import database
+
+LISTING = "listing-1"
+
+
+def _seed(store, quantity=3, **fields):
+    store.seed(database.PRODUCTS_TABLE, [{
+        database.PRODUCT_ID_FIELD: LISTING, "seller_id": "seller", "name": "Desk lamp", "price": 12.0,
+        "quantity": quantity, "sold": False, "category": "decor", **fields,
+    }])
+
+
+def test_checkout_takes_one_unit_and_records_the_order(store):
+    _seed(store, quantity=2)
+    order = database.checkout(LISTING, "buyer", "cash")
+    assert order["buyer_id"] == "buyer" and order["product"]["quantity"] == 1
+    database.checkout(LISTING, "buyer", "cash")
+    listing = database.get_listing(LISTING)
+    assert listing["quantity"] == 0 and listing["sold"] is True
+    with pytest.raises(database.CheckoutError) as refused:
+        database.checkout(LISTING, "buyer", "cash")
+    assert refused.value.reason == "sold"
+
+
+@pytest.mark.parametrize(
+    "fields, buyer, reason",
+    [({}, "seller", "own_listing"), ({"quantity": 0}, "buyer", "out_of_stock"), ({"sold": True}, "buyer", "sold")],
+)
+def test_checkout_refusals(store, fields, buyer, reason):
+    _seed(store, **fields)
+    with pytest.raises(database.CheckoutError) as refused:
+        database.checkout(LISTING, buyer)
+    assert refused.value.reason == reason
+
+
+def test_lost_compare_and_set_rereads_and_retries(store):
+    _seed(store, quantity=3)
+    database.get_listing(LISTING)
+    # another worker sells a unit after our cache was filled: the first conditional update matches nothing
+    store.connection().execute(
+        f'UPDATE "{database.PRODUCTS_TABLE}" SET quantity = 2 WHERE "{database.PRODUCT_ID_FIELD}" = ?', (LISTING,)
+    )
+    order = database.checkout(LISTING, "buyer")
+    assert order["product"]["quantity"] == 1
+    assert database.get_listing(LISTING)["quantity"] == 1
+
+
+@pytest.mark.parametrize("stale", [{"quantity": 0}, {"quantity": 0, "sold": True}])
+def test_stale_cached_refusal_is_checked_upstream(store, stale):
+    _seed(store, **stale)
+    database.get_listing(LISTING)
+    # restocked outside the API while the cache still holds the sold-out row
+    store.connection().execute(
+        f'UPDATE "{database.PRODUCTS_TABLE}" SET quantity = 2, sold = 0 WHERE "{database.PRODUCT_ID_FIELD}" = ?', (LISTING,)
+    )
+    order = database.checkout(LISTING, "buyer")
+    assert order["product"]["quantity"] == 1
+
+
+@pytest.mark.parametrize("rpc", [None, "checkout_listing"])
+def test_listing_with_null_sold_counts_as_unsold(store, monkeypatch, rpc):
+    monkeypatch.setattr(database, "CHECKOUT_RPC", rpc)
+    _seed(store, quantity=2, sold=None)
+    order = database.checkout(LISTING, "buyer")
+    assert order["product"]["quantity"] == 1 and not order["product"]["sold"]
+
+
+def test_checkout_gives_up_when_every_compare_and_set_loses(store, monkeypatch):
+    _seed(store, quantity=3)
+    fetch = database._fetch_listing
+
+    def racing_fetch(listing_id):
+        # every read is already out of date by the time the conditional update runs
+        listing = yield from fetch(listing_id)
+        return dict(listing, quantity=listing["quantity"] + 1)
+
+    monkeypatch.setattr(database, "_fetch_listing", racing_fetch)
+    database.listing_cache.clear()
+    with pytest.raises(database.CheckoutError) as refused:
+        database.checkout(LISTING, "buyer")
+    assert refused.value.reason == "contended"
+    monkeypatch.setattr(database, "_fetch_listing", fetch)
+    database.listing_cache.clear()
+    assert database.get_listing(LISTING)["quantity"] == 3
+    assert database.get_orders({"buyer_id": "buyer"}) == []
+
+
+def test_checkout_rpc_runs_on_sqlite(store, monkeypatch):
+    # the embedded store implements the checkout function itself, with no Supabase URL configured
+    monkeypatch.setattr(database, "CHECKOUT_RPC", "checkout_listing")
+    monkeypatch.setattr(database, "SUPABASE_URL", None)
+    _seed(store, quantity=1)
+    order = database.checkout(LISTING, "buyer", "cash")
+    assert order["listing_id"] == LISTING and order["product"]["sold"] is True
+    with pytest.raises(database.CheckoutError) as refused:
+        database.checkout(LISTING, "other-buyer")
+    assert refused.value.reason == "sold"
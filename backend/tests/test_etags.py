@@ -0,0 +1,46 @@
+from backend import cache, database
+
+
+def _seed(store, price=10.0):
+    store.seed(database.PRODUCTS_TABLE, [{
+        database.PRODUCT_ID_FIELD: "a", "seller_id": "seller", "name": "Desk lamp", "price": price, "quantity": 1,
+        "sold": False, "category": "decor",
+    }])
+
+
+def _reprice(store):
+    table, key = database.PRODUCTS_TABLE, database.PRODUCT_ID_FIELD
+    store.connection().execute(f'UPDATE "{table}" SET price = 99 WHERE "{key}" = ?', ("a",))
+
+
+def _written_elsewhere(store):
+    # another worker changes the listing: this worker's listing cache is dropped by its TTL, but its version
+    # counter and recorded tags never heard of the write
+    _reprice(store)
+    database.listing_cache.clear()
+
+
+def test_matching_tag_is_answered_with_304(store, client):
+    _seed(store)
+    etag = client.get("/listings/a").headers["ETag"]
+    resp = client.get("/listings/a", headers={"If-None-Match": etag})
+    assert resp.status_code == 304 and resp.headers["ETag"] == etag
+
+
+def test_single_worker_answers_from_recorded_tags(store, client):
+    _seed(store)
+    etag = client.get("/listings/a").headers["ETag"]
+    _reprice(store)
+    # the listing cache still holds the old row, so the recorded tag still describes what this worker serves
+    assert client.get("/listings/a", headers={"If-None-Match": etag}).status_code == 304
+
+
+def test_several_workers_compare_tags_with_the_body(store, client, monkeypatch):
+    monkeypatch.setattr(cache, "WORKERS", 4)
+    _seed(store)
+    etag = client.get("/listings/a").headers["ETag"]
+    _written_elsewhere(store)
+    resp = client.get("/listings/a", headers={"If-None-Match": etag})
+    assert resp.status_code == 200 and resp.json()["price"] == 99
+    assert resp.headers["ETag"] != etag
+    assert client.get("/listings/a", headers={"If-None-Match": resp.headers["ETag"]}).status_code == 304
@@ -0,0 +1,109 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException, Response
+
+from backend import database, main
+from backend.cache import MemoryCache
+from backend.idempotency import IdempotencyStore
+
+from .conftest import bearer
+
+LISTING = "listing-1"
+
+
+def _store(wait=10.0):
+    return IdempotencyStore(MemoryCache(100, 60, stale_ttl=0), wait=wait)
+
+
+@pytest.fixture
+def records(store, monkeypatch):
+    idempotent = _store()
+    monkeypatch.setattr(main, "idempotent_requests", idempotent)
+    store.seed(database.PRODUCTS_TABLE, [{
+        database.PRODUCT_ID_FIELD: LISTING, "seller_id": "seller", "name": "Desk lamp", "price": 12.0,
+        "quantity": 5, "sold": False, "category": "decor",
+    }])
+    return idempotent
+
+
+def _purchase(client, key, payment_method="cash"):
+    headers = dict(bearer("buyer"), **{"Idempotency-Key": key})
+    return client.post("/orders", json={"listing_id": LISTING, "payment_method": payment_method}, headers=headers)
+
+
+def test_retried_purchase_is_replayed_not_bought_again(client, records):
+    first = _purchase(client, "purchase-1")
+    retry = _purchase(client, "purchase-1")
+    assert first.status_code == retry.status_code == 201
+    assert "Idempotent-Replayed" not in first.headers
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    assert retry.json()["id"] == first.json()["id"]
+    assert database.get_listing(LISTING)["quantity"] == 4
+    assert len(database.get_orders({"buyer_id": "buyer"})) == 1
+
+
+def test_key_reused_for_a_different_request_is_refused(client, records):
+    assert _purchase(client, "purchase-1").status_code == 201
+    assert _purchase(client, "purchase-1", payment_method="venmo").status_code == 422
+
+
+@pytest.mark.parametrize("key", ["", "x" * 256, "two\twords"])
+def test_malformed_keys_are_refused(client, records, key):
+    assert _purchase(client, key).status_code == 400
+
+
+def test_concurrent_duplicates_share_one_run():
+    idempotent = _store()
+    calls = []
+
+    async def call():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return {"id": "order-1"}
+
+    async def duplicates():
+        responses = [Response() for _ in range(3)]
+        results = await asyncio.gather(*(idempotent.run("u1", "k", "f", call, response) for response in responses))
+        return results, responses
+
+    results, responses = asyncio.run(duplicates())
+    assert results == [{"id": "order-1"}] * 3 and len(calls) == 1
+    assert sum(response.headers.get("Idempotent-Replayed") == "true" for response in responses) == 2
+
+
+@pytest.mark.parametrize("status_code, runs", [(409, 2), (503, 2), (400, 1)])
+def test_retryable_failures_release_the_key_and_refusals_are_replayed(status_code, runs):
+    idempotent = _store()
+    calls = []
+
+    async def call():
+        calls.append(1)
+        raise HTTPException(status_code=status_code, detail="refused")
+
+    async def twice():
+        for _ in range(2):
+            with pytest.raises(HTTPException) as refused:
+                await idempotent.run("u1", "k", "f", call, Response())
+            assert refused.value.status_code == status_code
+
+    asyncio.run(twice())
+    assert len(calls) == runs
+
+
+def test_duplicate_of_a_request_running_on_another_worker_waits_then_conflicts():
+    idempotent = _store(wait=0.1)
+    # another worker holds the key and has not recorded an outcome yet
+    idempotent.records.add("idempotency:u1:k", {"state": "running", "fingerprint": "f"})
+
+    async def call():
+        raise AssertionError("must not run while another worker holds the key")
+
+    with pytest.raises(HTTPException) as conflict:
+        asyncio.run(idempotent.run("u1", "k", "f", call, Response()))
+    assert conflict.value.status_code == 409
+
+    idempotent.records.set("idempotency:u1:k", {"state": "done", "fingerprint": "f", "status": None, "body": {"id": "o"}})
+    response = Response()
+    assert asyncio.run(idempotent.run("u1", "k", "f", call, response)) == {"id": "o"}
+    assert response.headers["Idempotent-Replayed"] == "true"
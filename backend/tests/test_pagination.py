@@ -0,0 +1,77 @@
+import pytest
+
+from backend import database
+
+
+def _seed(store, count=25):
+    # pairs of listings share a created_at so pages have to break ties on the id
+    rows = [
+        {database.PRODUCT_ID_FIELD: f"listing-{n:02d}", "seller_id": f"seller-{n % 3}", "name": f"Item {n}",
+         "price": float(n % 7), "quantity": 1, "sold": False, "category": "decor",
+         "created_at": f"2026-01-01T00:00:{n // 2:02d}+00:00"}
+        for n in range(count)
+    ]
+    store.seed(database.PRODUCTS_TABLE, rows)
+    return rows
+
+
+def _walk(filters=None, sort="created_at.desc", limit=10):
+    pages, cursor = [], None
+    while True:
+        page = database.get_listings_page(filters, limit=limit, cursor=cursor, sort=sort)
+        pages.append([item["id"] for item in page["items"]])
+        cursor = page["next_cursor"]
+        if not cursor:
+            return pages
+
+
+@pytest.mark.parametrize("sort", ["created_at.desc", "created_at.asc", "price.asc", "price.desc", "name.asc"])
+def test_cursor_pages_cover_every_row_once_in_order(store, sort):
+    rows = _seed(store)
+    pages = _walk(sort=sort)
+    seen = [listing_id for page in pages for listing_id in page]
+    column, _, direction = sort.partition(".")
+    expected = sorted(rows, key=lambda row: (row[column], row[database.PRODUCT_ID_FIELD]),
+                      reverse=direction == "desc")
+    assert seen == [row[database.PRODUCT_ID_FIELD] for row in expected]
+    assert [len(page) for page in pages] == [10, 10, 5]
+
+
+def test_cursor_pages_respect_filters(store):
+    _seed(store)
+    seen = [listing_id for page in _walk({"seller_id": "seller-1"}, limit=3) for listing_id in page]
+    assert seen == [f"listing-{n:02d}" for n in sorted(range(1, 25, 3), reverse=True)]
+
+
+def test_last_full_page_has_no_cursor(store):
+    _seed(store, count=20)
+    assert [len(page) for page in _walk()] == [10, 10]
+
+
+def test_cursor_is_refused_for_another_sort(store):
+    _seed(store)
+    cursor = database.get_listings_page(limit=10, sort="price.asc")["next_cursor"]
+    with pytest.raises(ValueError):
+        database.get_listings_page(limit=10, cursor=cursor, sort="created_at.desc")
+
+
+def test_decode_cursor_round_trips():
+    record = {"id": "listing-07", "created_at": "2026-01-01T00:00:03+00:00", "price": 3.0}
+    assert database.decode_cursor(database.encode_cursor(record, "price.asc")) == ("3.0", "listing-07", "price.asc")
+
+
+def test_api_follows_next_cursor_and_refuses_oversized_pages(store, client):
+    from backend import main
+
+    rows = _seed(store)
+    assert client.get(f"/listings?limit={main.MAX_PAGE_SIZE + 1}").status_code == 422
+    seen, params = [], {"limit": 10}
+    while True:
+        resp = client.get("/listings", params=params)
+        assert resp.status_code == 200
+        seen.extend(item["id"] for item in resp.json())
+        if "X-Next-Cursor" not in resp.headers:
+            break
+        params = {"limit": 10, "cursor": resp.headers["X-Next-Cursor"]}
+    assert sorted(seen) == sorted(row[database.PRODUCT_ID_FIELD] for row in rows)
+    assert len(seen) == len(rows)
@@ -0,0 +1,50 @@
+import asyncio
+
+import requests
+
+from backend import async_database, database
+
+
+def test_concurrent_profile_lookups_share_one_read(store, monkeypatch):
+    store.add_user("seller", "seller@example.com", full_name="Sam Seller")
+    sent = []
+
+    async def slow_asend(request):
+        # suspend like a network call would, so the other lookups arrive while this one is in flight
+        sent.append(request)
+        await asyncio.sleep(0.01)
+        return store.send(request)
+
+    monkeypatch.setattr(store, "asend", slow_asend)
+
+    async def lookups():
+        return await asyncio.gather(*(async_database.get_user_profile("seller") for _ in range(5)))
+
+    profiles = asyncio.run(lookups())
+    assert [profile["full_name"] for profile in profiles] == ["Sam Seller"] * 5
+    assert len(sent) == 1
+
+
+def test_listing_detail_renders_without_a_seller_when_the_profile_read_fails(client, store, monkeypatch):
+    store.seed(database.PRODUCTS_TABLE, [{
+        database.PRODUCT_ID_FIELD: "listing-1", "seller_id": "seller", "name": "Desk lamp", "price": 12.0,
+        "quantity": 1, "sold": False, "category": "decor",
+    }])
+    store.add_user("seller", "seller@example.com", full_name="Sam Seller")
+    asend = store.asend
+
+    async def auth_down(request):
+        if request.action == "user":
+            raise requests.ConnectionError("auth API unreachable")
+        return await asend(request)
+
+    monkeypatch.setattr(store, "asend", auth_down)
+    response = client.get("/listings/listing-1/detail")
+    assert response.status_code == 200
+    assert response.json()["name"] == "Desk lamp" and response.json()["seller"] is None
+
+    # the seller-less body is not remembered as the current version, so the profile is read again
+    monkeypatch.setattr(store, "asend", asend)
+    response = client.get("/listings/listing-1/detail", headers={"If-None-Match": response.headers["ETag"]})
+    assert response.status_code == 200
+    assert response.json()["seller"]["full_name"] == "Sam Seller"
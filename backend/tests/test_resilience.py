@@ -0,0 +1,115 @@
+from types import SimpleNamespace
+
+import pytest
+import requests
+
+from backend import database, main, resilience
+from backend.cache import listing_cache
+
+from .conftest import bearer
+
+LISTING = "listing-1"
+
+
+@pytest.fixture
+def upstream(store, monkeypatch):
+    # the SQLite store behind a fresh upstream guard with a four-call breaker window; set upstream.down to make
+    # every call fail with a connection error
+    guard = resilience.UpstreamGuard(enabled=True)
+    guard.breakers = {
+        name: resilience.CircuitBreaker(name, window=4, min_calls=4, cooldown=60) for name in resilience.ENDPOINT_CLASSES
+    }
+    for module in (database, main):
+        monkeypatch.setattr(module, "upstream_guard", guard)
+    state = SimpleNamespace(guard=guard, down=False, calls=0)
+    # the embedded store answers asend() through send(), so both wrap the unguarded send
+    send = store.send
+
+    def method(request):
+        return "GET" if request.action in {"select", "count", "user"} else "POST"
+
+    def url(request):
+        return f"http://upstream.test/rest/v1/{request.target}"
+
+    def reached():
+        state.calls += 1
+        if state.down:
+            raise requests.ConnectionError("upstream down")
+
+    def guarded_send(request):
+        def call():
+            reached()
+            return send(request)
+        return guard.send(method(request), url(request), call)
+
+    async def guarded_asend(request):
+        async def call():
+            reached()
+            return send(request)
+        return await guard.asend(method(request), url(request), call)
+
+    monkeypatch.setattr(store, "send", guarded_send)
+    monkeypatch.setattr(store, "asend", guarded_asend)
+    store.seed(database.PRODUCTS_TABLE, [{
+        database.PRODUCT_ID_FIELD: LISTING, "seller_id": "seller", "name": "Desk lamp", "price": 12.0,
+        "quantity": 5, "sold": False, "category": "decor",
+    }])
+    return state
+
+
+def test_breaker_opens_after_failures_and_fails_fast(upstream, client):
+    upstream.down = True
+    for _ in range(4):
+        with pytest.raises(requests.ConnectionError):
+            database.get_listing(LISTING)
+    assert upstream.guard.breakers["rest_read"].state == "open"
+
+    calls = upstream.calls
+    with pytest.raises(resilience.CircuitOpen):
+        database.get_listing(LISTING)
+    resp = client.get(f"/listings/{LISTING}")
+    assert resp.status_code == 503 and int(resp.headers["Retry-After"]) >= 1
+    assert upstream.calls == calls
+
+    # once the cooldown has passed a single successful probe closes it again
+    upstream.down = False
+    upstream.guard.breakers["rest_read"]._opened_at -= 60
+    assert database.get_listing(LISTING)["id"] == LISTING
+    assert upstream.guard.breakers["rest_read"].state == "closed"
+
+
+def test_cached_listing_is_served_stale_while_the_breaker_is_open(upstream, client):
+    assert client.get(f"/listings/{LISTING}").status_code == 200
+    # let the id entry expire; it stays available to get_stale()
+    key = database._listing_key(LISTING)
+    listing_cache.set(key, listing_cache.get(key), ttl=-1)
+
+    upstream.down = True
+    while upstream.guard.breakers["rest_read"].state != "open":
+        with pytest.raises(requests.ConnectionError):
+            database.get_listing("listing-unknown")
+
+    calls = upstream.calls
+    resp = client.get(f"/listings/{LISTING}")
+    assert resp.status_code == 200 and resp.json()["id"] == LISTING
+    assert upstream.calls == calls
+    assert upstream.guard.stats()["served_stale"] == 1
+
+
+def test_saturated_limiter_sheds_browsing_before_checkout(upstream, client):
+    limiter = resilience.AdaptiveLimiter("rest_read", initial=4, minimum=4, maximum=4, queue_timeout=0.05)
+    upstream.guard.limiters["rest_read"] = limiter
+    # three reads in flight fill the share low priorities may use, leaving one slot for more urgent work
+    limiter.in_flight = 3
+
+    browse = client.get("/listings")
+    assert browse.status_code == 503
+    assert browse.headers["Retry-After"] == resilience.retry_after(
+        resilience.Overloaded("", "rest_read", resilience.SHED_RETRY_AFTER)
+    )
+    assert limiter.stats()["shed"]["low"] == 1
+
+    order = client.post("/orders", json={"listing_id": LISTING, "payment_method": "cash"}, headers=bearer("buyer"))
+    assert order.status_code == 201
+    assert limiter.stats()["shed"]["critical"] == 0
+    assert limiter.in_flight == 3
@@ -0,0 +1,78 @@
+from backend.search import SearchIndex
+
+LISTINGS = [
+    {"id": "1", "name": "Desk lamp", "category": "decor", "description": "Warm white bulb"},
+    {"id": "2", "name": "Road bike", "category": "miscellaneous", "description": "Two wheels, good brakes"},
+    {"id": "3", "name": "Leather sofa", "category": "decor", "description": "Seats three"},
+    {"id": "4", "name": "Calculus textbook", "category": "school-supplies", "description": ""},
+]
+
+
+def _index() -> SearchIndex:
+    index = SearchIndex(ttl=0)
+    index.rebuild(LISTINGS)
+    return index
+
+
+def _names(index: SearchIndex, query: str):
+    return [listing["name"] for _, listing in index.search(query)]
+
+
+def test_exact_and_substring_matches_rank_first():
+    index = _index()
+    assert _names(index, "lamp")[0] == "Desk lamp"
+    assert _names(index, "textbo")[0] == "Calculus textbook"
+
+
+def test_short_typos_and_transpositions_still_match():
+    index = _index()
+    for query, expected in (("lmap", "Desk lamp"), ("bkie", "Road bike"), ("sfoa", "Leather sofa"),
+                            ("textbok", "Calculus textbook")):
+        results = index.search(query)
+        assert results and results[0][1]["name"] == expected, query
+        assert results[0][0] >= 0.75, query
+
+
+def test_no_match_is_empty():
+    assert _index().search("zzzz") == []
+
+
+def test_removed_listings_drop_out_of_fuzzy_matches():
+    index = _index()
+    index.remove("1")
+    assert _names(index, "lmap") == []
+    index.upsert({"id": "5", "name": "Floor lamp", "category": "decor", "description": ""})
+    assert _names(index, "lmap") == ["Floor lamp"]
+
+
+def test_predicate_filters_results():
+    index = _index()
+    assert _names(index, "decor") and all(name != "Road bike" for name in _names(index, "decor"))
+    assert index.search("sofa", predicate=lambda listing: listing["category"] != "decor") == []
+
+
+def test_api_pages_through_every_ranked_match(store, client, monkeypatch):
+    from backend import database, main
+
+    monkeypatch.setattr(main, "search_index", SearchIndex(ttl=0))
+    store.seed(database.PRODUCTS_TABLE, [
+        {database.PRODUCT_ID_FIELD: f"lamp-{n:02d}", "seller_id": "seller", "name": f"Desk lamp {n}", "price": 5.0,
+         "quantity": 1, "sold": False, "category": "decor", "created_at": f"2026-01-01T00:00:{n:02d}+00:00"}
+        for n in range(25)
+    ] + [{database.PRODUCT_ID_FIELD: "bike", "seller_id": "seller", "name": "Road bike", "price": 90.0,
+          "quantity": 1, "sold": False, "category": "miscellaneous", "created_at": "2026-01-01T00:01:00+00:00"}])
+    seen, sizes, params = [], [], {"search": "lmap", "limit": 10}
+    while True:
+        resp = client.get("/listings", params=params)
+        assert resp.status_code == 200
+        sizes.append(len(resp.json()))
+        seen.extend(item["id"] for item in resp.json())
+        if "X-Next-Cursor" not in resp.headers:
+            break
+        cursor = resp.headers["X-Next-Cursor"]
+        params = {"search": "lmap", "limit": 10, "cursor": cursor}
+    assert sizes == [10, 10, 5]
+    assert sorted(seen) == [f"lamp-{n:02d}" for n in range(25)]
+
+    assert client.get("/listings", params={"search": "bkie", "cursor": cursor}).status_code == 400
+    assert client.get("/listings", params={"search": "lmap", "cursor": "not-a-cursor"}).status_code == 400
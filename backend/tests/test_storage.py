@@ -0,0 +1,83 @@
+import pytest
+
+from backend import database
+from backend.benchmarks.fake_supabase import FakeSupabase
+from backend.storage import Embed, Request, SupabaseStorage
+
+
+def test_supabase_translates_a_keyset_page_into_postgrest():
+    storage = SupabaseStorage("https://example.supabase.co", "key")
+    request = Request(
+        "select", "Transactions", {"buyer_id": "u1", "product.price__gte": 5, "product.price__lte": 9},
+        embed=Embed("product", "prod_id", inner=True), order=(("created_at", True), ("id", True)),
+        after=("2024-01-01", "o9"), limit=26, count=True,
+    )
+    call = storage.call(request)
+    assert (call.method, call.url) == ("GET", "https://example.supabase.co/rest/v1/Transactions")
+    assert call.params == {
+        "buyer_id": "eq.u1",
+        "product.and": '(price.gte."5",price.lte."9")',
+        "select": "*,product:prod_id!inner(*)",
+        "order": "created_at.desc,id.desc",
+        "or": '(created_at.lt."2024-01-01",and(created_at.eq."2024-01-01",id.lt."o9"))',
+    }
+    assert call.headers["Range"] == "0-25" and call.headers["Prefer"] == "count=exact"
+
+
+def test_supabase_translates_writes_rpcs_and_user_lookups():
+    storage = SupabaseStorage("https://example.supabase.co", "key")
+    update = storage.call(Request("update", "Product", {"prod_id__in": ["a", "b,c"], "sold__is": False}, body={"price": 3}))
+    assert update.method == "PATCH" and update.json == {"price": 3}
+    assert update.params == {"prod_id": 'in.("a","b,c")', "sold": "is.false", "select": "*"}
+    assert update.headers["Prefer"] == "return=representation"
+    rpc = storage.call(Request("rpc", "checkout_listing", body={"p_listing_id": "a"}))
+    assert (rpc.method, rpc.url) == ("POST", "https://example.supabase.co/rest/v1/rpc/checkout_listing")
+    user = storage.call(Request("user", "u1"))
+    assert user.url == "https://example.supabase.co/auth/v1/admin/users/u1"
+
+
+ROWS = [
+    {"prod_id": "a", "seller_id": "s1", "name": "Desk lamp", "price": 5.0, "sold": False, "category": "decor"},
+    {"prod_id": "b", "seller_id": "s1", "name": "Road bike", "price": 90.0, "sold": True, "category": "miscellaneous"},
+    {"prod_id": "c", "seller_id": "s2", "name": "Leather sofa", "price": 40.0, "sold": None, "category": "decor"},
+    {"prod_id": "d", "seller_id": "s2", "name": "Floor lamp 100%", "price": 12.5, "sold": False, "category": "decor"},
+]
+
+# filter spec, the PostgREST params it becomes, and the rows both backends must return
+FILTER_CASES = [
+    ({"price__gte": 5, "price__lte": 40}, {"and": '(price.gte."5",price.lte."40")'}, "acd"),
+    ({"price__gt": 5, "price__lt": 90}, {"and": '(price.gt."5",price.lt."90")'}, "cd"),
+    ({"price__gte": 12.5}, {"price": "gte.12.5"}, "bcd"),
+    ({"seller_id": None, "price__lte": 5}, {"price": "lte.5"}, "a"),
+    ({"category__in": ["decor", "kitchen"]}, {"category": 'in.("decor","kitchen")'}, "acd"),
+    ({"category__neq": "decor"}, {"category": "neq.decor"}, "b"),
+    ({"category": "decor", "sold": False}, {"category": "eq.decor", "sold": "eq.false"}, "ad"),
+    ({"sold__is": False}, {"sold": "is.false"}, "ad"),
+    ({"sold__is": None}, {"sold": "is.null"}, "c"),
+    ({"sold__isnot": True}, {"sold": "not.is.true"}, "acd"),
+    ({"sold__isnot": True, "sold__is": None}, {"and": "(sold.not.is.true,sold.is.null)"}, "c"),
+    ({"name__icontains": "LAMP"}, {"name": "ilike.*LAMP*"}, "ad"),
+    ({"name__icontains": "100%"}, {"name": "ilike.*100\\%*"}, "d"),
+    ({"name__ilike": "*SOFA"}, {"name": "ilike.*SOFA"}, "c"),
+    ({"name__like": "Desk*"}, {"name": "like.Desk*"}, "a"),
+    ({"name__wfts": "road bike"}, {"name": "wfts.road bike"}, "b"),
+]
+
+
+@pytest.mark.parametrize("filters, params, expected", FILTER_CASES)
+def test_filters_translate_to_postgrest(filters, params, expected):
+    call = SupabaseStorage("https://example.supabase.co", "key").call(Request("select", "Product", filters))
+    assert {key: value for key, value in call.params.items() if key != "select"} == params
+
+
+@pytest.mark.parametrize("filters, params, expected", FILTER_CASES)
+def test_postgrest_and_sqlite_return_the_same_rows(store, filters, params, expected):
+    store.seed(database.PRODUCTS_TABLE, ROWS)
+    upstream = FakeSupabase(database.PRODUCTS_TABLE, database.PRODUCT_ID_FIELD)
+    upstream.seed(database.PRODUCTS_TABLE, ROWS)
+    call = SupabaseStorage("https://example.supabase.co", "key").call(Request("select", database.PRODUCTS_TABLE, filters))
+    status, rows, _ = upstream.handle("GET", f"/rest/v1/{database.PRODUCTS_TABLE}", call.params, {}, None)
+    assert status == 200
+    assert "".join(sorted(row[database.PRODUCT_ID_FIELD] for row in rows)) == expected
+    local = store.send(Request("select", database.PRODUCTS_TABLE, filters)).json()
+    assert "".join(sorted(row[database.PRODUCT_ID_FIELD] for row in local)) == expected
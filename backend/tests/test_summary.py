@@ -0,0 +1,64 @@
+import asyncio
+from typing import get_args
+
+import pytest
+
+from backend import async_database, database, main, schemas
+from backend.summary import CategorySummary
+
+from .conftest import bearer
+
+
+@pytest.fixture
+def summary(store, monkeypatch):
+    # a fresh aggregate that is built once and then only kept up to date by the API's own writes
+    aggregate = CategorySummary(reconcile_interval=0)
+    for module in (database, main):
+        monkeypatch.setattr(module, "category_summary", aggregate)
+    store.seed(database.PRODUCTS_TABLE, [
+        {database.PRODUCT_ID_FIELD: f"listing-{n}", "seller_id": "seller", "name": f"Item {n}", "price": 10.0 + n,
+         "quantity": 1, "sold": n == 5, "category": "decor" if n % 2 else "clothing",
+         "created_at": f"2026-01-01T00:00:{n:02d}+00:00"}
+        for n in range(6)
+    ])
+    return aggregate
+
+
+def _shape(summary):
+    # what a client sees of each category, with listings reduced to their ids
+    return {
+        entry["category"]: (entry["available"], entry["min_price"], entry["max_price"],
+                            [listing["id"] for listing in entry["newest"]])
+        for entry in summary["categories"]
+    }
+
+
+def _recomputed():
+    fresh = CategorySummary()
+    asyncio.run(fresh.reconcile(lambda: async_database.export_listings({"sold": False}, None, 1000)))
+    return fresh.snapshot(4, get_args(schemas.CategorySlug))
+
+
+def test_summary_follows_creates_updates_sales_and_deletes(client, summary):
+    assert client.get("/listings/summary").status_code == 200
+    assert summary.loaded
+
+    seller = bearer("seller")
+    created = client.post("/listings", json={"name": "Scarf", "price": 3.0, "quantity": 2, "category": "clothing"},
+                          headers=seller).json()
+    assert client.patch("/listings/listing-1", json={"category": "tickets", "price": 50.0}, headers=seller).status_code == 200
+    assert client.patch("/listings/listing-3", json={"quantity": 0}, headers=seller).status_code == 200
+    for _ in range(2):
+        order = client.post("/orders", json={"listing_id": created["id"], "payment_method": "cash"}, headers=bearer("buyer"))
+        assert order.status_code == 201
+    assert client.delete("/listings/listing-2", headers=seller).status_code == 204
+    assert client.patch("/listings/listing-5", json={"sold": False}, headers=seller).status_code == 200
+
+    served = client.get("/listings/summary").json()
+    assert _shape(served) == _shape(_recomputed())
+    assert served["available"] == 4
+    assert _shape(served)["tickets"] == (1, 50.0, 50.0, ["listing-1"])
+    assert _shape(served)["clothing"] == (2, 10.0, 14.0, ["listing-4", "listing-0"])
+    assert _shape(served)["decor"] == (1, 15.0, 15.0, ["listing-5"])
+    assert _shape(served)["school-supplies"] == (0, None, None, [])
+    assert summary.stats()["reconciliations"] == 1
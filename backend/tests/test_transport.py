@@ -0,0 +1,130 @@
+import asyncio
+import os
+import subprocess
+import sys
+
+import aiohttp
+import pytest
+import requests
+
+from backend import transport
+
+URL = "https://example.supabase.co/rest/v1/Product"
+
+
+class FakeSession:
+    # stands in for the pooled requests session: answers each call with the next scripted outcome
+    adapters = {}
+
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = []
+
+    def request(self, method, url, **kwargs):
+        self.calls.append((method, kwargs))
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        resp = requests.Response()
+        resp.status_code, resp._content, resp.url = outcome, b"[]", url
+        return resp
+
+
+@pytest.fixture
+def fake_session(monkeypatch):
+    monkeypatch.setattr(transport, "_backoff", lambda attempt: 0.0)
+    monkeypatch.setattr(transport, "SUPABASE_MAX_RETRIES", 2)
+
+    def install(*outcomes):
+        fake = FakeSession(*outcomes)
+        monkeypatch.setattr(transport, "_session", fake)
+        return fake
+
+    return install
+
+
+@pytest.mark.parametrize("status_code", sorted(transport.RETRY_STATUSES))
+def test_idempotent_reads_are_retried_on_retryable_statuses(fake_session, status_code):
+    session = fake_session(status_code, 200)
+    retries = transport.pool_stats()["retries"]
+    assert transport.request("GET", URL).status_code == 200
+    assert len(session.calls) == 2
+    assert transport.pool_stats()["retries"] == retries + 1
+
+
+@pytest.mark.parametrize("error", [requests.ConnectionError("reset"), requests.Timeout("slow")])
+def test_idempotent_reads_give_up_after_the_configured_retries(fake_session, error):
+    session = fake_session(error, error, error, 200)
+    errors = transport.pool_stats()["errors"]
+    with pytest.raises(type(error)):
+        transport.request("HEAD", URL)
+    assert len(session.calls) == 3
+    assert transport.pool_stats()["errors"] == errors + 1
+
+
+@pytest.mark.parametrize("status_code", [400, 404, 500])
+def test_other_statuses_are_not_retried(fake_session, status_code):
+    session = fake_session(status_code, 200)
+    assert transport.request("GET", URL).status_code == status_code
+    assert len(session.calls) == 1
+
+
+@pytest.mark.parametrize("method", ["POST", "PATCH", "DELETE"])
+def test_writes_are_never_retried(fake_session, method):
+    session = fake_session(503, 200)
+    assert transport.request(method, URL, json={}).status_code == 503
+    assert len(session.calls) == 1
+
+    session = fake_session(requests.ConnectionError("reset"), 200)
+    with pytest.raises(requests.ConnectionError):
+        transport.request(method, URL, json={})
+    assert len(session.calls) == 1
+
+
+def test_async_writes_are_never_retried(monkeypatch):
+    monkeypatch.setattr(transport, "_backoff", lambda attempt: 0.0)
+    calls = []
+
+    class FakeClient:
+        def request(self, method, url, **kwargs):
+            calls.append(method)
+            raise aiohttp.ClientConnectionError("reset")
+
+    monkeypatch.setattr(transport, "async_client", FakeClient)
+    with pytest.raises(aiohttp.ClientConnectionError):
+        asyncio.run(transport.arequest("POST", URL, json={}))
+    assert calls == ["POST"]
+    with pytest.raises(aiohttp.ClientConnectionError):
+        asyncio.run(transport.arequest("GET", URL))
+    assert calls == ["POST"] + ["GET"] * (transport.SUPABASE_MAX_RETRIES + 1)
+
+
+def test_every_call_carries_the_configured_timeouts(fake_session, monkeypatch):
+    monkeypatch.setattr(transport, "SUPABASE_CONNECT_TIMEOUT", 1.5)
+    monkeypatch.setattr(transport, "SUPABASE_READ_TIMEOUT", 4.0)
+    session = fake_session(200, 200)
+    transport.request("GET", URL)
+    transport.request("GET", URL, timeout=9)
+    assert [kwargs["timeout"] for _, kwargs in session.calls] == [(1.5, 4.0), 9]
+
+
+def test_timeouts_and_retries_are_read_from_the_environment():
+    env = dict(os.environ, SUPABASE_CONNECT_TIMEOUT="0.5", SUPABASE_READ_TIMEOUT="7", SUPABASE_MAX_RETRIES="5")
+    out = subprocess.run(
+        [sys.executable, "-c", "from backend import transport as t; "
+         "print(t.SUPABASE_CONNECT_TIMEOUT, t.SUPABASE_READ_TIMEOUT, t.SUPABASE_MAX_RETRIES)"],
+        env=env, capture_output=True, text=True, check=True,
+        cwd=os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+    )
+    assert out.stdout.split() == ["0.5", "7.0", "5"]
+
+
+def test_pool_stats_report_requests_and_pool_sizes(fake_session):
+    fake_session(200)
+    before = transport.pool_stats()
+    transport.request("GET", URL)
+    after = transport.pool_stats()
+    assert after["requests"] == before["requests"] + 1
+    assert after["in_flight"] == before["in_flight"] == 0
+    assert after["pool_size"] == transport.SUPABASE_POOL_SIZE
+    assert after["async_pool_size"] == transport.SUPABASE_ASYNC_POOL_SIZE
@@ -0,0 +1,271 @@
+# shared HTTP transport for the Supabase data layer: one pooled keep-alive session (plus an aiohttp session
+# for the async path), timeouts on every call, and jittered retries for idempotent reads.
+# configured with SUPABASE_POOL_* / SUPABASE_*_TIMEOUT env vars
+
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import random
+import threading
+import time
+from typing import Any, Dict, NamedTuple, Optional
+
+import aiohttp
+import requests
+from requests.adapters import HTTPAdapter
+
+from . import metrics
+
+SUPABASE_POOL_SIZE: int = int(os.environ.get("SUPABASE_POOL_SIZE", "20"))
+SUPABASE_ASYNC_POOL_SIZE: int = int(os.environ.get("SUPABASE_ASYNC_POOL_SIZE", "200"))
+SUPABASE_POOL_BLOCK: bool = os.environ.get("SUPABASE_POOL_BLOCK", "true").lower() == "true"
+SUPABASE_CONNECT_TIMEOUT: float = float(os.environ.get("SUPABASE_CONNECT_TIMEOUT", "3.05"))
+SUPABASE_READ_TIMEOUT: float = float(os.environ.get("SUPABASE_READ_TIMEOUT", "10"))
+SUPABASE_MAX_RETRIES: int = int(os.environ.get("SUPABASE_MAX_RETRIES", "2"))
+SUPABASE_RETRY_BACKOFF: float = float(os.environ.get("SUPABASE_RETRY_BACKOFF", "0.1"))
+
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
+RETRY_STATUSES = frozenset({429, 502, 503, 504})
+# what a failed call raises on either path: connection errors, timeouts and raise_for_status
+UPSTREAM_ERRORS = (requests.RequestException, aiohttp.ClientError, asyncio.TimeoutError)
+MAX_BACKOFF = 2.0
+
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+_async_client: Optional[aiohttp.ClientSession] = None
+_async_loop: Optional[asyncio.AbstractEventLoop] = None
+_stats_lock = threading.Lock()
+_stats: Dict[str, int] = {"requests": 0, "retries": 0, "errors": 0, "in_flight": 0}
+
+
+class Call(NamedTuple):
+    # one upstream HTTP request, as yielded by the database operations
+    method: str
+    url: str
+    params: Optional[Dict[str, Any]] = None
+    headers: Optional[Dict[str, str]] = None
+    json: Any = None
+
+
+class UpstreamResponse:
+    # fully read async response exposing the subset of requests.Response the operations use
+    def __init__(self, status_code: int, headers: Any, content: bytes, url: str):
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+        self.url = url
+
+    @property
+    def text(self) -> str:
+        return self.content.decode("utf-8", errors="replace")
+
+    def json(self) -> Any:
+        return json.loads(self.content)
+
+    def raise_for_status(self) -> None:
+        # same exception type as the blocking path so callers handle one error class
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code} error for url: {self.url}", response=self)
+
+
+def upstream_fault(exc: BaseException) -> bool:
+    # True unless upstream answered with a client error, i.e. the request itself was wrong
+    response = getattr(exc, "response", None)
+    return response is None or response.status_code >= 500 or response.status_code == 429
+
+
+def _count(key: str, delta: int = 1) -> None:
+    with _stats_lock:
+        _stats[key] += delta
+
+
+def session() -> requests.Session:
+    # lazily build the process-wide session; the adapter keeps up to SUPABASE_POOL_SIZE
+    # connections per host alive and, with SUPABASE_POOL_BLOCK, makes callers wait for a free one
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                adapter = HTTPAdapter(
+                    pool_connections=4,
+                    pool_maxsize=SUPABASE_POOL_SIZE,
+                    pool_block=SUPABASE_POOL_BLOCK,
+                    max_retries=0,
+                )
+                new_session = requests.Session()
+                new_session.mount("https://", adapter)
+                new_session.mount("http://", adapter)
+                _session = new_session
+    return _session
+
+
+def async_client() -> aiohttp.ClientSession:
+    # aiohttp sessions are bound to the loop they were created on, so build one per running loop
+    global _async_client, _async_loop
+    loop = asyncio.get_running_loop()
+    if _async_client is None or _async_loop is not loop:
+        _async_client = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=SUPABASE_ASYNC_POOL_SIZE, limit_per_host=SUPABASE_ASYNC_POOL_SIZE),
+            timeout=aiohttp.ClientTimeout(sock_connect=SUPABASE_CONNECT_TIMEOUT, sock_read=SUPABASE_READ_TIMEOUT),
+        )
+        _async_loop = loop
+    return _async_client
+
+
+def close() -> None:
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+            _session = None
+
+
+async def aclose() -> None:
+    global _async_client, _async_loop
+    client, _async_client, _async_loop = _async_client, None, None
+    if client is not None:
+        await client.close()
+
+
+def _backoff(attempt: int) -> float:
+    # full jitter: uniform between 0 and the exponential step
+    return random.uniform(0, min(MAX_BACKOFF, SUPABASE_RETRY_BACKOFF * (2 ** attempt)))
+
+
+def request(method: str, url: str, **kwargs: Any) -> requests.Response:
+    # send one request through the shared pool; idempotent methods are retried on
+    # connection errors, timeouts and 429/502/503/504 responses
+    method = method.upper()
+    kwargs.setdefault("timeout", (SUPABASE_CONNECT_TIMEOUT, SUPABASE_READ_TIMEOUT))
+    retries = SUPABASE_MAX_RETRIES if method in IDEMPOTENT_METHODS else 0
+    attempt = 0
+    while True:
+        _count("requests")
+        _count("in_flight")
+        timings = metrics.upstream_started()
+        started = time.perf_counter()
+        status: Any = "error"
+        size = 0
+        try:
+            resp = session().request(method, url, **kwargs)
+            status, size = resp.status_code, len(resp.content)
+        except (requests.ConnectionError, requests.Timeout):
+            if attempt >= retries:
+                _count("errors")
+                raise
+        else:
+            if resp.status_code not in RETRY_STATUSES or attempt >= retries:
+                return resp
+            resp.close()
+        finally:
+            _count("in_flight", -1)
+            metrics.upstream_finished(timings, method, url, status, size, time.perf_counter() - started)
+        time.sleep(_backoff(attempt))
+        attempt += 1
+        _count("retries")
+
+
+async def arequest(method: str, url: str, **kwargs: Any) -> UpstreamResponse:
+    # async counterpart of request() on the shared aiohttp session, same retry policy
+    method = method.upper()
+    retries = SUPABASE_MAX_RETRIES if method in IDEMPOTENT_METHODS else 0
+    attempt = 0
+    while True:
+        _count("requests")
+        _count("in_flight")
+        timings = metrics.upstream_started()
+        started = time.perf_counter()
+        status: Any = "error"
+        size = 0
+        try:
+            async with async_client().request(method, url, **kwargs) as raw:
+                resp = UpstreamResponse(raw.status, raw.headers, await raw.read(), str(raw.url))
+            status, size = resp.status_code, len(resp.content)
+        except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+            if attempt >= retries:
+                _count("errors")
+                raise
+        else:
+            if resp.status_code not in RETRY_STATUSES or attempt >= retries:
+                return resp
+        finally:
+            _count("in_flight", -1)
+            metrics.upstream_finished(timings, method, url, status, size, time.perf_counter() - started)
+        await asyncio.sleep(_backoff(attempt))
+        attempt += 1
+        _count("retries")
+
+
+def send(call: Call) -> requests.Response:
+    return request(call.method, call.url, params=call.params, headers=call.headers, json=call.json)
+
+
+async def asend(call: Call) -> UpstreamResponse:
+    return await arequest(call.method, call.url, params=call.params, headers=call.headers, json=call.json)
+
+
+def get(url: str, **kwargs: Any) -> requests.Response:
+    return request("GET", url, **kwargs)
+
+
+def head(url: str, **kwargs: Any) -> requests.Response:
+    return request("HEAD", url, **kwargs)
+
+
+def post(url: str, **kwargs: Any) -> requests.Response:
+    return request("POST", url, **kwargs)
+
+
+def patch(url: str, **kwargs: Any) -> requests.Response:
+    return request("PATCH", url, **kwargs)
+
+
+def delete(url: str, **kwargs: Any) -> requests.Response:
+    return request("DELETE", url, **kwargs)
+
+
+async def awarm(url: str, connections: int, timeout: float, **kwargs: Any) -> int:
+    # open up to `connections` keep-alive connections to url's host on the aiohttp session before traffic
+    # arrives: the HEAD requests run concurrently, so each one takes its own connection and pays the TCP
+    # and TLS handshakes now instead of on a user's request. returns how many got an answer
+    async def one() -> None:
+        async with async_client().head(url, timeout=aiohttp.ClientTimeout(total=timeout), **kwargs) as raw:
+            await raw.read()
+
+    results = await asyncio.gather(*(one() for _ in range(connections)), return_exceptions=True)
+    return sum(1 for result in results if not isinstance(result, BaseException))
+
+
+def _async_connections() -> int:
+    # aiohttp does not expose pool usage publicly; count the connector's idle and acquired connections
+    connector = getattr(_async_client, "connector", None)
+    if connector is None:
+        return 0
+    idle = sum(len(conns) for conns in getattr(connector, "_conns", {}).values())
+    return idle + len(getattr(connector, "_acquired", ()))
+
+
+def pool_stats() -> Dict[str, Any]:
+    # request counters plus per-host connection pool usage, for monitoring
+    with _stats_lock:
+        stats: Dict[str, Any] = dict(_stats)
+    stats["pool_size"] = SUPABASE_POOL_SIZE
+    stats["async_pool_size"] = SUPABASE_ASYNC_POOL_SIZE
+    stats["async_connections"] = _async_connections()
+    stats["pools"] = {}
+    if _session is None:
+        return stats
+    for adapter in set(_session.adapters.values()):
+        for key in list(adapter.poolmanager.pools.keys()):
+            pool = adapter.poolmanager.pools.get(key)
+            if pool is None:
+                continue
+            idle = sum(1 for conn in list(pool.pool.queue) if conn is not None) if pool.pool is not None else 0
+            stats["pools"][f"{pool.scheme}://{pool.host}:{pool.port}"] = {
+                "connections_opened": pool.num_connections,
+                "requests": pool.num_requests,
+                "idle": idle,
+            }
+    return stats
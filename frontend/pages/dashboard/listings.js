@@ -3,7 +3,7 @@ import Link from 'next/link';
 import { useRouter } from 'next/router';
 import Layout from '../../components/Layout';
 import { useAuth } from '../../context/AuthContext';
-import { apiFetch } from '../../utils/apiClient';
+import { apiFetchAll } from '../../utils/apiClient';
 
 export default function DashboardListings() {
   const router = useRouter();
@@ -24,7 +24,7 @@ export default function DashboardListings() {
       setLoading(true);
       try {
         const params = new URLSearchParams({ seller_id: user.id });
-        const data = await apiFetch(`/listings?${params.toString()}`);
+        const data = await apiFetchAll(`/listings?${params.toString()}`);
         setListings(data || []);
       } catch (err) {
         setError(err.message);
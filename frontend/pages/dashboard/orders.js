@@ -3,7 +3,7 @@ import { useRouter } from 'next/router';
 import Link from 'next/link';
 import Layout from '../../components/Layout';
 import { useAuth } from '../../context/AuthContext';
-import { apiFetch } from '../../utils/apiClient';
+import { apiFetch, apiFetchAll } from '../../utils/apiClient';
 
 function OrderList({ title, orders, emptyMessage }) {
   return (
@@ -58,12 +58,23 @@ export default function DashboardOrders() {
       setLoading(true);
       setError(null);
       try {
-        const [buyer, seller] = await Promise.all([
-          apiFetch('/orders?role=buyer', { accessToken }),
-          apiFetch('/orders?role=seller', { accessToken }),
+        // only the fields rendered below, so the API can skip the rest of each product
+        const fields = 'id,listing_id,payment_method,created_at,product.name,product.price';
+        // both tabs in one request; the API reads them concurrently
+        const data = await apiFetch(`/dashboard?include=purchases,sales&fields=${fields}`, {
+          accessToken,
+        });
+        // each section is the first page; read the rest from /orders
+        const rest = (page, role) =>
+          page?.next_cursor
+            ? apiFetchAll(`/orders?role=${role}&fields=${fields}`, { accessToken, cursor: page.next_cursor })
+            : [];
+        const [morePurchases, moreSales] = await Promise.all([
+          rest(data?.purchases, 'buyer'),
+          rest(data?.sales, 'seller'),
         ]);
-        setBuyerOrders(buyer || []);
-        setSellerOrders(seller || []);
+        setBuyerOrders([...(data?.purchases?.items || []), ...morePurchases]);
+        setSellerOrders([...(data?.sales?.items || []), ...moreSales]);
       } catch (err) {
         setError(err.message);
       } finally {
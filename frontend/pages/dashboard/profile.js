@@ -3,7 +3,7 @@ import Link from 'next/link';
 import { useRouter } from 'next/router';
 import Layout from '../../components/Layout';
 import { useAuth } from '../../context/AuthContext';
-import { apiFetch } from '../../utils/apiClient';
+import { apiFetchAll } from '../../utils/apiClient';
 import { supabase } from '../../utils/supabaseClient';
 
 const AVATAR_BUCKET = process.env.NEXT_PUBLIC_SUPABASE_AVATAR_BUCKET || 'avatars';
@@ -83,7 +83,7 @@ export default function ProfileDashboard() {
     setListingsLoading(true);
     try {
       const params = new URLSearchParams({ seller_id: user.id });
-      const data = await apiFetch(`/listings?${params.toString()}`);
+      const data = await apiFetchAll(`/listings?${params.toString()}`);
       setListings(data || []);
       setListingsError(null);
     } catch (error) {
@@ -1,9 +1,9 @@
-import { useEffect, useMemo, useState } from 'react';
+import { useEffect, useMemo, useRef, useState } from 'react';
 import Link from 'next/link';
 import { useRouter } from 'next/router';
 import Layout from '../components/Layout';
 import { useAuth } from '../context/AuthContext';
-import { apiFetch } from '../utils/apiClient';
+import { apiFetch, apiFetchAll, subscribeToEvents } from '../utils/apiClient';
 
 // home page with all available items. users can see listings
 
@@ -40,9 +40,20 @@ const CATEGORY_CARDS = [
   },
 ];
 
+// newest listings per category shown on the unfiltered home page
+const NEWEST_PER_CATEGORY = 8;
+// events only cover writes handled by the API worker this page is connected to, so the grid is also refetched
+// this often while the page is visible
+const LISTINGS_REFRESH_MS = 60000;
+
 export default function Home() {
   const [listings, setListings] = useState([]);
   const [loading, setLoading] = useState(true);
+  const [summary, setSummary] = useState(null);
+  // bumped when the event stream reports missed events, or by the periodic refresh, to refetch
+  const [reloadKey, setReloadKey] = useState(0);
+  // set for refetches that replace the grid in place without the loading state
+  const quietReload = useRef(false);
   const [searchResults, setSearchResults] = useState([]);
   const [searchTerm, setSearchTerm] = useState('');
   const [searching, setSearching] = useState(false);
@@ -53,11 +64,29 @@ export default function Home() {
     typeof router.query.category === 'string' ? router.query.category.toLowerCase() : null;
 
   useEffect(() => {
+    if (!router.isReady) {
+      return;
+    }
     async function fetchListings() {
+      const quiet = quietReload.current;
+      quietReload.current = false;
+      if (!quiet) {
+        setLoading(true);
+      }
       try {
-        const params = new URLSearchParams({ sold: 'false' });
-        const data = await apiFetch(`/listings?${params.toString()}`);
-        setListings(data || []);
+        if (activeCategory) {
+          // the API filters by category so only matching listings are downloaded
+          const params = new URLSearchParams({ sold: 'false', category: activeCategory });
+          const data = await apiFetch(`/listings?${params.toString()}`);
+          setListings(data || []);
+        } else {
+          // counts and the newest listings of every category come from the summary, a few kilobytes in all
+          const data = await apiFetch(`/listings/summary?newest=${NEWEST_PER_CATEGORY}`);
+          setSummary(data);
+          const newest = (data?.categories || []).flatMap((category) => category.newest || []);
+          newest.sort((a, b) => String(b.created_at).localeCompare(String(a.created_at)));
+          setListings(newest);
+        }
       } catch (error) {
         console.error('Error fetching listings', error);
       } finally {
@@ -65,6 +94,49 @@ export default function Home() {
       }
     }
     fetchListings();
+  }, [activeCategory, router.isReady, reloadKey]);
+
+  useEffect(() => {
+    if (!router.isReady) {
+      return undefined;
+    }
+    // keep the grid current from listing events instead of refetching
+    const isShown = (listing) =>
+      !listing.sold && (listing.quantity ?? 1) > 0 && (!activeCategory || listing.category === activeCategory);
+    const drop = (id) => setListings((current) => current.filter((listing) => listing.id !== id));
+    const params = { types: 'listing.created,listing.updated,listing.deleted' };
+    if (activeCategory) {
+      params.category = activeCategory;
+    }
+    return subscribeToEvents(params, {
+      'listing.created': (listing) => {
+        if (isShown(listing)) {
+          setListings((current) => [listing, ...current.filter((item) => item.id !== listing.id)]);
+        }
+      },
+      'listing.updated': (listing) => {
+        if (!isShown(listing)) {
+          drop(listing.id);
+          return;
+        }
+        setListings((current) => current.map((item) => (item.id === listing.id ? listing : item)));
+      },
+      'listing.deleted': (listing) => drop(listing.id),
+      reset: () => {
+        quietReload.current = true;
+        setReloadKey((key) => key + 1);
+      },
+    });
+  }, [activeCategory, router.isReady]);
+
+  useEffect(() => {
+    const timer = setInterval(() => {
+      if (document.visibilityState === 'visible') {
+        quietReload.current = true;
+        setReloadKey((key) => key + 1);
+      }
+    }, LISTINGS_REFRESH_MS);
+    return () => clearInterval(timer);
   }, []);
 
   useEffect(() => {
@@ -78,7 +150,10 @@ export default function Home() {
       setSearching(true);
       try {
         const params = new URLSearchParams({ sold: 'false', search: searchTerm.trim() });
-        const data = await apiFetch(`/listings?${params.toString()}`);
+        if (activeCategory) {
+          params.set('category', activeCategory);
+        }
+        const data = await apiFetchAll(`/listings?${params.toString()}`);
         setSearchResults(Array.isArray(data) ? data : []);
         setSearchError(null);
       } catch (error) {
@@ -90,7 +165,7 @@ export default function Home() {
     }, 350);
 
     return () => clearTimeout(controller);
-  }, [searchTerm]);
+  }, [searchTerm, activeCategory]);
 
   const filteredListings = useMemo(() => {
     const base = searchTerm.trim() ? searchResults : listings;
@@ -106,6 +181,11 @@ export default function Home() {
     });
   }, [activeCategory, listings, searchResults, searchTerm]);
 
+  function getCategoryCount(slug) {
+    const match = summary?.categories?.find((category) => category.category === slug);
+    return match ? match.available : null;
+  }
+
   function getCategoryName(slug) {
     const match = CATEGORY_CARDS.find((category) => category.slug === slug);
     return match ? match.name : slug;
@@ -218,7 +298,11 @@ export default function Home() {
               style={{ backgroundImage: category.backgroundImage }}
             >
               <span className="category-card__name">{category.name}</span>
-              <span className="category-card__cta">Explore listings</span>
+              <span className="category-card__cta">
+                {getCategoryCount(category.slug) !== null
+                  ? `${getCategoryCount(category.slug)} available`
+                  : 'Explore listings'}
+              </span>
             </Link>
           ))}
         </div>
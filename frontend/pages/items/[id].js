@@ -3,7 +3,7 @@ import Link from 'next/link';
 import { useRouter } from 'next/router';
 import Layout from '../../components/Layout';
 import { useAuth } from '../../context/AuthContext';
-import { apiFetch } from '../../utils/apiClient';
+import { apiFetch, createIdempotencyKeys } from '../../utils/apiClient';
 import { supabase } from '../../utils/supabaseClient';
 
 const CATEGORY_LABELS = {
@@ -28,16 +28,22 @@ export default function ListingDetail() {
   const [orderError, setOrderError] = useState(null);
   const [paymentMethod, setPaymentMethod] = useState('cash');
   const [seller, setSeller] = useState(null);
+  const [sellerMissing, setSellerMissing] = useState(false);
   const [sellerLoading, setSellerLoading] = useState(false);
   const [sellerError, setSellerError] = useState(null);
   const [sellerAvatarUrl, setSellerAvatarUrl] = useState(null);
+  // one key per purchase attempt, kept while the user retries it after a failure
+  const [purchaseKeys] = useState(createIdempotencyKeys);
 
   const fetchListing = useCallback(async () => {
     if (!id) return;
     setLoading(true);
     try {
-      const data = await apiFetch(`/listings/${id}`);
+      // the listing and its seller's profile in one request
+      const { seller: sellerProfile, ...data } = await apiFetch(`/listings/${id}/detail`);
       setListing(data);
+      setSeller(sellerProfile || null);
+      setSellerMissing(Boolean(data.seller_id && !sellerProfile));
       setError(null);
     } catch (err) {
       setError(err.message);
@@ -51,10 +57,9 @@ export default function ListingDetail() {
   }, [fetchListing]);
 
   useEffect(() => {
-    if (!listing?.seller_id) {
-      setSeller(null);
-      return;
-    }
+    // the detail response carries no seller when their profile could not be read; the listing still
+    // renders and the seller panel loads the profile on its own, with its own loading and error state
+    if (!sellerMissing || !listing?.seller_id) return;
     let cancelled = false;
     async function loadSeller() {
       setSellerLoading(true);
@@ -78,7 +83,7 @@ export default function ListingDetail() {
     return () => {
       cancelled = true;
     };
-  }, [listing?.seller_id]);
+  }, [sellerMissing, listing?.seller_id]);
 
   useEffect(() => {
     if (!seller) {
@@ -156,12 +161,15 @@ export default function ListingDetail() {
     setOrderError(null);
     setMessage(null);
 
+    const body = { listing_id: listing.id, payment_method: paymentMethod };
     try {
       await apiFetch('/orders', {
         method: 'POST',
-        body: { listing_id: listing.id, payment_method: paymentMethod },
+        body,
         accessToken,
+        idempotencyKey: purchaseKeys.keyFor(body),
       });
+      purchaseKeys.settle();
       setMessage('Purchase recorded. The seller has been notified.');
       setListing((prev) => {
         if (!prev) return prev;
@@ -174,6 +182,7 @@ export default function ListingDetail() {
         };
       });
     } catch (err) {
+      purchaseKeys.settle(err);
       setOrderError(err.message);
     } finally {
       setOrderSubmitting(false);
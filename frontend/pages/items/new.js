@@ -3,7 +3,7 @@ import { useRouter } from 'next/router';
 import Layout from '../../components/Layout';
 import ListingForm from '../../components/ListingForm';
 import { useAuth } from '../../context/AuthContext';
-import { apiFetch } from '../../utils/apiClient';
+import { apiFetch, createIdempotencyKeys } from '../../utils/apiClient';
 
 // form for creating new item listing. the user has to be logged in to access this page.
 
@@ -12,6 +12,7 @@ export default function NewListing() {
   const { user, accessToken, loading: authLoading } = useAuth();
   const [submitting, setSubmitting] = useState(false);
   const [error, setError] = useState(null);
+  const [listingKeys] = useState(createIdempotencyKeys);
 
   useEffect(() => {
     if (!authLoading && !user) {
@@ -31,9 +32,12 @@ export default function NewListing() {
         method: 'POST',
         body: payload,
         accessToken,
+        idempotencyKey: listingKeys.keyFor(payload),
       });
+      listingKeys.settle();
       router.replace('/dashboard/listings');
     } catch (err) {
+      listingKeys.settle(err);
       setError(err.message);
     } finally {
       setSubmitting(false);
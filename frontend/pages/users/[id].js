@@ -2,7 +2,7 @@ import { useEffect, useMemo, useState } from 'react';
 import Link from 'next/link';
 import { useRouter } from 'next/router';
 import Layout from '../../components/Layout';
-import { apiFetch } from '../../utils/apiClient';
+import { apiFetch, apiFetchAll } from '../../utils/apiClient';
 import { supabase } from '../../utils/supabaseClient';
 
 const CATEGORY_LABELS = {
@@ -68,7 +68,7 @@ export default function PublicUserProfile() {
       setListingsError(null);
       try {
         const params = new URLSearchParams({ seller_id: sellerId });
-        const data = await apiFetch(`/listings?${params.toString()}`);
+        const data = await apiFetchAll(`/listings?${params.toString()}`);
         if (!cancelled) {
           setListings(data || []);
         }
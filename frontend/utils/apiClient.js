@@ -17,7 +17,7 @@ async function parseResponse(response) {
   }
 }
 
-export async function apiFetch(path, { method = 'GET', body, accessToken, headers: extraHeaders } = {}) {
+async function request(path, { method = 'GET', body, accessToken, idempotencyKey, headers: extraHeaders } = {}) {
   const url = `${API_BASE}${path}`;
   const headers = {
     'Content-Type': 'application/json',
@@ -28,6 +28,9 @@ export async function apiFetch(path, { method = 'GET', body, accessToken, header
   if (accessToken) {
     headers.Authorization = `Bearer ${accessToken}`;
   }
+  if (idempotencyKey) {
+    headers['Idempotency-Key'] = idempotencyKey;
+  }
 
   const response = await fetch(url, {
     method,
@@ -48,5 +51,70 @@ export async function apiFetch(path, { method = 'GET', body, accessToken, header
     throw error;
   }
 
+  return { data, response };
+}
+
+export async function apiFetch(path, options) {
+  const { data } = await request(path, options);
   return data;
 }
+
+// every item of a paged list endpoint (GET /listings, GET /orders): pages are capped by the API, so follow
+// X-Next-Cursor until the last one. cursor starts after a page already read, such as a /dashboard section
+export async function apiFetchAll(path, { cursor: startCursor = null, ...options } = {}) {
+  const items = [];
+  let cursor = startCursor;
+  do {
+    const separator = path.includes('?') ? '&' : '?';
+    const pagePath = cursor ? `${path}${separator}cursor=${encodeURIComponent(cursor)}` : path;
+    const { data, response } = await request(pagePath, options);
+    items.push(...(data || []));
+    cursor = response.headers.get('X-Next-Cursor');
+  } while (cursor);
+  return items;
+}
+
+function newIdempotencyKey() {
+  if (typeof crypto !== 'undefined' && crypto.randomUUID) {
+    return crypto.randomUUID();
+  }
+  return `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}-${Math.random().toString(36).slice(2)}`;
+}
+
+// Idempotency-Key for a create the user may submit again after a network error or timeout: the same payload
+// keeps its key until the API gives a definite answer, so a retry returns the first result instead of buying
+// or listing twice. call settle() with the error (or nothing on success) once the request is done
+export function createIdempotencyKeys() {
+  let current = null;
+  return {
+    keyFor(payload) {
+      const fingerprint = JSON.stringify(payload);
+      if (!current || current.fingerprint !== fingerprint) {
+        current = { fingerprint, key: newIdempotencyKey() };
+      }
+      return current.key;
+    },
+    settle(error) {
+      // no status means the response never arrived; 409, 429 and 5xx ask for a retry
+      const retryable =
+        error && (!error.status || error.status >= 500 || error.status === 409 || error.status === 429);
+      if (!retryable) {
+        current = null;
+      }
+    },
+  };
+}
+
+// listen to the API's server-sent events; EventSource reconnects on its own and sends Last-Event-ID so
+// missed events are replayed. returns a function that closes the stream
+export function subscribeToEvents(params, handlers) {
+  if (typeof window === 'undefined' || typeof EventSource === 'undefined') {
+    return () => {};
+  }
+  const query = new URLSearchParams(params || {}).toString();
+  const source = new EventSource(`${API_BASE}/events${query ? `?${query}` : ''}`);
+  Object.entries(handlers).forEach(([type, handler]) => {
+    source.addEventListener(type, (event) => handler(JSON.parse(event.data)));
+  });
+  return () => source.close();
+}